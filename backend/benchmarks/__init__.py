@@ -0,0 +1 @@
+# Benchmarks for the Flux OS backend. Run from backend/: python -m benchmarks.<name>
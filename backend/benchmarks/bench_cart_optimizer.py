@@ -0,0 +1,89 @@
+"""
+Compare the global cart optimizer with the previous greedy per-category loop.
+
+    python -m benchmarks.bench_cart_optimizer [--categories 20] [--items 5000] [--runs 20]
+
+Reports latency percentiles, categories filled and total strategy score for both.
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from services.cart_optimizer import Slot, optimize_cart
+from services.scoring import score_strategy
+
+
+def greedy_cart(slots: list[Slot], budget: float) -> list[tuple[int, int]]:
+    """The pre-optimizer router loop: categories in order, min score that fits the remaining budget."""
+    picks, spend = [], 0.0
+    for k, slot in enumerate(slots):
+        fits = np.flatnonzero(spend + slot.prices <= budget)
+        if not fits.size:
+            continue
+        best = int(fits[np.argmin(slot.scores[fits])])
+        picks.append((k, best))
+        spend += float(slot.prices[best])
+    return picks
+
+
+def make_slots(rng: np.random.Generator, categories: int, items: int, strategy: str) -> list[Slot]:
+    slots = []
+    for k in range(categories):
+        prices = np.round(rng.lognormal(3.0, 0.8, items), 2)
+        delivery = rng.integers(0, 10, items)
+        scores = score_strategy(prices, delivery, strategy)
+        slots.append(Slot(f"cat{k}", prices, scores))
+    return slots
+
+
+def _summary(latencies: list[float], filled: list[int], scores: list[float]) -> dict:
+    return {
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+        "mean_filled": round(float(np.mean(filled)), 2),
+        "mean_score": round(float(np.mean(scores)), 3),
+    }
+
+
+def run(categories: int, items: int, runs: int, budget: float, strategy: str = "fastest", seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    greedy_lat, greedy_filled, greedy_score = [], [], []
+    opt_lat, opt_filled, opt_score, methods = [], [], [], set()
+    for _ in range(runs):
+        slots = make_slots(rng, categories, items, strategy)
+
+        t0 = time.perf_counter()
+        picks = greedy_cart(slots, budget)
+        greedy_lat.append((time.perf_counter() - t0) * 1000)
+        greedy_filled.append(len(picks))
+        greedy_score.append(sum(float(slots[k].scores[p]) for k, p in picks))
+
+        t0 = time.perf_counter()
+        plan = optimize_cart(slots, budget)
+        opt_lat.append((time.perf_counter() - t0) * 1000)
+        opt_filled.append(len(plan.choices))
+        opt_score.append(plan.total_score)
+        methods.add(plan.method)
+
+    return {
+        "config": {"categories": categories, "items": items, "runs": runs, "budget": budget, "strategy": strategy},
+        "greedy": _summary(greedy_lat, greedy_filled, greedy_score),
+        "optimizer": {**_summary(opt_lat, opt_filled, opt_score), "methods": sorted(methods)},
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--categories", type=int, default=20)
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--budget", type=float, default=60.0)
+    parser.add_argument("--strategy", default="fastest", choices=["cheapest", "fastest", "balanced"])
+    args = parser.parse_args()
+    print(json.dumps(run(args.categories, args.items, args.runs, args.budget, args.strategy), indent=2))
+
+
+if __name__ == "__main__":
+    main()
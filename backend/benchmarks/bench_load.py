@@ -0,0 +1,165 @@
+"""
+End-to-end load scenarios against main.app served by uvicorn, with stub LLM and chain providers.
+
+    python -m benchmarks.bench_load [--requests 500] [--concurrency 32] [--llm-latency-ms 300]
+
+Scenarios: `orchestrate` (a pool of distinct prompts, so intent-cache hits and misses mix),
+`orchestrate_llm` (the same prompts with the local intent tier off, so every intent goes through
+the intent cache and the stub LLM), `orchestrate_batch` (20 intents per call) and
+`execute_payment` (3-line carts through the settlement queue). The keyword prompts are all
+answered by the local tier when it is on. Reports throughput, latency percentiles, error counts,
+the intent tier each scenario targets and how many intents each tier actually answered.
+"""
+import argparse
+import asyncio
+import json
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+import httpx
+import uvicorn
+
+from benchmarks.harness import latency_summary
+from benchmarks.stubs import KNOWN_CATEGORIES, stubbed_backend
+from services import ai_engine, intent_classifier
+
+BATCH_SIZE = 20
+
+
+def _prompt(k: int) -> str:
+    return f"Event {k}: {KNOWN_CATEGORIES[k % 4]} and {KNOWN_CATEGORIES[(k + 1) % 4]} for the team"
+
+
+def _orchestrate_body(k: int, unique_prompts: int) -> dict:
+    return {"prompt": _prompt(k % unique_prompts), "budget": 150.0, "deadline_days": 5, "strategy": "balanced"}
+
+
+SCENARIOS = {
+    "orchestrate": lambda k, unique: ("/api/orchestrate", _orchestrate_body(k, unique)),
+    "orchestrate_llm": lambda k, unique: ("/api/orchestrate", _orchestrate_body(k, unique)),
+    "orchestrate_batch": lambda k, unique: (
+        "/api/orchestrate/batch",
+        [_orchestrate_body(k * BATCH_SIZE + j, unique) for j in range(BATCH_SIZE)],
+    ),
+    "execute_payment": lambda k, unique: (
+        "/api/execute_payment",
+        [{"id": f"w{k}-{j}", "price": 5.0 + j, "vendor_id": "walmart"} for j in range(3)],
+    ),
+}
+# Intent tier each scenario exercises: "local" (keyword/trained classifier), "llm", or None.
+SCENARIO_TIERS = {"orchestrate": "local", "orchestrate_llm": "llm", "orchestrate_batch": "local", "execute_payment": None}
+
+
+@contextmanager
+def intent_tier(tier):
+    """Pin intent resolution to `tier`: for "llm", switch the local tier off and start from a cold cache."""
+    saved = intent_classifier.LOCAL_INTENT_THRESHOLD
+    if tier == "llm":
+        intent_classifier.LOCAL_INTENT_THRESHOLD = 0.0
+        ai_engine._intent_cache.backend.clear()
+    try:
+        yield
+    finally:
+        intent_classifier.LOCAL_INTENT_THRESHOLD = saved
+
+
+@contextmanager
+def serve(app):
+    """Run `app` under uvicorn on an ephemeral port in a background thread."""
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    server = uvicorn.Server(uvicorn.Config(app, log_level="warning", lifespan="on"))
+    thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        if time.monotonic() > deadline or not thread.is_alive():
+            raise RuntimeError("uvicorn did not start")
+        time.sleep(0.01)
+    try:
+        yield f"http://127.0.0.1:{sock.getsockname()[1]}"
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+        sock.close()
+
+
+async def drive(base_url: str, scenario: str, requests: int, concurrency: int, unique_prompts: int) -> dict:
+    make_request = SCENARIOS[scenario]
+    latencies: list[float] = []
+    errors = 0
+    next_index = iter(range(requests))
+
+    async def worker(client: httpx.AsyncClient):
+        nonlocal errors
+        for k in next_index:
+            path, body = make_request(k, unique_prompts)
+            t0 = time.perf_counter()
+            try:
+                response = await client.post(path, json=body)
+                ok = response.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            latencies.append((time.perf_counter() - t0) * 1000)
+            errors += not ok
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - t0
+    return {
+        **latency_summary(latencies),
+        "throughput_rps": round(requests / elapsed, 2),
+        "errors": errors,
+    }
+
+
+def run(
+    scenarios=tuple(SCENARIOS),
+    requests: int = 500,
+    concurrency: int = 32,
+    unique_prompts: int = 50,
+    llm_latency_ms: float = 300.0,
+    llm_jitter_ms: float = 100.0,
+    chain_latency_ms: float = 50.0,
+    max_tx_per_sec: float = 0.0,
+) -> dict:
+    from main import app
+
+    results = {}
+    with stubbed_backend(llm_latency_ms, llm_jitter_ms, chain_latency_ms, max_tx_per_sec), serve(app) as base_url:
+        for scenario in scenarios:
+            before = intent_classifier.STATS.snapshot()
+            with intent_tier(SCENARIO_TIERS[scenario]):
+                result = asyncio.run(drive(base_url, scenario, requests, concurrency, unique_prompts))
+            after = intent_classifier.STATS.snapshot()
+            results[scenario] = {
+                **result,
+                "intent_tier": SCENARIO_TIERS[scenario],
+                "intents_by_tier": {"local": after["local"] - before["local"], "llm": after["escalated"] - before["escalated"]},
+            }
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--unique-prompts", type=int, default=50)
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0)
+    parser.add_argument("--llm-jitter-ms", type=float, default=100.0)
+    parser.add_argument("--chain-latency-ms", type=float, default=50.0)
+    parser.add_argument("--max-tx-per-sec", type=float, default=0.0, help="Settlement pacing (0 = unpaced)")
+    args = parser.parse_args()
+    print(json.dumps(run(
+        args.scenarios, args.requests, args.concurrency, args.unique_prompts,
+        args.llm_latency_ms, args.llm_jitter_ms, args.chain_latency_ms, args.max_tx_per_sec,
+    ), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Micro-benchmarks for the orchestration hot path at several catalog sizes.
+
+    python -m benchmarks.bench_micro [--sizes 10 10000 1000000] [--runs 20]
+
+Cases per size: scalar `calculate_score` over every item, the NumPy batch scorer, candidate
+filtering on the indexed catalog, and cart assembly (filter + score + optimize) across categories.
+"""
+import argparse
+import json
+
+import numpy as np
+
+from benchmarks.harness import time_call
+from services import cart_optimizer, scoring
+from services.ai_engine import calculate_score
+from services.catalog import Catalog, CatalogItem
+
+CATEGORIES = ("snacks", "badges", "adapters", "prizes")
+VENDORS = ("amazon", "walmart", "tech_direct")
+DEFAULT_SIZES = (10, 10_000, 1_000_000)
+
+
+def make_catalog(size: int, seed: int = 0) -> Catalog:
+    rng = np.random.default_rng(seed)
+    prices = np.round(rng.lognormal(3.0, 0.8, size), 2).tolist()
+    delivery = rng.integers(0, 10, size).tolist()
+    categories = rng.integers(0, len(CATEGORIES), size).tolist()
+    vendors = rng.integers(0, len(VENDORS), size).tolist()
+    return Catalog(
+        CatalogItem(f"b{k}", f"Item {k}", prices[k], delivery[k], CATEGORIES[categories[k]], VENDORS[vendors[k]])
+        for k in range(size)
+    )
+
+
+def _runs_for(size: int, runs: int) -> int:
+    return runs if size <= 10_000 else max(3, runs // 10)
+
+
+def bench_size(size: int, runs: int, budget: float, deadline_days: int, strategy: str, seed: int = 0) -> dict:
+    catalog = make_catalog(size, seed)
+    runs = _runs_for(size, runs)
+    dicts = [item.as_dict() for item in catalog.items]
+    price = np.array([item.price for item in catalog.items])
+    delivery = np.array([item.delivery_days for item in catalog.items], dtype=np.float64)
+
+    def assemble():
+        slots = []
+        for category in CATEGORIES:
+            index = catalog.category(category)
+            positions = index.candidate_positions(budget, deadline_days)
+            if positions.size:
+                prices = index.price_column[positions]
+                scores = scoring.score_strategy(prices, index.delivery_column[positions], strategy)
+                slots.append(cart_optimizer.Slot(category, prices, scores))
+        return cart_optimizer.optimize_cart(slots, budget)
+
+    return {
+        "calculate_score_scalar": time_call(lambda: [calculate_score(d, strategy) for d in dicts], runs),
+        "calculate_score_batch": time_call(lambda: scoring.score_strategy(price, delivery, strategy), runs),
+        "candidate_filter": time_call(
+            lambda: [catalog.category(c).candidate_positions(budget, deadline_days) for c in CATEGORIES], runs
+        ),
+        "cart_assembly": time_call(assemble, runs),
+    }
+
+
+def run(sizes=DEFAULT_SIZES, runs: int = 20, budget: float = 100.0, deadline_days: int = 5, strategy: str = "balanced") -> dict:
+    return {f"n={size}": bench_size(size, runs, budget, deadline_days, strategy) for size in sizes}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--budget", type=float, default=100.0)
+    parser.add_argument("--deadline-days", type=int, default=5)
+    parser.add_argument("--strategy", default="balanced", choices=list(scoring.STRATEGIES))
+    args = parser.parse_args()
+    print(json.dumps(run(args.sizes, args.runs, args.budget, args.deadline_days, args.strategy), indent=2))
+
+
+if __name__ == "__main__":
+    main()
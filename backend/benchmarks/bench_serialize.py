@@ -0,0 +1,77 @@
+"""
+Per-item cost of serializing orchestration results, model path vs fast path.
+
+    python -m benchmarks.bench_serialize [--items 10 1000 10000] [--runs 20]
+
+`pydantic`: a ProcurementOption per item, model_dump(), then FastAPI's jsonable_encoder and
+JSONResponse rendering, as the API did before. `fast`: plain option records encoded straight to
+bytes (utils.fast_json), as it does now. Both produce the same document.
+"""
+import argparse
+import json
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from benchmarks.harness import time_call
+from models.schemas import ProcurementOption
+from routers.procurement import MOCK_AUTHORIZED_VENDORS, _option_record
+from utils import fast_json
+
+DEFAULT_ITEMS = (10, 1_000, 10_000)
+VENDORS = tuple(MOCK_AUTHORIZED_VENDORS)
+
+
+def make_fields(n: int) -> list[dict]:
+    return [
+        {
+            "id": f"b{k}", "name": f"Item {k}", "price": round(5 + k % 97 * 1.37, 2), "delivery_days": k % 7,
+            "category": "snacks", "vendor_id": VENDORS[k % len(VENDORS)], "ai_score": round(k % 101 / 101, 4),
+            **({"original_price": round(6 + k % 97 * 1.37, 2), "negotiated_discount": 10} if k % 4 == 0 else {}),
+        }
+        for k in range(n)
+    ]
+
+
+def _cart(options: list[dict]) -> dict:
+    return {"options": options, "alternatives": {}, "telemetry": {"model": "bench"}}
+
+
+def serialize_pydantic(fields: list[dict]) -> bytes:
+    options = [ProcurementOption(**{k: v for k, v in record.items() if k in ProcurementOption.model_fields}).model_dump()
+               for record in (_option_record(f, fields, "balanced") for f in fields)]
+    return JSONResponse(jsonable_encoder(_cart(options))).body
+
+
+def serialize_fast(fields: list[dict]) -> bytes:
+    return fast_json.FastJSONResponse(_cart([_option_record(f, fields, "balanced") for f in fields])).body
+
+
+def _per_item(summary: dict, n: int) -> dict:
+    return {**summary, "per_item_us": round(summary["p50_ms"] * 1000 / n, 3)}
+
+
+def run(items=DEFAULT_ITEMS, runs: int = 20) -> dict:
+    results = {}
+    for n in items:
+        fields = make_fields(n)
+        assert json.loads(serialize_pydantic(fields)) == json.loads(serialize_fast(fields))
+        pydantic, fast = time_call(lambda: serialize_pydantic(fields), runs), time_call(lambda: serialize_fast(fields), runs)
+        results[f"n={n}"] = {
+            "pydantic": _per_item(pydantic, n),
+            "fast": _per_item(fast, n),
+            "speedup": round(pydantic["p50_ms"] / fast["p50_ms"], 2) if fast["p50_ms"] else None,
+        }
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--items", type=int, nargs="+", default=list(DEFAULT_ITEMS))
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+    print(json.dumps(run(args.items, args.runs), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Cold-start cost of the API: wall time to `import main` in a fresh interpreter.
+
+    python -m benchmarks.bench_startup [--runs 5]
+
+Every run is a new subprocess with provider keys set, so the measurement includes what a worker
+pays before serving its first request. Also reports the slowest top-level imports (from
+`python -X importtime`) and which heavy SDKs were loaded eagerly; lazily registered SDKs
+(see utils.sdk_registry) should not appear there.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from benchmarks.harness import latency_summary
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_SDKS = ("groq", "openai", "google.generativeai", "web3", "eth_utils", "requests")
+# Keys make ai_engine configure every provider, as in production.
+_ENV = {"GROQ_API_KEY": "bench", "OPENAI_API_KEY": "bench", "GEMINI_API_KEY": "bench", "FLUX_WARM_SDKS": ""}
+
+_SCRIPT = (
+    "import json, sys, time; t0 = time.perf_counter(); import main; "
+    "ms = (time.perf_counter() - t0) * 1000; "
+    f"print(json.dumps({{'ms': ms, 'loaded': [m for m in {HEAVY_SDKS!r} if m in sys.modules]}}))"
+)
+
+
+def _python(args: list[str]) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *args],
+        cwd=BACKEND_DIR, env={**os.environ, **_ENV},
+        capture_output=True, text=True, timeout=120, check=True,
+    )
+
+
+def measure_import() -> dict:
+    """One fresh-interpreter `import main`: {"ms", "loaded"}."""
+    return json.loads(_python(["-c", _SCRIPT]).stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(limit: int = 10) -> list[dict]:
+    """Modules imported on behalf of `main`, by cumulative import time (from `-X importtime`)."""
+    subtree: list[tuple[str, int]] = []
+    for line in _python(["-X", "importtime", "-c", "import main"]).stderr.splitlines():
+        parts = line[len("import time:"):].split("|") if line.startswith("import time:") else []
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        # A module's imports are listed, indented, just before it; a top-level line closes a subtree.
+        name = parts[2][1:]
+        if not name.startswith(" "):
+            if name == "main":
+                break
+            subtree = []
+        else:
+            subtree.append((name.strip(), int(parts[1])))
+    ranked = sorted(subtree, key=lambda entry: -entry[1])[:limit]
+    return [{"module": name, "cumulative_ms": round(us / 1000, 1)} for name, us in ranked]
+
+
+def run(runs: int = 5) -> dict:
+    samples = [measure_import() for _ in range(runs)]
+    return {
+        "import_main": latency_summary([s["ms"] for s in samples]),
+        "eager_sdks": sorted({m for s in samples for m in s["loaded"]}),
+        "slowest_imports": slowest_imports(),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    print(json.dumps(run(args.runs), indent=2))
+
+
+if __name__ == "__main__":
+    main()
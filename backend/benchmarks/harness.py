@@ -0,0 +1,115 @@
+"""
+Shared plumbing for the benchmark suite: timing, run metadata, JSON results and regression checks.
+"""
+import json
+import platform
+import subprocess
+import time
+from typing import Callable, Optional
+
+import numpy as np
+
+# Latencies below this are dominated by timer noise and never count as regressions.
+NOISE_FLOOR_MS = 0.05
+MIN_SAMPLE_SEC = 0.005
+# Micro cases gate on the median (their p95 over a few samples is mostly scheduler noise);
+# load scenarios gate on tail latency and throughput; startup gates on median import time.
+GATED_METRICS = {
+    "micro": ("p50_ms",), "serialize": ("p50_ms",), "load": ("p95_ms", "throughput_rps"), "startup": ("p50_ms",),
+}
+
+
+def latency_summary(latencies_ms: list[float]) -> dict:
+    return {
+        "runs": len(latencies_ms),
+        "mean_ms": round(float(np.mean(latencies_ms)), 4),
+        "p50_ms": round(float(np.percentile(latencies_ms, 50)), 4),
+        "p95_ms": round(float(np.percentile(latencies_ms, 95)), 4),
+        "p99_ms": round(float(np.percentile(latencies_ms, 99)), 4),
+    }
+
+
+def time_call(fn: Callable[[], object], runs: int, warmup: int = 2) -> dict:
+    """Per-call latency over `runs` samples. Fast calls are repeated within each sample (timeit
+    style, until a sample lasts MIN_SAMPLE_SEC) so sub-millisecond cases are not timer noise."""
+    for _ in range(warmup):
+        fn()
+    number = 1
+    while number < 100_000:
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        if time.perf_counter() - t0 >= MIN_SAMPLE_SEC:
+            break
+        number *= 10
+    latencies = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        latencies.append((time.perf_counter() - t0) * 1000 / number)
+    return {**latency_summary(latencies), "calls_per_sample": number}
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def run_metadata(config: dict) -> dict:
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "config": config,
+    }
+
+
+def write_results(path: str, results: dict) -> None:
+    with open(path, "w") as fh:
+        json.dump(results, fh, indent=2, sort_keys=True)
+        fh.write("\n")
+
+
+def load_results(path: str) -> dict:
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def _flatten(results: dict, prefix: str = "") -> dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = float(value)
+    return flat
+
+
+def find_regressions(current: dict, baseline: dict, threshold: float) -> list[dict]:
+    """Compare the `cases` sections of two result files.
+
+    Gated metrics are per section (GATED_METRICS): a latency more than `threshold` (fractional)
+    above the baseline, or a throughput more than `threshold` below it, is a regression. Metrics
+    missing from either side are ignored.
+    """
+    now, before = _flatten(current.get("cases", {})), _flatten(baseline.get("cases", {}))
+    regressions = []
+    for name, value in sorted(now.items()):
+        old = before.get(name)
+        metric = name.rsplit(".", 1)[-1]
+        if old is None or old <= 0 or metric not in GATED_METRICS.get(name.split(".", 1)[0], ()):
+            continue
+        if metric == "throughput_rps":
+            if value >= old * (1 - threshold):
+                continue
+        elif max(value, old) < NOISE_FLOOR_MS or value <= old * (1 + threshold):
+            continue
+        regressions.append({"metric": name, "baseline": old, "current": value, "change": round(value / old - 1, 3)})
+    return regressions
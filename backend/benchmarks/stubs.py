@@ -0,0 +1,109 @@
+"""
+In-process stand-ins for the LLM providers and the Arc RPC node, with configurable latency, so
+load scenarios measure the backend rather than third-party services.
+"""
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from services import ai_engine, llm_providers, payment_solver, settlement_queue
+
+KNOWN_CATEGORIES = ("snacks", "badges", "adapters", "prizes")
+# Throwaway key for the stub chain only; never funded anywhere.
+STUB_PRIVATE_KEY = "0x" + "00" * 31 + "01"
+
+
+class StubLLMProvider(llm_providers.LLMProvider):
+    """Answers intent prompts after `latency_ms` (+ uniform jitter) without any network I/O."""
+
+    def __init__(self, latency_ms: float, jitter_ms: float = 0.0, seed: int = 0):
+        super().__init__("stub", "stub", "Stub LLM", client_factory=lambda http: None)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self._rng = random.Random(seed)
+
+    async def complete_intent(self, prompt: str) -> list[str]:
+        t0 = time.perf_counter()
+        await asyncio.sleep((self.latency_ms + self._rng.uniform(0, self.jitter_ms)) / 1000)
+        self.latency.record(time.perf_counter() - t0)
+        self.breaker.record_success()
+        return [c for c in KNOWN_CATEGORIES if c in prompt.lower()] or ["snacks", "badges"]
+
+
+class StubChainHandler(BaseHTTPRequestHandler):
+    """JSON-RPC node answering the calls the settlement engine makes, after `latency_ms` per request."""
+
+    latency_ms = 0.0
+    requests_served = 0
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        time.sleep(type(self).latency_ms / 1000)
+        type(self).requests_served += 1
+        batch = payload if isinstance(payload, list) else [payload]
+        results = []
+        for call in batch:
+            method = call["method"]
+            if method == "eth_getTransactionCount":
+                result = "0x0"
+            elif method == "eth_gasPrice":
+                result = "0x3b9aca00"
+            elif method == "eth_chainId":
+                result = "0x1"
+            elif method == "eth_getTransactionReceipt":
+                result = {"status": "0x1"}
+            else:
+                result = "0x" + "ab" * 32
+            results.append({"jsonrpc": "2.0", "id": call["id"], "result": result})
+        body = json.dumps(results if isinstance(payload, list) else results[0]).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@contextmanager
+def stub_chain(latency_ms: float):
+    StubChainHandler.latency_ms = latency_ms
+    StubChainHandler.requests_served = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubChainHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@contextmanager
+def stubbed_backend(llm_latency_ms: float, llm_jitter_ms: float, chain_latency_ms: float, max_tx_per_sec: float):
+    """Point ai_engine and settlement at the stubs for the duration; restores the originals after."""
+    saved = (ai_engine._providers, payment_solver._engine, settlement_queue._scheduler, os.environ.get("PAYMENT_PRIVATE_KEY"))
+    with stub_chain(chain_latency_ms) as rpc_url:
+        try:
+            ai_engine._providers = [StubLLMProvider(llm_latency_ms, llm_jitter_ms)]
+            ai_engine._intent_cache.backend.clear()
+            engine = payment_solver.SettlementEngine(rpc_url=rpc_url, chain_id=1)
+            payment_solver._engine = engine
+            os.environ["PAYMENT_PRIVATE_KEY"] = STUB_PRIVATE_KEY
+            settlement_queue._scheduler = settlement_queue.SettlementScheduler(
+                engine, STUB_PRIVATE_KEY, max_tx_per_sec=max_tx_per_sec
+            )
+            yield
+        finally:
+            ai_engine._providers, payment_solver._engine, settlement_queue._scheduler, key = saved
+            if key is None:
+                os.environ.pop("PAYMENT_PRIVATE_KEY", None)
+            else:
+                os.environ["PAYMENT_PRIVATE_KEY"] = key
+            ai_engine._intent_cache.backend.clear()
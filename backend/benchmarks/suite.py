@@ -0,0 +1,71 @@
+"""
+Run the micro, serialization, load and startup benchmarks, write one JSON result file, and
+optionally gate on a baseline.
+
+    python -m benchmarks.suite --out bench.json [--baseline previous.json] [--threshold 0.2]
+    python -m benchmarks.suite --quick --skip-load --out smoke.json
+
+Exits with status 1 when a gated latency rose, or throughput fell, by more than the threshold
+relative to the baseline (median latency for micro and serialization cases and `import main`;
+p95 and throughput for load scenarios).
+"""
+import argparse
+import json
+import sys
+
+from benchmarks import bench_load, bench_micro, bench_serialize, bench_startup
+from benchmarks.harness import find_regressions, load_results, run_metadata, write_results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--out", required=True, help="Where to write the JSON results")
+    parser.add_argument("--baseline", help="Earlier result file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed fractional slowdown (0.2 = 20%%)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(bench_micro.DEFAULT_SIZES))
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0)
+    parser.add_argument("--chain-latency-ms", type=float, default=50.0)
+    parser.add_argument("--skip-micro", action="store_true")
+    parser.add_argument("--items", type=int, nargs="+", default=list(bench_serialize.DEFAULT_ITEMS))
+    parser.add_argument("--skip-serialize", action="store_true")
+    parser.add_argument("--startup-runs", type=int, default=5)
+    parser.add_argument("--skip-load", action="store_true")
+    parser.add_argument("--skip-startup", action="store_true")
+    parser.add_argument("--quick", action="store_true", help="Small sizes and request counts, for smoke runs")
+    args = parser.parse_args(argv)
+    if args.quick:
+        args.sizes, args.items, args.runs, args.requests, args.startup_runs = [10, 10_000], [10, 1_000], 5, 50, 2
+
+    config = {k: v for k, v in vars(args).items() if k not in ("out", "baseline")}
+    results = {"meta": run_metadata(config), "cases": {}}
+    if not args.skip_micro:
+        results["cases"]["micro"] = bench_micro.run(args.sizes, args.runs)
+    if not args.skip_serialize:
+        results["cases"]["serialize"] = bench_serialize.run(args.items, args.runs)
+    if not args.skip_load:
+        results["cases"]["load"] = bench_load.run(
+            requests=args.requests,
+            concurrency=args.concurrency,
+            llm_latency_ms=args.llm_latency_ms,
+            chain_latency_ms=args.chain_latency_ms,
+        )
+    if not args.skip_startup:
+        results["cases"]["startup"] = bench_startup.run(args.startup_runs)
+    write_results(args.out, results)
+
+    if args.baseline:
+        regressions = find_regressions(results, load_results(args.baseline), args.threshold)
+        results["regressions"] = regressions
+        write_results(args.out, results)
+        if regressions:
+            print(json.dumps({"regressions": regressions}, indent=2))
+            return 1
+    print(json.dumps(results["cases"], indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
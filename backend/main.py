@@ -1,9 +1,14 @@
+import asyncio
 import os
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv, find_dotenv
 from routers.procurement import router as procurement_router
-from utils.logger import setup_logging
+from services import admission, ai_engine, intent_classifier, llm_providers, settlement_queue, vendor_quotes
+from utils import logger, sdk_registry, tracing
+
 
 # Load Environment Variables
 load_dotenv(find_dotenv())
@@ -19,12 +24,29 @@ if not _has_gemini:
 if (_has_openai or _has_groq) and _has_gemini:
     print("[OK] Flux OS: AI engines configured.")
 
-setup_logging()
+logger.setup_logging()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Optional SDK warm-up runs off the event loop, so the server accepts traffic immediately
+    warm = sdk_registry.warm_names()
+    if warm is None or warm:  # None means warm every registered SDK
+        asyncio.get_running_loop().run_in_executor(None, sdk_registry.warm, warm)
+    # Reconcile carts a previous process left mid-settlement before new payments take nonces
+    settlement_queue.start()
+    yield
+    # Stop the settlement worker and drain the pooled LLM and quote-feed connections on shutdown
+    await settlement_queue.shutdown()
+    await llm_providers.aclose()
+    await vendor_quotes.aclose()
+
 
 app = FastAPI(
     title="Flux OS API",
     description="Cognitive Layer for Autonomous Commerce",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Standard Middleware for Frontend connectivity
@@ -35,6 +57,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(tracing.RequestTimingMiddleware)
 
 # Root Health Check
 @app.get("/")
@@ -42,8 +65,27 @@ async def health_check():
     return {
         "status": "online", 
         "agent": "Flux OS",
-        "kernel": "ArcFlow Deterministic"
+        "kernel": "ArcFlow Deterministic",
+        "llm_providers": ai_engine.provider_health(),
+        "sdks": sdk_registry.status(),
+        "intent_tiers": intent_classifier.STATS.snapshot(),
     }
 
+# Stage latency quantiles (Prometheus text format)
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    body = (
+        tracing.REGISTRY.render_prometheus()
+        + admission.render_prometheus()
+        + intent_classifier.STATS.render_prometheus()
+        + logger.render_prometheus()
+    )
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+# Admission control: rate-limited or shed requests get 429 with a Retry-After hint
+@app.exception_handler(admission.AdmissionRejected)
+async def admission_rejected(request: Request, exc: admission.AdmissionRejected):
+    return JSONResponse(status_code=429, content={"detail": str(exc)}, headers={"Retry-After": str(exc.retry_after)})
+
 # Registered API Routes
 app.include_router(procurement_router, prefix="/api")
\ No newline at end of file
@@ -7,6 +7,19 @@ class UserRequest(BaseModel):
     budget: float
     deadline_days: int
     strategy: str = "balanced"
+    seed: Optional[int] = None  # negotiation seed; defaults to one derived from the request
+
+
+class RerankRequest(BaseModel):
+    """Fields to change on a cached cart; omitted fields keep the cart's current value."""
+    strategy: Optional[str] = None
+    budget: Optional[float] = None
+    deadline_days: Optional[int] = None
+
+
+class CartSwapRequest(BaseModel):
+    category: str
+    option_id: Optional[str] = None  # a specific runner-up; defaults to the best one
 
 
 class ProcurementOption(BaseModel):
@@ -1,16 +1,32 @@
 import asyncio
-import logging
-import random
 import os
+import time
+from typing import AsyncIterator, NamedTuple, Optional
 
-from fastapi import APIRouter, HTTPException, UploadFile, File
-from models.schemas import ProcurementOption, UserRequest
-from services import ai_engine
-from services.payment_solver import execute_payment as execute_payment_onchain
+import numpy as np
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from models.schemas import CartSwapRequest, RerankRequest, UserRequest
+from services import (
+    admission, ai_engine, cart_optimizer, cart_sessions, document_ingest, intent_classifier, negotiation, scoring,
+    settlement_journal, settlement_queue, vendor_quotes,
+)
+from services.catalog import Catalog, get_catalog
+from services.intent_cache import normalize_prompt
 from services.payment_solver import PolicyViolation
+from utils import fast_json, tracing
+from utils.fast_json import FastJSONResponse
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
 
 # ---- CONFIG ----
 ORCHESTRATION_TIMEOUT_SEC = 120
+SSE_KEEPALIVE_SEC = 15
+BATCH_MAX_REQUESTS = int(os.environ.get("FLUX_BATCH_MAX_REQUESTS", "100"))
+BATCH_INTENT_CONCURRENCY = int(os.environ.get("FLUX_BATCH_INTENT_CONCURRENCY", "8"))
+# Build candidate sets for the keyword-guessed categories while the LLM parses intent (see _speculate).
+SPECULATIVE_PREFETCH = os.environ.get("FLUX_SPECULATIVE_PREFETCH", "1").lower() not in ("0", "false", "no", "off")
 router = APIRouter(tags=["procurement"])
 
 # ---- TRUSTED VENDORS ----
@@ -20,45 +36,19 @@ MOCK_AUTHORIZED_VENDORS = {
     "tech_direct": {"name": "TechData", "trust_score": 92, "chain_id": "0xTch...77"},
 }
 
-SCENARIO_C_CATEGORIES = ["snacks", "badges", "adapters", "prizes"]
-
-# ---- INVENTORY ----
-def generate_dynamic_inventory() -> list[dict]:
-    base = [
-        {"id": "a1", "name": "Bulk Energy Drinks (24pk)", "price": 45.00, "delivery_days": 2, "category": "snacks", "vendor_id": "amazon"},
-        {"id": "a2", "name": "Hackathon Lanyards (100ct)", "price": 25.00, "delivery_days": 2, "category": "badges", "vendor_id": "amazon"},
-        {"id": "a3", "name": "Participant Badges & Holders", "price": 35.00, "delivery_days": 3, "category": "badges", "vendor_id": "amazon"},
-        {"id": "w1", "name": "Party Size Chips & Dip", "price": 18.00, "delivery_days": 1, "category": "snacks", "vendor_id": "walmart"},
-        {"id": "w2", "name": "Peel-and-Stick Name Tags (50ct)", "price": 5.00, "delivery_days": 0, "category": "badges", "vendor_id": "walmart"},
-        {"id": "w3", "name": "Hackathon Snack Variety Pack", "price": 32.00, "delivery_days": 1, "category": "snacks", "vendor_id": "walmart"},
-        {"id": "t1", "name": "Universal Travel Adapter (6-pack)", "price": 28.00, "delivery_days": 3, "category": "adapters", "vendor_id": "tech_direct"},
-        {"id": "t2", "name": "USB-C Hub (Prize)", "price": 45.00, "delivery_days": 4, "category": "prizes", "vendor_id": "tech_direct"},
-        {"id": "t3", "name": "Smart Home Hub (Grand Prize)", "price": 120.00, "delivery_days": 4, "category": "prizes", "vendor_id": "tech_direct"},
-        {"id": "a4", "name": "Coffee & Tea Station Kit", "price": 55.00, "delivery_days": 2, "category": "snacks", "vendor_id": "amazon"},
-        {"id": "t4", "name": "International Power Strip", "price": 22.00, "delivery_days": 3, "category": "adapters", "vendor_id": "tech_direct"},
-    ]
-    return [i for i in base if i["category"] in SCENARIO_C_CATEGORIES]
-
-# ---- COUPON SIMULATION ----
-def apply_coupon_event(item: dict) -> dict:
-    if random.random() > 0.25:
-        return item
-    discount_pct = random.choice([5, 10, 15])
-    original = item["price"]
-    new_price = round(original * (1 - discount_pct / 100), 2)
-    return {**item, "original_price": original, "price": new_price, "negotiated_discount": discount_pct}
+SCENARIO_C_CATEGORIES = list(intent_classifier.CATEGORIES)
 
 # ---- CORE ORCHESTRATION ----
-async def _run_orchestration(intent_request: UserRequest) -> dict:
-    loop = asyncio.get_running_loop()
-
+async def _parse_intent(intent_request: UserRequest) -> tuple[list[str], dict]:
     try:
         categories, cognitive_telemetry = await asyncio.wait_for(
-            loop.run_in_executor(None, lambda: ai_engine.parse_intent_ai(intent_request.prompt)),
+            ai_engine.parse_intent_ai(intent_request.prompt),
             timeout=55.0,
         )
+    except admission.AdmissionRejected:
+        raise
     except Exception as e:
-        logging.warning(f"AI intent parsing failed, fallback triggered: {e}")
+        logger.warning(f"AI intent parsing failed, fallback triggered: {e}")
         categories = ["snacks", "badges"]
         cognitive_telemetry = {"fallback": True}
 
@@ -67,69 +57,435 @@ async def _run_orchestration(intent_request: UserRequest) -> dict:
         categories = [categories] if isinstance(categories, str) else list(categories) if categories else []
     if not categories:
         categories = ["snacks", "badges"]
+    if not isinstance(cognitive_telemetry, dict):
+        cognitive_telemetry = {}
+    return categories, cognitive_telemetry
 
-    inventory = generate_dynamic_inventory()
-    flux_cart: list[ProcurementOption] = []
-    current_spend = 0.0
+async def _traced_parse_intent(intent_request: UserRequest, trace: tracing.Trace) -> tuple[list[str], dict]:
+    with tracing.span("orchestrate.parse_intent", trace):
+        return await _parse_intent(intent_request)
 
-    for category in categories:
-        all_cands = [i for i in inventory if i["category"] == category and (current_spend + i["price"]) <= intent_request.budget]
-        if not all_cands:
-            continue
+class _Candidates(NamedTuple):
+    """One category's budget- and deadline-filtered, negotiated and scored candidates (slot is None if empty)."""
+    slot: Optional[cart_optimizer.Slot]
+    items: list
+    discounts: Optional[np.ndarray]
+    top: list[dict]
 
-        for c in all_cands:
-            c["ai_score"] = ai_engine.calculate_score(c, intent_request.strategy)
-
-        best_item = min(all_cands, key=lambda x: x["ai_score"])
-        best_item = apply_coupon_event(best_item)
-        ai_reason = ai_engine.derive_ai_reason(best_item, all_cands, intent_request.strategy)
-
-        opt = ProcurementOption(
-            id=best_item["id"],
-            name=best_item["name"],
-            price=best_item["price"],
-            vendor_name=MOCK_AUTHORIZED_VENDORS[best_item["vendor_id"]]["name"],
-            vendor_id=best_item["vendor_id"],
-            trust_score=MOCK_AUTHORIZED_VENDORS[best_item["vendor_id"]]["trust_score"],
-            delivery_days=best_item["delivery_days"],
-            ai_score=best_item["ai_score"],
-            reason=f"Optimizing {intent_request.strategy} strategy.",
-            ai_reason=ai_reason,
-            original_price=best_item.get("original_price"),
+class _Speculation(NamedTuple):
+    """Work done while the LLM parses: candidates and a provisional cart for the keyword guess."""
+    guess: list[str]
+    candidates: dict[str, _Candidates]
+    plan: cart_optimizer.CartPlan
+
+def _category_candidates(
+    catalog: Catalog,
+    offers,
+    seed: int,
+    trust_table: np.ndarray,
+    authorized: np.ndarray,
+    category: str,
+    intent_request: UserRequest,
+    trace: tracing.Trace,
+    quotes: Optional[vendor_quotes.QuoteOverlay] = None,
+) -> _Candidates:
+    with tracing.span("orchestrate.catalog_filter", trace):
+        index = catalog.category(category)
+        # Widened by the deepest discount so an item that only fits after negotiation is kept.
+        widened = negotiation.widened_budget(intent_request.budget)
+        live = quotes.columns(category, index) if quotes is not None else None
+        if live is None:
+            price_column, delivery_column = index.price_column, index.delivery_column
+            positions = index.candidate_positions(widened, intent_request.deadline_days)
+        else:
+            # Live quotes break the price order the binary search relies on, so scan the category.
+            price_column, delivery_column = live
+            positions = np.flatnonzero((price_column <= widened) & (delivery_column <= intent_request.deadline_days))
+        # Feeds may list merchants settlement would refuse; they are never offered.
+        positions = positions[authorized[index.vendor_column[positions]]]
+    with tracing.span("orchestrate.negotiation", trace):
+        discounts = offers.discounts(category, seed)[positions]
+        prices = negotiation.effective_prices(price_column[positions], discounts)
+        fits = prices <= intent_request.budget
+        positions, discounts, prices = positions[fits], discounts[fits], prices[fits]
+    if not positions.size:
+        return _Candidates(None, [], None, [])
+    with tracing.span("orchestrate.scoring", trace):
+        scores = scoring.score_strategy(
+            prices,
+            delivery_column[positions],
+            intent_request.strategy,
+            trust=trust_table[index.vendor_column[positions]],
         )
+    items = [index.by_price[p] for p in positions.tolist()]
+    if live is not None:
+        items = [
+            item._replace(price=float(price_column[p]), delivery_days=int(delivery_column[p]))
+            for item, p in zip(items, positions.tolist())
+        ]
+    top = [
+        {"id": items[i].id, "price": float(prices[i]), "ai_score": float(scores[i])}
+        for i in scoring.top_k(scores, 3).tolist()
+    ]
+    return _Candidates(cart_optimizer.Slot(category, prices, scores), items, discounts, top)
+
+def _speculate(intent_request: UserRequest, candidates_for, trace: tracing.Trace) -> _Speculation:
+    guess = intent_classifier.guess_categories(intent_request.prompt)
+    with tracing.span("orchestrate.speculate", trace):
+        candidates = {c: candidates_for(c) for c in guess}
+        with tracing.span("orchestrate.optimize", trace):
+            plan = cart_optimizer.optimize_cart([c.slot for c in candidates.values() if c.slot is not None], intent_request.budget)
+    return _Speculation(guess, candidates, plan)
+
+async def _orchestration_events(
+    intent_request: UserRequest,
+    parsed: Optional[tuple[list[str], dict]] = None,
+    catalog: Optional[Catalog] = None,
+    session: Optional[cart_sessions.CartSession] = None,
+) -> AsyncIterator[tuple[str, dict]]:
+    """Orchestration as a sequence of (event, payload) steps. The last event is always
+    `final_cart`, whose payload is the /orchestrate response body.
+
+    `parsed` (categories, telemetry) skips intent parsing and `catalog` pins the snapshot; the batch
+    endpoint passes both. The cart is kept in a cart session (a new one unless `session` is given,
+    as on re-rank, which also reuses the session's quote overlay) and its `cart_id` is returned. Spans never straddle a yield, so a slow stream
+    consumer is not billed to any stage."""
+    trace = tracing.Trace(parent=tracing.current_trace())
+    catalog = catalog or get_catalog()
+    # Negotiated offers are a pure function of (seed, vendor, SKU): the same request (or an explicit
+    # seed) always sees the same discounts, and they are applied before scoring and optimization.
+    seed = negotiation.resolve_seed(
+        intent_request.seed, intent_request.prompt, intent_request.budget,
+        intent_request.deadline_days, intent_request.strategy,
+    )
+    offers = negotiation.offer_book(catalog)
+    # Trailing 0 is the trust of vendor code -1 (a vendor missing from the catalog's vendor table).
+    trust_table = np.array([MOCK_AUTHORIZED_VENDORS.get(v, {}).get("trust_score", 0) for v in catalog.vendors] + [0])
+    authorized = np.array([v in MOCK_AUTHORIZED_VENDORS for v in catalog.vendors] + [False])
+
+    def candidates_for(category: str) -> _Candidates:
+        return _category_candidates(catalog, offers, seed, trust_table, authorized, category, intent_request, trace, quotes)
+
+    # Live vendor quotes are gathered alongside intent parsing; bounded by the quote deadline. A
+    # re-rank reuses the overlay its cart was priced with, so it neither waits on nor reprices from feeds.
+    if session is not None:
+        gathering = asyncio.get_running_loop().create_future()
+        gathering.set_result((session.quotes, session.quote_status))
+    else:
+        gathering = asyncio.ensure_future(vendor_quotes.AGGREGATOR.overlay(catalog))
+    speculation: Optional[_Speculation] = None
+    if parsed is None:
+        parse = asyncio.ensure_future(_traced_parse_intent(intent_request, trace))
+        quotes, quote_status = await gathering
+        if SPECULATIVE_PREFETCH and ai_engine.intent_needs_llm(intent_request.prompt):
+            # Candidate sets and a provisional cart for the keyword guess are built in a worker
+            # thread while the LLM call is in flight. Local-tier and cached answers are too quick
+            # for that to pay off, so they skip it.
+            prefetch = asyncio.get_running_loop().run_in_executor(
+                None, _speculate, intent_request, candidates_for, trace
+            )
+            (categories, cognitive_telemetry), speculation = await asyncio.gather(parse, prefetch)
+        else:
+            categories, cognitive_telemetry = await parse
+    else:
+        quotes, quote_status = await gathering
+        categories, cognitive_telemetry = parsed[0], dict(parsed[1])
+    intent_telemetry = dict(cognitive_telemetry)
+    yield "intent_parsed", {"categories": categories, "telemetry": cognitive_telemetry}
+
+    # One slot per distinct category; the deadline is a per-item bound, so it is applied here.
+    wanted = list(dict.fromkeys(c for c in categories if isinstance(c, str)))
+    slots: list[cart_optimizer.Slot] = []
+    slot_items: list[list] = []
+    slot_discounts: list[np.ndarray] = []
+    for category in wanted:
+        found = speculation.candidates.get(category) if speculation is not None else None
+        found = found or candidates_for(category)
+        if found.slot is None:
+            yield "category_candidates", {"category": category, "candidates": 0, "top": []}
+            continue
+        slots.append(found.slot)
+        slot_items.append(found.items)
+        slot_discounts.append(found.discounts)
+        yield "category_candidates", {"category": category, "candidates": len(found.items), "top": found.top}
+
+    if speculation is not None and speculation.guess == wanted:
+        # The LLM confirmed the keyword guess: the provisional cart is the answer.
+        plan, outcome = speculation.plan, "confirmed"
+    else:
+        with tracing.span("orchestrate.optimize", trace):
+            plan = cart_optimizer.optimize_cart(slots, intent_request.budget)
+        outcome = "trimmed" if speculation is not None and set(wanted) <= set(speculation.guess) else "replanned"
+    if speculation is not None:
+        cognitive_telemetry["speculation"] = {"guess": speculation.guess, "outcome": outcome}
 
-        flux_cart.append(opt)
-        current_spend += best_item["price"]
+    def to_option(k: int, i: int) -> dict:
+        slot, item = slots[k], slot_items[k][i]
+        fields = {**item.as_dict(), "price": float(slot.prices[i]), "ai_score": float(slot.scores[i])}
+        discount = int(slot_discounts[k][i])
+        if discount:
+            fields.update(original_price=item.price, negotiated_discount=discount)
+        with tracing.span("orchestrate.serialize", trace):
+            return _option_record(fields, slot_items[k], intent_request.strategy)
 
-    return {"options": [o.model_dump() for o in flux_cart], "telemetry": cognitive_telemetry}
+    options: list[dict] = []
+    alternatives: dict[str, list[dict]] = {}
+    for choice in plan.choices:
+        category = slots[choice.slot].category
+        option = to_option(choice.slot, choice.pick)
+        alternatives[category] = [to_option(choice.slot, i) for i in choice.alternatives]
+        options.append(option)
+        yield "item_selected", {"category": category, "option": option, "alternatives": alternatives[category]}
+        if option["original_price"] is not None:
+            yield "coupon_applied", {"id": option["id"], "original_price": option["original_price"], "price": option["price"]}
+
+    cognitive_telemetry["optimizer"] = {"method": plan.method, "optimal": plan.optimal}
+    cognitive_telemetry["negotiation"] = {
+        "seed": seed,
+        "discounted_items": sum(o["original_price"] is not None for o in options),
+    }
+    if quote_status:
+        cognitive_telemetry["quotes"] = quote_status
+    if tracing.DEV_MODE:
+        cognitive_telemetry["trace"] = trace.breakdown()
+    # The session keeps the resolved seed, so a re-rank negotiates exactly the same offers.
+    seeded_request = intent_request.model_copy(update={"seed": seed})
+    if session is None:
+        session = cart_sessions.SESSIONS.create(seeded_request, categories, intent_telemetry, catalog, quotes, quote_status)
+    yield "final_cart", session.update(seeded_request, {
+        "options": options,
+        "alternatives": alternatives,
+        "telemetry": cognitive_telemetry,
+    })
+
+def _option_record(item: dict, reason_pool, strategy: str) -> dict:
+    """A ProcurementOption as a plain dict: the same keys, order and types as
+    `ProcurementOption(...).model_dump()`, without building and dumping a model per item."""
+    vendor = MOCK_AUTHORIZED_VENDORS[item["vendor_id"]]
+    original_price = item.get("original_price")
+    return {
+        "id": str(item["id"]),
+        "name": str(item["name"]),
+        "price": float(item["price"]),
+        "vendor_name": vendor["name"],
+        "vendor_id": item["vendor_id"],
+        "trust_score": int(vendor["trust_score"]),
+        "delivery_days": int(item["delivery_days"]),
+        "ai_score": float(item["ai_score"]),
+        "reason": f"Optimizing {strategy} strategy.",
+        "ai_reason": ai_engine.derive_ai_reason(item, reason_pool, strategy),
+        "original_price": None if original_price is None else float(original_price),
+    }
+
+async def _run_orchestration(
+    intent_request: UserRequest,
+    parsed: Optional[tuple[list[str], dict]] = None,
+    catalog: Optional[Catalog] = None,
+    session: Optional[cart_sessions.CartSession] = None,
+) -> dict:
+    result: dict = {}
+    async for event, payload in _orchestration_events(intent_request, parsed, catalog, session):
+        if event == "final_cart":
+            result = payload
+    return result
+
+def _sse(event: str, payload: dict, event_id: int) -> str:
+    return f"id: {event_id}\nevent: {event}\ndata: {fast_json.dumps(payload).decode()}\n\n"
+
+async def _sse_stream(request: Request, events: AsyncIterator[tuple[str, dict]]) -> AsyncIterator[str]:
+    """Relay orchestration events as SSE. The response pulls one event at a time, so a slow client
+    holds the pipeline back rather than letting events pile up; a disconnect stops the work."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + ORCHESTRATION_TIMEOUT_SEC
+    pending: Optional[asyncio.Future] = None
+    event_id = 0
+    try:
+        while not await request.is_disconnected():
+            if pending is None:
+                pending = asyncio.ensure_future(events.__anext__())
+            remaining = deadline - loop.time()
+            done, _ = await asyncio.wait({pending}, timeout=max(min(SSE_KEEPALIVE_SEC, remaining), 0))
+            if not done:
+                if remaining <= 0:
+                    yield _sse("error", {"detail": "Orchestration timed out."}, event_id)
+                    break
+                yield ": keepalive\n\n"
+                continue
+            try:
+                event, payload = pending.result()
+            except StopAsyncIteration:
+                pending = None
+                break
+            except admission.AdmissionRejected as e:
+                pending = None
+                yield _sse("error", {"detail": str(e), "retry_after": e.retry_after}, event_id)
+                break
+            except Exception as e:
+                pending = None
+                logger.exception("Orchestration Stream Error: %s", e)
+                yield _sse("error", {"detail": str(e)}, event_id)
+                break
+            pending = None
+            event_id += 1
+            yield _sse(event, payload, event_id)
+    finally:
+        if pending is not None:
+            pending.cancel()
+            await asyncio.gather(pending, return_exceptions=True)
+        await events.aclose()
+
+# ---- ADMISSION ----
+def _admit(request: Request, cost: float = 1.0) -> None:
+    """Charge the caller's tenant bucket; raises admission.RateLimited (429 with Retry-After)."""
+    client_host = request.client.host if request.client else None
+    admission.RATE_LIMITER.acquire(admission.tenant_of(request.headers, client_host), cost)
 
 # ---- API ROUTES ----
-@router.post("/orchestrate")
+@router.post("/orchestrate", dependencies=[Depends(_admit)], response_class=FastJSONResponse)
 async def orchestrate_procurement(intent_request: UserRequest):
     try:
-        return await asyncio.wait_for(_run_orchestration(intent_request), timeout=ORCHESTRATION_TIMEOUT_SEC)
+        return FastJSONResponse(
+            await asyncio.wait_for(_run_orchestration(intent_request), timeout=ORCHESTRATION_TIMEOUT_SEC)
+        )
+    except admission.AdmissionRejected:
+        raise
     except Exception as e:
-        logging.exception("Orchestration Error: %s", e)
+        logger.exception("Orchestration Error: %s", e)
         raise HTTPException(status_code=503, detail=str(e))
 
+@router.post("/orchestrate/batch", response_class=FastJSONResponse)
+async def orchestrate_procurement_batch(intent_requests: list[UserRequest], request: Request):
+    """Many intents in one call. Identical prompts (after normalization) are parsed once, unique
+    prompts fan out to the LLM with bounded concurrency, and every cart is built against one catalog
+    snapshot. Results come back in request order; a failing item does not fail the batch. Each
+    intent counts against the tenant's rate limit."""
+    if len(intent_requests) > BATCH_MAX_REQUESTS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_REQUESTS} requests per batch.")
+    try:
+        _admit(request, max(len(intent_requests), 1))
+    except admission.CostExceedsBurst as e:
+        raise HTTPException(status_code=413, detail=f"{e} Split the batch.")
+    t0 = time.perf_counter()
+    unique_prompts = list(dict.fromkeys(normalize_prompt(r.prompt) for r in intent_requests))
+    representative = {}
+    for r in intent_requests:
+        representative.setdefault(normalize_prompt(r.prompt), r)
+    slots = asyncio.Semaphore(BATCH_INTENT_CONCURRENCY)
+
+    async def parse(key: str) -> tuple[list[str], dict]:
+        async with slots:
+            return await _parse_intent(representative[key])
+
+    try:
+        parsed = await asyncio.wait_for(
+            asyncio.gather(*(parse(key) for key in unique_prompts)),
+            timeout=ORCHESTRATION_TIMEOUT_SEC,
+        )
+    except admission.AdmissionRejected:
+        raise
+    except Exception as e:
+        logger.exception("Batch intent parsing error: %s", e)
+        raise HTTPException(status_code=503, detail=str(e))
+    intents = dict(zip(unique_prompts, parsed))
+
+    catalog = get_catalog()
+    results = []
+    for intent_request in intent_requests:
+        try:
+            cart = await _run_orchestration(intent_request, intents[normalize_prompt(intent_request.prompt)], catalog)
+            results.append({"status": "success", **cart})
+        except Exception as e:
+            logger.exception("Batch item orchestration error: %s", e)
+            results.append({"status": "failed", "error": str(e)})
+    return FastJSONResponse({
+        "results": results,
+        "telemetry": {
+            "requests": len(intent_requests),
+            "unique_prompts": len(unique_prompts),
+            "catalog_version": catalog.version,
+            "latency_ms": round((time.perf_counter() - t0) * 1000, 0),
+        },
+    })
+
+@router.post("/orchestrate/stream", dependencies=[Depends(_admit)])
+async def orchestrate_procurement_stream(intent_request: UserRequest, request: Request):
+    """Server-Sent Events: intent_parsed, category_candidates, item_selected, coupon_applied, final_cart."""
+    return StreamingResponse(
+        _sse_stream(request, _orchestration_events(intent_request)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# ---- CART SESSIONS ----
+def _cart_session(cart_id: str) -> cart_sessions.CartSession:
+    try:
+        return cart_sessions.SESSIONS.get(cart_id)
+    except cart_sessions.CartNotFound:
+        raise HTTPException(status_code=404, detail="Cart not found or expired.")
+
+@router.post("/cart/{cart_id}/rerank", dependencies=[Depends(_admit)], response_class=FastJSONResponse)
+async def rerank_cart(cart_id: str, rerank: RerankRequest):
+    """Re-score and re-select a cached cart for a new strategy, budget or deadline. Reuses the
+    session's parsed intent, catalog snapshot and negotiation seed, so no LLM call is made."""
+    session = _cart_session(cart_id)
+    changes = rerank.model_dump(exclude_none=True)
+    intent_request = session.request.model_copy(update=changes)
+    telemetry = {**session.telemetry, "rerank": {"changed": sorted(changes)}}
+    try:
+        return FastJSONResponse(await asyncio.wait_for(
+            _run_orchestration(intent_request, (session.categories, telemetry), session.catalog, session),
+            timeout=ORCHESTRATION_TIMEOUT_SEC,
+        ))
+    except Exception as e:
+        logger.exception("Rerank Error: %s", e)
+        raise HTTPException(status_code=503, detail=str(e))
+
+@router.post("/cart/{cart_id}/swap", response_class=FastJSONResponse)
+async def swap_cart_line(cart_id: str, swap: CartSwapRequest):
+    """Replace one line with a runner-up from the cached alternatives (no re-scoring)."""
+    session = _cart_session(cart_id)
+    try:
+        return FastJSONResponse(session.swap(swap.category, swap.option_id))
+    except cart_sessions.SwapRejected as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
 # ---- MULTIMODAL UPLOAD ----
-@router.post("/upload_intent")
+_UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "required": ["file"],
+            "properties": {"file": {"type": "string", "format": "binary"}},
+        }}},
+    },
+}
+
+@router.post("/upload_intent", openapi_extra=_UPLOAD_OPENAPI, dependencies=[Depends(_admit)])
 async def upload_document_intent(
+    request: Request,
     strategy: str = "balanced",
     budget: float = 1000.0,
-    file: UploadFile = File(...)
 ):
+    """Multipart upload (field `file`, image/PDF up to FLUX_UPLOAD_MAX_BYTES). The body is streamed
+    into a spooled temp file while hashed; oversize uploads are rejected with 413 mid-stream."""
     try:
-        # limit file size to 5MB
-        content = await file.read(5 * 1024 * 1024)
+        upload = await document_ingest.ingest_multipart(
+            request.headers.get("content-type"),
+            request.headers.get("content-length"),
+            request.stream(),
+            max_bytes=document_ingest.UPLOAD_MAX_BYTES,
+        )
+    except document_ingest.UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except document_ingest.InvalidUpload as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-        try:
-            extracted_prompt = await ai_engine.extract_intent_from_doc(content, file.content_type or "application/octet-stream")
-            if not (extracted_prompt and extracted_prompt.strip()):
-                raise ValueError("Empty AI response")
-        except Exception as e:
-            logging.warning("Document extraction failed, using fallback: %s", e)
-            extracted_prompt = "Procurement: snacks, badges, adapters, prizes for hackathon"
+    try:
+        extracted_prompt, document_telemetry = await ai_engine.extract_intent_from_upload(upload)
+        if not (extracted_prompt and extracted_prompt.strip()):
+            logger.warning("Document extraction returned nothing, using fallback")
+            extracted_prompt = ai_engine.FALLBACK_DOC_INTENT
 
         # IMPORTANT FIX: deadline_days added
         intent_request = UserRequest(
@@ -139,26 +495,57 @@ async def upload_document_intent(
             deadline_days=7
         )
 
-        return await _run_orchestration(intent_request)
+        result = await _run_orchestration(intent_request)
+        if isinstance(result.get("telemetry"), dict):
+            result["telemetry"]["document"] = document_telemetry
+        return result
 
+    except admission.AdmissionRejected:
+        raise
     except Exception as e:
-        logging.exception("File Processing Error: %s", e)
+        logger.exception("File Processing Error: %s", e)
         raise HTTPException(status_code=400, detail="Could not process document.")
+    finally:
+        upload.close()
 
 # ---- PAYMENT EXECUTION ----
-@router.post("/execute_payment")
-async def execute_secure_payment(cart: list[dict]):
+@router.post("/execute_payment", dependencies=[Depends(_admit)])
+async def execute_secure_payment(
+    cart: list[dict],
+    idempotency_key: Optional[str] = Header(None, max_length=settlement_journal.MAX_IDEMPOTENCY_KEY_LENGTH),
+):
+    """Settle a cart. Retries carrying the same Idempotency-Key return the first result instead of paying again."""
     try:
-        loop = asyncio.get_running_loop()
         result = await asyncio.wait_for(
-            loop.run_in_executor(None, lambda: execute_payment_onchain(cart)),
+            settlement_queue.execute_payment(cart, idempotency_key),
             timeout=ORCHESTRATION_TIMEOUT_SEC,
         )
-        return result
-
     except PolicyViolation as e:
         raise HTTPException(status_code=403, detail=f"Policy Violation: {e}")
-
+    except (settlement_journal.IdempotencyConflict, settlement_journal.SettlementInProgress) as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except settlement_journal.SettlementUnresolved as e:
+        # Transfers may be out: the client must retry with this key, never as a new payment.
+        raise HTTPException(status_code=503, detail={
+            "message": "Payment outcome unknown; retry with the same Idempotency-Key.", "idempotency_key": e.key,
+        })
+    except admission.AdmissionRejected:
+        raise
     except Exception as e:
-        logging.exception("Payment Error: %s", e)
+        logger.exception("Payment Error: %s", e)
         raise HTTPException(status_code=503, detail="Payment failed.")
+
+    if result.get("status") == "failed":
+        # Some lines may have settled; return their hashes so the client does not blindly retry.
+        raise HTTPException(status_code=503, detail={"message": "Payment failed.", **result})
+    return result
+
+@router.get("/settlement/stats")
+async def settlement_stats():
+    scheduler = settlement_queue.get_scheduler()
+    return {"mode": "sandbox"} if scheduler is None else {"mode": "onchain", **scheduler.stats()}
+
+@router.get("/admission/stats")
+async def admission_stats():
+    """Rate-limit rejections and per-downstream in-flight calls and queue depth (for autoscaling)."""
+    return admission.stats()
@@ -0,0 +1,222 @@
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from utils import tracing
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# ---- CONFIG ----
+# Per-tenant token bucket; 0 disables rate limiting. Tenants are keyed by TENANT_HEADER, else client IP.
+RATE_LIMIT_RPS = float(os.environ.get("FLUX_RATE_LIMIT_RPS", "0"))
+RATE_LIMIT_BURST = float(os.environ.get("FLUX_RATE_LIMIT_BURST", "0")) or max(RATE_LIMIT_RPS * 2, 1.0)
+TENANT_HEADER = os.environ.get("FLUX_TENANT_HEADER", "X-API-Key")
+MAX_TRACKED_TENANTS = 10_000
+# Calls in flight per downstream; callers beyond that queue, and are shed once queue wait would
+# exceed ADMISSION_QUEUE_BUDGET_MS.
+LLM_MAX_CONCURRENCY = int(os.environ.get("FLUX_LLM_MAX_CONCURRENCY", "32"))
+VISION_MAX_CONCURRENCY = int(os.environ.get("FLUX_VISION_MAX_CONCURRENCY", "4"))
+CHAIN_MAX_CONCURRENCY = int(os.environ.get("FLUX_CHAIN_MAX_CONCURRENCY", "16"))
+ADMISSION_QUEUE_BUDGET_MS = float(os.environ.get("FLUX_ADMISSION_QUEUE_BUDGET_MS", "2000"))
+
+
+class AdmissionRejected(Exception):
+    """Request refused before doing any work; surfaced as 429 with Retry-After."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class RateLimited(AdmissionRejected):
+    pass
+
+
+class Overloaded(AdmissionRejected):
+    pass
+
+
+class CostExceedsBurst(Exception):
+    """A request costs more tokens than a bucket can ever hold; retrying cannot help (413)."""
+
+
+# ---- RATE LIMITING ----
+class TokenBucket:
+    __slots__ = ("tokens", "updated_at")
+
+    def __init__(self, tokens: float):
+        self.tokens = tokens
+        self.updated_at = time.monotonic()
+
+
+class TenantRateLimiter:
+    """Token bucket per tenant: `rate` requests/sec sustained, bursts up to `burst`.
+
+    Buckets for the least recently seen tenants are dropped beyond `max_tenants`; a dropped tenant
+    simply starts again with a full bucket.
+    """
+
+    def __init__(self, rate: float = RATE_LIMIT_RPS, burst: float = RATE_LIMIT_BURST, max_tenants: int = MAX_TRACKED_TENANTS):
+        self.rate = rate
+        self.burst = burst
+        self.max_tenants = max_tenants
+        self.rejected = 0
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, tenant: str, cost: float = 1.0) -> None:
+        """Take `cost` tokens from the tenant's bucket or raise RateLimited (CostExceedsBurst if
+        `cost` is over the burst, which no amount of waiting would cover)."""
+        if self.rate <= 0:
+            return
+        if cost > self.burst:
+            raise CostExceedsBurst(f"Request costs {cost:g} tokens; the rate limit allows at most {self.burst:g} at once.")
+        with self._lock:
+            bucket = self._buckets.get(tenant)
+            now = time.monotonic()
+            if bucket is None:
+                bucket = self._buckets[tenant] = TokenBucket(self.burst)
+                while len(self._buckets) > self.max_tenants:
+                    self._buckets.popitem(last=False)
+            else:
+                bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated_at) * self.rate)
+            self._buckets.move_to_end(tenant)
+            bucket.updated_at = now
+            if bucket.tokens >= cost:
+                bucket.tokens -= cost
+                return
+            self.rejected += 1
+            shortfall = cost - bucket.tokens
+        raise RateLimited(f"Rate limit exceeded for tenant ({self.rate:g} req/s).", shortfall / self.rate)
+
+
+# ---- CONCURRENCY GATES ----
+class ConcurrencyGate:
+    """Bounded concurrency for one downstream (LLM, vision, chain) with queue-wait shedding.
+
+    At most `limit` callers hold a slot; the rest wait in FIFO order. A caller is shed with
+    Overloaded up front when the projected wait (queue position x mean hold time / limit) is over
+    `queue_budget_ms`, and otherwise when it has actually waited that long, so a burst fails fast
+    instead of timing out together after spending quota.
+    """
+
+    def __init__(self, name: str, limit: int, queue_budget_ms: float = ADMISSION_QUEUE_BUDGET_MS):
+        self.name = name
+        self.limit = max(1, limit)
+        self.queue_budget = queue_budget_ms / 1000.0
+        self.active = 0
+        self.shed = 0
+        self.admitted = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        self._hold_sec: Optional[float] = None  # EWMA of slot hold time
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def projected_wait(self, position: int) -> float:
+        return 0.0 if self._hold_sec is None else position * self._hold_sec / self.limit
+
+    def _reject(self, reason: str) -> Overloaded:
+        self.shed += 1
+        retry_after = max(self.projected_wait(self.queued + 1), self.queue_budget)
+        return Overloaded(f"{self.name} is saturated ({reason}); retry later.", retry_after)
+
+    async def _acquire(self) -> None:
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return
+        if self.projected_wait(self.queued + 1) > self.queue_budget:
+            raise self._reject("projected queue wait over budget")
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        t0 = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_budget)
+        except asyncio.TimeoutError:
+            if not waiter.done():
+                waiter.cancel()
+                raise self._reject("queue wait over budget")
+        except BaseException:
+            # Cancelled while queued: hand on a slot we were granted but will not use.
+            if waiter.done() and not waiter.cancelled():
+                self._release()
+            else:
+                waiter.cancel()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            tracing.REGISTRY.observe(f"admission.{self.name}.queue_wait", time.perf_counter() - t0)
+
+    def _release(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)  # the slot passes straight to the next waiter
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        await self._acquire()
+        self.admitted += 1
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            held = time.perf_counter() - t0
+            self._hold_sec = held if self._hold_sec is None else 0.8 * self._hold_sec + 0.2 * held
+            self._release()
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "in_flight": self.active,
+            "queue_depth": self.queued,
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "mean_hold_ms": None if self._hold_sec is None else round(self._hold_sec * 1000, 1),
+        }
+
+
+RATE_LIMITER = TenantRateLimiter()
+LLM = ConcurrencyGate("llm", LLM_MAX_CONCURRENCY)
+VISION = ConcurrencyGate("vision", VISION_MAX_CONCURRENCY)
+CHAIN = ConcurrencyGate("chain", CHAIN_MAX_CONCURRENCY)
+GATES = (LLM, VISION, CHAIN)
+
+
+def tenant_of(headers, client_host: Optional[str]) -> str:
+    key = headers.get(TENANT_HEADER)
+    return f"key:{key}" if key else f"ip:{client_host or 'unknown'}"
+
+
+def stats() -> dict:
+    return {
+        "rate_limit": {"rps": RATE_LIMITER.rate, "burst": RATE_LIMITER.burst, "rejected": RATE_LIMITER.rejected},
+        "gates": {gate.name: gate.stats() for gate in GATES},
+    }
+
+
+def render_prometheus() -> str:
+    """Gauges and counters for autoscaling on queue depth (Prometheus text format)."""
+    lines = [
+        "# HELP flux_admission_queue_depth Callers waiting for a downstream slot.",
+        "# TYPE flux_admission_queue_depth gauge",
+        *(f'flux_admission_queue_depth{{downstream="{g.name}"}} {g.queued}' for g in GATES),
+        "# HELP flux_admission_in_flight Downstream calls holding a slot.",
+        "# TYPE flux_admission_in_flight gauge",
+        *(f'flux_admission_in_flight{{downstream="{g.name}"}} {g.active}' for g in GATES),
+        "# HELP flux_admission_rejected_total Requests refused with 429.",
+        "# TYPE flux_admission_rejected_total counter",
+        *(f'flux_admission_rejected_total{{reason="shed",downstream="{g.name}"}} {g.shed}' for g in GATES),
+        f'flux_admission_rejected_total{{reason="rate_limit",downstream=""}} {RATE_LIMITER.rejected}',
+    ]
+    return "\n".join(lines) + "\n"
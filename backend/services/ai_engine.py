@@ -1,83 +1,197 @@
+import asyncio
+import importlib
 import os
-import json
+import random
 import time
-import google.generativeai as genai
-from openai import OpenAI
-from groq import Groq
 from dotenv import load_dotenv, find_dotenv
+from services import admission, intent_classifier, llm_providers
+from services.intent_cache import INTENT_CACHE_BACKEND, IntentCache, build_backend
+from utils import sdk_registry, tracing
 from utils.logger import get_logger
+from utils.shared_state import shared_path
 
 # 1. Force load environment variables
 load_dotenv(find_dotenv())
 logger = get_logger(__name__)
 
 # --- Initialization ---
-openai_key = os.environ.get("OPENAI_API_KEY")
+EXTRACTION_CACHE_PATH = (
+    os.environ.get("FLUX_EXTRACTION_CACHE_PATH") or shared_path("extraction_cache.sqlite3") or "flux_extraction_cache.sqlite3"
+)
+EXTRACTION_CACHE_MAX_ENTRIES = int(os.environ.get("FLUX_EXTRACTION_CACHE_MAX_ENTRIES", "512"))
+EXTRACTION_CACHE_TTL_SEC = float(os.environ.get("FLUX_EXTRACTION_CACHE_TTL_SEC", "86400"))
+FALLBACK_DOC_INTENT = "Procurement: snacks, badges, adapters, prizes for hackathon."
+
 gemini_key = os.environ.get("GEMINI_API_KEY")
-groq_key = os.environ.get("GROQ_API_KEY")
 
-_groq_client = Groq(api_key=groq_key) if groq_key else None
-_openai_client = OpenAI(api_key=openai_key) if openai_key else None
+# Async Groq/OpenAI clients over one pooled HTTP connection set; Groq first, OpenAI as hedge.
+_providers = llm_providers.build_providers()
 
 # Gemini 3 Flash: document vision (image/PDF). Intent from text uses Groq/OpenAI.
+# google.generativeai is imported (and the model configured) on the first upload, or by warm-up.
 GEMINI_MODEL_ID = "gemini-3-flash-preview"
-if gemini_key:
+
+def _build_gemini_model():
     try:
+        genai = importlib.import_module("google.generativeai")
         genai.configure(api_key=gemini_key)
         model = genai.GenerativeModel(GEMINI_MODEL_ID)
         logger.info("Gemini engine ready: %s", GEMINI_MODEL_ID)
+        return model
     except Exception as e:
         logger.error("Gemini init error: %s", e)
-        model = None
-else:
-    model = None
+        return None
+
+_gemini = sdk_registry.client("gemini", _build_gemini_model) if gemini_key else None
+
+def gemini_model():
+    """The Gemini vision model, built on first use; None without a key or if init failed."""
+    return _gemini.get() if _gemini is not None else None
+
+LLM_MODEL_DISPLAY = _providers[0].display_name if _providers else "Llama-3.3-70b (Groq LPU)"
+
+_intent_cache = IntentCache()
+# Document extractions keyed by "<sha256>:<mime>", so a re-uploaded file skips the vision call.
+_extraction_cache = IntentCache(
+    build_backend(INTENT_CACHE_BACKEND, EXTRACTION_CACHE_PATH, EXTRACTION_CACHE_MAX_ENTRIES, EXTRACTION_CACHE_TTL_SEC),
+    key_fn=str.lower,
+)
 
-LLM_MODEL_DISPLAY = "Llama-3.3-70b (Groq LPU)"
-LLM_MODEL_API = "llama-3.3-70b-versatile" 
+@tracing.span("llm.intent")
+async def _complete_intent(prompt: str, telemetry: dict) -> tuple[list[str], float]:
+    """Hedged LLM round trip; raises when every provider fails so failures are never cached."""
+    t0 = time.perf_counter()
+    # Only real provider calls take an LLM slot; cache hits never queue.
+    async with admission.LLM.slot():
+        categories, provider, hedged = await llm_providers.hedged_complete(_providers, prompt)
+    telemetry.update({"model": provider.display_name, "provider": provider.name, "hedged": hedged})
+    return categories, round((time.perf_counter() - t0) * 1000, 0)
 
-def parse_intent_ai(prompt: str) -> tuple[list[str], dict]:
-    """Extract categories using Groq's LPU for sub-second latency."""
-    cognitive_telemetry = {"model": LLM_MODEL_DISPLAY, "latency_ms": 0, "tokens_used": 0}
-    client = _groq_client or _openai_client
-    if not client: return ["snacks", "badges"], cognitive_telemetry
+async def parse_intent_ai(prompt: str) -> tuple[list[str], dict]:
+    """Extract categories using Groq's LPU for sub-second latency, hedged against OpenAI.
+
+    Prompts the local classifier is confident about are answered without an LLM call; the rest
+    are served from the intent cache when a normalized match exists.
+    """
+    t0 = time.perf_counter()
+    local = intent_classifier.classify(prompt)
+    if intent_classifier.is_confident(local):
+        intent_classifier.STATS.record_local()
+        if _providers and random.random() < intent_classifier.LOCAL_INTENT_AUDIT_RATE:
+            _schedule_audit(prompt, local)
+        return local.categories, {
+            "model": f"local {local.source} classifier",
+            "tier": "local",
+            "confidence": local.confidence,
+            "latency_ms": round((time.perf_counter() - t0) * 1000, 3),
+            "tokens_used": 0,
+        }
+
+    cognitive_telemetry = {"model": LLM_MODEL_DISPLAY, "tier": "llm", "latency_ms": 0, "tokens_used": 0}
+    if not _providers: return ["snacks", "badges"], cognitive_telemetry
 
     try:
-        t0 = time.perf_counter()
-        response = client.chat.completions.create(
-            model=LLM_MODEL_API if _groq_client else "gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "Return a JSON list of categories: snacks, badges, adapters, prizes. Format: {'categories': []}"},
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.1,
-            response_format={"type": "json_object"}
+        intent_classifier.STATS.record_escalation()
+        categories, cache_telemetry = await _intent_cache.get_or_compute(
+            prompt, lambda: _complete_intent(prompt, cognitive_telemetry)
         )
-        elapsed = (time.perf_counter() - t0) * 1000
-        content = response.choices[0].message.content
-        parsed_json = json.loads(content)
-        categories = parsed_json.get("categories", ["snacks", "badges"])
-        cognitive_telemetry["latency_ms"] = round(elapsed, 0)
+        cognitive_telemetry.update(cache_telemetry)
+        cognitive_telemetry["latency_ms"] = round((time.perf_counter() - t0) * 1000, 0)
+        cognitive_telemetry["local"] = {
+            "categories": local.categories,
+            "confidence": local.confidence,
+            "agrees": intent_classifier.STATS.record_comparison("escalated", local.categories, categories),
+        }
+        if cache_telemetry.get("cache") == "miss":
+            intent_classifier.log_pair(prompt, categories)
         return categories, cognitive_telemetry
+    except admission.AdmissionRejected:
+        raise
     except Exception as e:
-        logger.error(f"Groq logic failed: {e}")
+        logger.error(f"LLM intent parsing failed: {e}")
         return ["snacks", "badges"], cognitive_telemetry
 
+def intent_needs_llm(prompt: str) -> bool:
+    """Whether parse_intent_ai would wait on an LLM for `prompt`: the local tier is unsure and the
+    intent cache has no answer yet."""
+    if not _providers or intent_classifier.is_confident(intent_classifier.classify(prompt)):
+        return False
+    return not _intent_cache.cached(prompt)
+
+_audits: set[asyncio.Task] = set()
+
+def _schedule_audit(prompt: str, local: "intent_classifier.Classification") -> None:
+    """Ask the LLM about a locally answered prompt in the background, to keep measuring agreement."""
+    async def audit():
+        try:
+            categories, _ = await _intent_cache.get_or_compute(prompt, lambda: _complete_intent(prompt, {}))
+        except Exception as e:
+            logger.debug("Local intent audit skipped: %s", e)
+            return
+        intent_classifier.STATS.record_comparison("audit", local.categories, categories)
+
+    task = asyncio.ensure_future(audit())
+    _audits.add(task)
+    task.add_done_callback(_audits.discard)
+
+def provider_health() -> list[dict]:
+    """Breaker state and hedge delay per provider, for diagnostics."""
+    return [
+        {"provider": p.name, "breaker": p.breaker.state, "hedge_delay_sec": round(p.hedge_delay(), 3)}
+        for p in _providers
+    ]
+
+async def _vision_extract(file_bytes: bytes, mime_type: str) -> tuple[str, float]:
+    """One Gemini vision round trip, bounded by the vision admission gate. Raises on an empty
+    answer so it is never cached."""
+    async with admission.VISION.slot():
+        t0 = time.perf_counter()
+        with tracing.span("vision.extract"):
+            response = await gemini_model().generate_content_async([
+                {"mime_type": mime_type, "data": file_bytes},
+                "Extract items and quantities from this document. Return one short sentence summary suitable for a shopping list.",
+            ])
+        latency_ms = round((time.perf_counter() - t0) * 1000, 0)
+    text = response.text.strip() if response and response.text else ""
+    if not text:
+        raise ValueError("Empty Gemini response")
+    return text, latency_ms
+
 async def extract_intent_from_doc(file_bytes: bytes, mime_type: str) -> str:
     """Extract procurement intent from image/PDF via Gemini vision API."""
-    if not model:
+    if not gemini_model():
         logger.warning("No Gemini model configured; using fallback intent.")
-        return "Procurement: snacks, badges, adapters, prizes for hackathon."
+        return FALLBACK_DOC_INTENT
     try:
-        response = model.generate_content([
-            {"mime_type": mime_type, "data": file_bytes},
-            "Extract items and quantities from this document. Return one short sentence summary suitable for a shopping list.",
-        ])
-        if response and response.text:
-            return response.text.strip()
-        return "Procurement: snacks, badges, adapters, prizes for hackathon."
+        text, _ = await _vision_extract(file_bytes, mime_type)
+        return text
+    except admission.AdmissionRejected:
+        raise
+    except Exception as e:
+        logger.error("Gemini vision API error: %s", e)
+        return FALLBACK_DOC_INTENT
+
+async def extract_intent_from_upload(upload) -> tuple[str, dict]:
+    """Like extract_intent_from_doc for a spooled upload, cached by content hash.
+
+    The file body is only read back from the spool on a cache miss.
+    """
+    telemetry = {"sha256": upload.sha256, "bytes": upload.size}
+    if not gemini_model():
+        logger.warning("No Gemini model configured; using fallback intent.")
+        return FALLBACK_DOC_INTENT, telemetry
+    try:
+        text, cache_telemetry = await _extraction_cache.get_or_compute(
+            f"{upload.sha256}:{upload.content_type}",
+            lambda: _vision_extract(upload.read(), upload.content_type),
+        )
+        telemetry.update(cache_telemetry)
+        return text, telemetry
+    except admission.AdmissionRejected:
+        raise
     except Exception as e:
         logger.error("Gemini vision API error: %s", e)
-        return "Procurement: snacks, badges, adapters, prizes for hackathon."
+        return FALLBACK_DOC_INTENT, telemetry
 
 def calculate_score(item: dict, strategy: str) -> float:
     price = item.get("price", 100)
@@ -0,0 +1,163 @@
+from typing import NamedTuple
+
+import numpy as np
+
+from services.scoring import top_k
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# ---- CONFIG ----
+# Filling a slot is worth more than any achievable score difference, so the optimizer first
+# maximizes the number of categories covered and only then minimizes the total strategy score.
+FILL_BONUS = 1000.0
+# DP table size (slots x budget cents) above which we switch to branch-and-bound.
+DP_MAX_CELLS = 20_000_000
+# Node budget for branch-and-bound; past it we return the best cart found so far.
+BNB_MAX_NODES = 200_000
+RUNNER_UPS_PER_SLOT = 2
+
+
+class Slot(NamedTuple):
+    """One category to fill. `prices` and `scores` are aligned; lower scores are better."""
+
+    category: str
+    prices: np.ndarray
+    scores: np.ndarray
+
+
+class SlotChoice(NamedTuple):
+    slot: int
+    pick: int  # index into the slot's prices/scores
+    alternatives: tuple[int, ...]  # runner-up picks that still fit the budget, best first
+
+
+class CartPlan(NamedTuple):
+    choices: list[SlotChoice]
+    total_cents: int
+    total_score: float
+    method: str  # "dp" | "branch_and_bound"
+    optimal: bool
+
+
+def to_cents(prices: np.ndarray) -> np.ndarray:
+    return np.rint(np.asarray(prices, dtype=np.float64) * 100).astype(np.int64)
+
+
+def pareto_front(cents: np.ndarray, scores: np.ndarray) -> np.ndarray:
+    """Indices not dominated by a cheaper-or-equal item with a lower-or-equal score."""
+    if not len(cents):
+        return np.empty(0, dtype=np.intp)
+    order = np.lexsort((scores, cents))
+    ordered = scores[order]
+    best_before = np.minimum.accumulate(ordered)
+    keep = np.empty(len(order), dtype=bool)
+    keep[0] = True
+    keep[1:] = ordered[1:] < best_before[:-1]
+    return order[keep]
+
+
+def _solve_dp(weights: list[np.ndarray], utils: list[np.ndarray], budget: int) -> list[int]:
+    """Multiple-choice knapsack by DP over integer cents. dp[b] = best utility with cost <= b."""
+    dp = np.zeros(budget + 1, dtype=np.float64)
+    choices = []
+    for w_cls, u_cls in zip(weights, utils):
+        new = dp.copy()
+        choice = np.full(budget + 1, -1, dtype=np.int32)
+        for j, (w, u) in enumerate(zip(w_cls.tolist(), u_cls.tolist())):
+            if w > budget:
+                continue
+            cand = dp[:budget + 1 - w] + u
+            better = cand > new[w:]
+            new[w:][better] = cand[better]
+            choice[w:][better] = j
+        dp = new
+        choices.append(choice)
+
+    picks = [-1] * len(weights)
+    b = budget
+    for k in range(len(weights) - 1, -1, -1):
+        j = int(choices[k][b])
+        picks[k] = j
+        if j >= 0:
+            b -= int(weights[k][j])
+    return picks
+
+
+def _solve_branch_and_bound(weights: list[np.ndarray], utils: list[np.ndarray], budget: int, max_nodes: int) -> tuple[list[int], bool]:
+    """Depth-first branch-and-bound; the bound relaxes the budget for the remaining slots."""
+    n = len(weights)
+    orders = [np.argsort(-u, kind="stable") for u in utils]
+    best_util = [float(u.max()) if len(u) else 0.0 for u in utils]
+    suffix_bound = np.concatenate([np.cumsum(best_util[::-1])[::-1], [0.0]])
+
+    # Greedy incumbent: best-utility affordable item per slot.
+    incumbent, incumbent_util, spent = [], 0.0, 0
+    for k in range(n):
+        pick = next((int(j) for j in orders[k] if spent + weights[k][j] <= budget), -1)
+        incumbent.append(pick)
+        if pick >= 0:
+            spent += int(weights[k][pick])
+            incumbent_util += float(utils[k][pick])
+
+    nodes = 0
+    picks = [-1] * n
+
+    def visit(k: int, remaining: int, acc: float) -> bool:
+        nonlocal incumbent, incumbent_util, nodes
+        nodes += 1
+        if nodes > max_nodes:
+            return False
+        if k == n:
+            if acc > incumbent_util:
+                incumbent, incumbent_util = list(picks), acc
+            return True
+        if acc + suffix_bound[k] <= incumbent_util:
+            return True
+        for j in orders[k]:
+            w = int(weights[k][j])
+            if w > remaining:
+                continue
+            picks[k] = int(j)
+            if not visit(k + 1, remaining - w, acc + float(utils[k][j])):
+                return False
+        picks[k] = -1
+        return visit(k + 1, remaining, acc)
+
+    complete = visit(0, budget, 0.0)
+    return incumbent, complete
+
+
+def optimize_cart(slots: list[Slot], budget: float, runner_ups: int = RUNNER_UPS_PER_SLOT) -> CartPlan:
+    """Pick at most one item per slot so the cart fits the budget and maximizes total utility
+    (slots filled first, then lowest total score). Deadlines are enforced by the caller when
+    building slots, since they bound each item independently."""
+    budget_cents = max(int(np.floor(round(budget * 100, 6))), 0)
+    cents = [to_cents(s.prices) for s in slots]
+    fronts = [pareto_front(c, s.scores) for c, s in zip(cents, slots)]
+    weights = [c[f] for c, f in zip(cents, fronts)]
+    utils = [FILL_BONUS - s.scores[f] for s, f in zip(slots, fronts)]
+
+    if len(slots) * (budget_cents + 1) <= DP_MAX_CELLS:
+        front_picks, method, optimal = _solve_dp(weights, utils, budget_cents), "dp", True
+    else:
+        front_picks, optimal = _solve_branch_and_bound(weights, utils, budget_cents, BNB_MAX_NODES)
+        method = "branch_and_bound"
+        if not optimal:
+            logger.warning("Branch-and-bound hit node limit (%s); returning best cart found.", BNB_MAX_NODES)
+
+    picks = [int(fronts[k][j]) if j >= 0 else -1 for k, j in enumerate(front_picks)]
+    total_cents = sum(int(cents[k][p]) for k, p in enumerate(picks) if p >= 0)
+    total_score = sum(float(slots[k].scores[p]) for k, p in enumerate(picks) if p >= 0)
+
+    choices = []
+    for k, pick in enumerate(picks):
+        if pick < 0:
+            continue
+        headroom = budget_cents - total_cents + int(cents[k][pick])
+        eligible = np.flatnonzero(cents[k] <= headroom)
+        eligible = eligible[eligible != pick]
+        ranked = eligible[top_k(slots[k].scores[eligible], runner_ups)]
+        choices.append(SlotChoice(slot=k, pick=pick, alternatives=tuple(int(i) for i in ranked)))
+
+    return CartPlan(choices=choices, total_cents=total_cents, total_score=round(total_score, 3), method=method, optimal=optimal)
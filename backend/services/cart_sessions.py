@@ -0,0 +1,156 @@
+import os
+import threading
+import uuid
+from typing import Optional
+
+from models.schemas import UserRequest
+from services.catalog import Catalog
+from services.intent_cache import MemoryCacheBackend
+from services.vendor_quotes import QuoteOverlay
+
+# ---- CONFIG ----
+CART_SESSION_TTL_SEC = float(os.environ.get("FLUX_CART_SESSION_TTL_SEC", "900"))
+CART_SESSION_MAX_ENTRIES = int(os.environ.get("FLUX_CART_SESSION_MAX_ENTRIES", "1024"))
+# Catalog snapshots sessions may pin: the current one plus the N-1 before it. Sessions on an older
+# snapshot are dropped, so a stream of reloads cannot keep old catalogs alive for the whole TTL.
+CART_SESSION_MAX_GENERATIONS = int(os.environ.get("FLUX_CART_SESSION_MAX_GENERATIONS", "2"))
+
+
+class CartNotFound(KeyError):
+    pass
+
+
+class SwapRejected(ValueError):
+    pass
+
+
+class CartSession:
+    """One orchestration result, kept so it can be re-ranked or edited without re-parsing intent.
+
+    Holds the parsed categories and intent telemetry, the pinned catalog snapshot, the live quote
+    overlay the cart was priced with (and each vendor's quote status) and the resolved negotiation
+    seed, so prices and offers stay the same across re-ranks; plus the current cart. `lines`
+    names the category of each entry in `cart["options"]`.
+    """
+
+    __slots__ = ("cart_id", "request", "categories", "telemetry", "catalog", "quotes", "quote_status", "cart", "lines")
+
+    def __init__(
+        self,
+        cart_id: str,
+        request: UserRequest,
+        categories: list[str],
+        telemetry: dict,
+        catalog: Catalog,
+        quotes: Optional[QuoteOverlay] = None,
+        quote_status: Optional[dict[str, str]] = None,
+    ):
+        self.cart_id = cart_id
+        self.request = request
+        self.categories = categories
+        self.telemetry = telemetry
+        self.catalog = catalog
+        self.quotes = quotes
+        self.quote_status = quote_status or {}
+        self.cart: dict = {}
+        self.lines: list[str] = []
+
+    def update(self, request: UserRequest, cart: dict) -> dict:
+        """Replace the current cart (and the request it was built for); returns it with its cart_id."""
+        self.request = request
+        # Alternatives are keyed by category in the same order the options were selected.
+        self.cart, self.lines = cart, list(cart["alternatives"])
+        cart["cart_id"] = self.cart_id
+        return cart
+
+    def swap(self, category: str, option_id: Optional[str] = None) -> dict:
+        """Replace the line for `category` with a runner-up (the best one, or `option_id`).
+
+        Served from the cached alternatives; the swapped-out option becomes the first alternative,
+        so a second swap restores it. Rejected if the new cart would exceed the budget.
+        """
+        if category not in self.lines:
+            raise SwapRejected(f"No cart line for category {category!r}.")
+        alternatives = self.cart["alternatives"][category]
+        pick = next((i for i, o in enumerate(alternatives) if option_id in (None, o["id"])), None)
+        if pick is None:
+            raise SwapRejected(f"No alternative {option_id!r} for category {category!r}.")
+        options = self.cart["options"]
+        line = self.lines.index(category)
+        replacement, current = alternatives[pick], options[line]
+        total = sum(o["price"] for o in options) - current["price"] + replacement["price"]
+        if total > self.request.budget + 1e-9:
+            raise SwapRejected(f"Swap would exceed the budget ({total:.2f} > {self.request.budget:.2f}).")
+        options[line] = replacement
+        self.cart["alternatives"][category] = [current] + alternatives[:pick] + alternatives[pick + 1:]
+        return self.cart
+
+
+class CartSessionStore:
+    """Short-lived, in-process sessions keyed by cart ID (LRU-bounded, expiring after the TTL).
+
+    Sessions pin a catalog snapshot, so they are not shared across workers; multi-worker
+    deployments need sticky routing for the /cart endpoints. Only the `max_generations` newest
+    snapshots are kept pinned: once a newer one arrives, sessions on the oldest are dropped.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = CART_SESSION_MAX_ENTRIES,
+        ttl_sec: float = CART_SESSION_TTL_SEC,
+        max_generations: int = CART_SESSION_MAX_GENERATIONS,
+    ):
+        self._sessions = MemoryCacheBackend(max_entries, ttl_sec)
+        self.max_generations = max(1, max_generations)
+        self._generations: list[int] = []  # catalog versions in use, oldest first
+        self._oldest_version = 0
+        self._lock = threading.Lock()
+
+    def _pin(self, catalog: Optional[Catalog]) -> None:
+        """Track `catalog`'s version; retire sessions on generations past the limit."""
+        if catalog is None:
+            return
+        with self._lock:
+            if catalog.version in self._generations or catalog.version < self._oldest_version:
+                return
+            self._generations = sorted(self._generations + [catalog.version])[-self.max_generations:]
+            if self._generations[0] == self._oldest_version:
+                return
+            self._oldest_version = self._generations[0]
+        self._sessions.discard_where(self._retired)
+
+    def _retired(self, session: CartSession) -> bool:
+        return session.catalog is not None and session.catalog.version < self._oldest_version
+
+    def create(
+        self,
+        request: UserRequest,
+        categories: list[str],
+        telemetry: dict,
+        catalog: Catalog,
+        quotes: Optional[QuoteOverlay] = None,
+        quote_status: Optional[dict[str, str]] = None,
+    ) -> CartSession:
+        session = CartSession(uuid.uuid4().hex, request, categories, telemetry, catalog, quotes, quote_status)
+        self._pin(catalog)
+        self._sessions.set(session.cart_id, session)
+        return session
+
+    def get(self, cart_id: str) -> CartSession:
+        session = self._sessions.get(cart_id)
+        if session is None or self._retired(session):
+            raise CartNotFound(cart_id)
+        # Touch on use, so an actively edited cart does not expire mid-session.
+        self._sessions.set(cart_id, session)
+        return session
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def clear(self) -> None:
+        self._sessions.clear()
+        with self._lock:
+            self._generations, self._oldest_version = [], 0
+
+
+SESSIONS = CartSessionStore()
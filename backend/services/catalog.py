@@ -0,0 +1,222 @@
+import os
+import threading
+from functools import cached_property
+from itertools import count
+from typing import Iterable, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from utils.logger import get_logger
+from utils.shared_state import SHARED_STATE_DIR
+
+logger = get_logger(__name__)
+
+# ---- CONFIG ----
+# Prebuilt segment file (see services.catalog_feed) to serve instead of DEFAULT_INVENTORY. It is
+# mmap'd, so startup cost does not grow with the number of SKUs.
+CATALOG_PATH = os.environ.get("FLUX_CATALOG_PATH") or None
+
+# ---- SEED INVENTORY ----
+DEFAULT_INVENTORY = [
+    {"id": "a1", "name": "Bulk Energy Drinks (24pk)", "price": 45.00, "delivery_days": 2, "category": "snacks", "vendor_id": "amazon"},
+    {"id": "a2", "name": "Hackathon Lanyards (100ct)", "price": 25.00, "delivery_days": 2, "category": "badges", "vendor_id": "amazon"},
+    {"id": "a3", "name": "Participant Badges & Holders", "price": 35.00, "delivery_days": 3, "category": "badges", "vendor_id": "amazon"},
+    {"id": "w1", "name": "Party Size Chips & Dip", "price": 18.00, "delivery_days": 1, "category": "snacks", "vendor_id": "walmart"},
+    {"id": "w2", "name": "Peel-and-Stick Name Tags (50ct)", "price": 5.00, "delivery_days": 0, "category": "badges", "vendor_id": "walmart"},
+    {"id": "w3", "name": "Hackathon Snack Variety Pack", "price": 32.00, "delivery_days": 1, "category": "snacks", "vendor_id": "walmart"},
+    {"id": "t1", "name": "Universal Travel Adapter (6-pack)", "price": 28.00, "delivery_days": 3, "category": "adapters", "vendor_id": "tech_direct"},
+    {"id": "t2", "name": "USB-C Hub (Prize)", "price": 45.00, "delivery_days": 4, "category": "prizes", "vendor_id": "tech_direct"},
+    {"id": "t3", "name": "Smart Home Hub (Grand Prize)", "price": 120.00, "delivery_days": 4, "category": "prizes", "vendor_id": "tech_direct"},
+    {"id": "a4", "name": "Coffee & Tea Station Kit", "price": 55.00, "delivery_days": 2, "category": "snacks", "vendor_id": "amazon"},
+    {"id": "t4", "name": "International Power Strip", "price": 22.00, "delivery_days": 3, "category": "adapters", "vendor_id": "tech_direct"},
+]
+
+
+class CatalogItem(NamedTuple):
+    """Immutable SKU record. A tuple subclass, so it carries no per-instance __dict__."""
+
+    id: str
+    name: str
+    price: float
+    delivery_days: int
+    category: str
+    vendor_id: str
+
+    def as_dict(self) -> dict:
+        return self._asdict()
+
+
+class CategoryIndex:
+    """One category's items sorted by price and by delivery_days, with parallel key columns for binary search.
+
+    `price_column`, `delivery_column` and `vendor_column` are NumPy arrays aligned with `by_price`,
+    so a budget prefix of candidates is a zero-copy slice for the batch scorer. `by_price` and
+    `by_delivery` are sequences of CatalogItem: tuples for in-memory snapshots, lazy views for
+    snapshots attached from a segment file (see services.catalog_segment). Segment-backed indexes
+    also carry precomputed negotiation `sku_keys` aligned with `by_price`.
+    """
+
+    __slots__ = (
+        "by_price", "by_delivery", "price_column", "delivery_column", "vendor_column", "delivery_sorted", "sku_keys",
+    )
+
+    def __init__(self, items: list[CatalogItem], vendor_codes: Optional[dict[str, int]] = None):
+        vendor_codes = vendor_codes or {}
+        self.by_price = tuple(sorted(items, key=lambda i: (i.price, i.delivery_days, i.id)))
+        self.price_column = np.array([i.price for i in self.by_price], dtype=np.float64)
+        self.delivery_column = np.array([i.delivery_days for i in self.by_price], dtype=np.float64)
+        self.vendor_column = np.array([vendor_codes.get(i.vendor_id, -1) for i in self.by_price], dtype=np.int32)
+        self.by_delivery = tuple(sorted(items, key=lambda i: (i.delivery_days, i.price, i.id)))
+        self.delivery_sorted = np.array([i.delivery_days for i in self.by_delivery], dtype=np.float64)
+        self.sku_keys: Optional[np.ndarray] = None
+
+    @classmethod
+    def from_columns(
+        cls,
+        by_price: Sequence[CatalogItem],
+        by_delivery: Sequence[CatalogItem],
+        price_column: np.ndarray,
+        delivery_column: np.ndarray,
+        vendor_column: np.ndarray,
+        delivery_sorted: np.ndarray,
+        sku_keys: Optional[np.ndarray] = None,
+    ) -> "CategoryIndex":
+        """Wrap prebuilt, already-sorted columns without copying them."""
+        index = cls.__new__(cls)
+        index.by_price, index.by_delivery = by_price, by_delivery
+        index.price_column, index.delivery_column, index.vendor_column = price_column, delivery_column, vendor_column
+        index.delivery_sorted, index.sku_keys = delivery_sorted, sku_keys
+        return index
+
+    def __len__(self) -> int:
+        return len(self.by_price)
+
+    def budget_count(self, max_price: float) -> int:
+        """Length of the `by_price` prefix priced <= max_price."""
+        return int(np.searchsorted(self.price_column, max_price, side="right"))
+
+    def candidate_positions(self, max_price: float, max_days: Optional[int] = None) -> np.ndarray:
+        """Positions in `by_price` (and the column arrays) satisfying both bounds."""
+        n = self.budget_count(max_price)
+        if max_days is None:
+            return np.arange(n)
+        return np.flatnonzero(self.delivery_column[:n] <= max_days)
+
+    def within_budget(self, max_price: float) -> Sequence[CatalogItem]:
+        """Items priced <= max_price, cheapest first."""
+        return self.by_price[:self.budget_count(max_price)]
+
+    def within_deadline(self, max_days: int) -> Sequence[CatalogItem]:
+        """Items delivered within max_days, fastest first."""
+        return self.by_delivery[:int(np.searchsorted(self.delivery_sorted, max_days, side="right"))]
+
+    def candidates(self, max_price: float, max_days: Optional[int] = None) -> tuple[CatalogItem, ...]:
+        """Items satisfying both bounds; scans whichever binary-searched range is shorter."""
+        by_price = self.within_budget(max_price)
+        if max_days is None:
+            return tuple(by_price)
+        by_delivery = self.within_deadline(max_days)
+        if len(by_price) <= len(by_delivery):
+            return tuple(i for i in by_price if i.delivery_days <= max_days)
+        return tuple(i for i in by_delivery if i.price <= max_price)
+
+
+_EMPTY_INDEX = CategoryIndex([])
+_versions = count(1)
+
+
+class Catalog:
+    """Read-only catalog snapshot. Never mutated after construction, so it is safe to share across requests."""
+
+    def __init__(self, items: Iterable[CatalogItem]):
+        self.version = next(_versions)
+        self.items: Sequence[CatalogItem] = tuple(items)
+        self.vendors = tuple(sorted({i.vendor_id for i in self.items}))
+        vendor_codes = {v: code for code, v in enumerate(self.vendors)}
+        grouped: dict[str, list[CatalogItem]] = {}
+        for item in self.items:
+            grouped.setdefault(item.category, []).append(item)
+        self.categories = {name: CategoryIndex(members, vendor_codes) for name, members in grouped.items()}
+
+    @classmethod
+    def from_indexes(cls, items: Sequence[CatalogItem], vendors: tuple[str, ...], categories: dict[str, CategoryIndex]) -> "Catalog":
+        """Assemble a snapshot from prebuilt category indexes (e.g. views over a shared segment)."""
+        catalog = cls.__new__(cls)
+        catalog.version = next(_versions)
+        catalog.items, catalog.vendors, catalog.categories = items, vendors, categories
+        return catalog
+
+    @classmethod
+    def from_records(cls, records: Iterable[dict]) -> "Catalog":
+        return cls(
+            CatalogItem(
+                id=str(r["id"]),
+                name=str(r["name"]),
+                price=float(r["price"]),
+                delivery_days=int(r["delivery_days"]),
+                category=str(r["category"]),
+                vendor_id=str(r["vendor_id"]),
+            )
+            for r in records
+        )
+
+    @cached_property
+    def by_id(self) -> dict[str, CatalogItem]:
+        """Built on first use, so attaching a large shared snapshot stays cheap."""
+        return {i.id: i for i in self.items}
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def category(self, name: str) -> CategoryIndex:
+        return self.categories.get(name, _EMPTY_INDEX)
+
+    def candidates(self, category: str, max_price: float, max_days: Optional[int] = None) -> tuple[CatalogItem, ...]:
+        return self.category(category).candidates(max_price, max_days)
+
+
+# ---- ACTIVE SNAPSHOT ----
+_reload_lock = threading.Lock()
+# In multi-worker mode (FLUX_SHARED_STATE_DIR) snapshots live in a shared, mmap'd segment that
+# every worker attaches to; otherwise each process builds its own.
+# A FLUX_CATALOG_PATH segment is already a shared mapping, so workers attach to it directly until
+# a reload publishes a newer snapshot.
+_shared = None
+if SHARED_STATE_DIR is not None:
+    from services.catalog_segment import SharedCatalog
+
+    _shared = SharedCatalog(os.path.join(SHARED_STATE_DIR, "catalog"))
+if CATALOG_PATH is not None:
+    from services.catalog_segment import open_segment
+
+    _active: Catalog = (_shared and _shared.poll(force=True)) or open_segment(CATALOG_PATH)
+elif _shared is not None:
+    _active = _shared.attach_or_publish(DEFAULT_INVENTORY)
+else:
+    _active = Catalog.from_records(DEFAULT_INVENTORY)
+
+
+def get_catalog() -> Catalog:
+    """Current snapshot. Callers keep the reference for the whole request, so a reload never changes data mid-flight."""
+    global _active
+    if _shared is not None:
+        published = _shared.poll()
+        if published is not None:
+            _active = published
+    return _active
+
+
+def reload_catalog(records: Iterable[dict]) -> Catalog:
+    """Build a new snapshot off to the side, then publish it with a single reference swap.
+
+    In multi-worker mode the snapshot is also published to the shared segment, and the other
+    workers pick it up on their next poll.
+    """
+    global _active
+    with _reload_lock:
+        fresh = Catalog.from_records(records)
+        if _shared is not None:
+            fresh = _shared.publish(fresh)
+        _active = fresh
+    logger.info("Catalog reloaded: version=%s items=%s", fresh.version, len(fresh))
+    return fresh
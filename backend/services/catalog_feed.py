@@ -0,0 +1,80 @@
+"""
+Build a catalog segment file from vendor feeds, offline.
+
+    python -m services.catalog_feed amazon.csv walmart.jsonl --out catalog.seg
+
+Feeds are CSV (header row), JSON (an array of records, or {"items": [...]}) or JSON Lines, each
+record carrying id, name, price, delivery_days, category and vendor_id. Serve the result with
+FLUX_CATALOG_PATH=catalog.seg; the file is mmap'd, so startup does not depend on its size.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from typing import Iterable, Iterator
+
+from services.catalog_segment import build_columns, write_segment
+
+FIELDS = ("id", "name", "price", "delivery_days", "category", "vendor_id")
+
+
+class FeedError(ValueError):
+    pass
+
+
+def read_feed(path: str) -> Iterator[dict]:
+    """Records of one feed file; the format is chosen by extension (.csv, .json, .jsonl/.ndjson)."""
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, newline="" if ext == ".csv" else None, encoding="utf-8") as fh:
+        if ext == ".csv":
+            yield from csv.DictReader(fh)
+        elif ext in (".jsonl", ".ndjson"):
+            for line in fh:
+                if line.strip():
+                    yield json.loads(line)
+        elif ext == ".json":
+            data = json.load(fh)
+            yield from data["items"] if isinstance(data, dict) else data
+        else:
+            raise FeedError(f"{path}: unsupported feed format {ext or '(no extension)'}")
+
+
+def build_segment(paths: Iterable[str], out: str) -> dict:
+    """Convert feeds into one segment at `out`. Later feeds win on duplicate (vendor_id, id)."""
+    rows: dict[tuple[str, str], tuple] = {}
+    for path in paths:
+        for n, record in enumerate(read_feed(path), start=1):
+            try:
+                row = (
+                    str(record["id"]),
+                    str(record["name"]),
+                    float(record["price"]),
+                    int(record["delivery_days"]),
+                    str(record["category"]),
+                    str(record["vendor_id"]),
+                )
+            except (KeyError, TypeError, ValueError) as e:
+                raise FeedError(f"{path}: record {n}: {e!r}") from e
+            rows[(row[5], row[0])] = row
+    header, columns = build_columns(*(list(zip(*rows.values())) or [()] * len(FIELDS)))
+    write_segment(out, header, columns)
+    return {"items": header["count"], "vendors": len(header["vendors"]), "categories": len(header["categories"])}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("feeds", nargs="+", help="CSV, JSON or JSON Lines feed files")
+    parser.add_argument("--out", required=True, help="Segment file to write (replaced atomically)")
+    args = parser.parse_args(argv)
+    try:
+        summary = build_segment(args.feeds, args.out)
+    except (OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    print(json.dumps({"out": args.out, **summary}))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,325 @@
+import json
+import mmap
+import os
+import time
+from bisect import bisect_right
+from typing import Optional, Sequence, Union
+
+import numpy as np
+
+from services.catalog import Catalog, CatalogItem, CategoryIndex
+from services.negotiation import sku_key
+from utils.logger import get_logger
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX; publishing is then unserialized
+    fcntl = None
+
+logger = get_logger(__name__)
+
+# ---- CONFIG ----
+CATALOG_POLL_SEC = float(os.environ.get("FLUX_CATALOG_POLL_SEC", "1.0"))
+
+MAGIC = b"FLUXSEG1"
+FORMAT_VERSION = 2
+_ALIGN = 64
+POINTER_NAME = "catalog.current"
+LOCK_NAME = "catalog.lock"
+
+# Segment layout: MAGIC | u32 header length | JSON header | columns, each 64-byte aligned.
+# Items are grouped by category (header "categories": name -> [start, stop)) and sorted by
+# (price, delivery_days, id) within a category, so every CategoryIndex column is a slice.
+# Numeric columns are fixed-width; ids and names are string tables (u8 offsets into a UTF-8 blob).
+_COLUMNS = (
+    ("price", "<f8"),
+    ("delivery_days", "<i4"),
+    ("vendor", "<i4"),  # index into header "vendors"
+    ("delivery_order", "<i4"),  # per category, offsets into the category sorted by (delivery, price, id)
+    ("delivery_sorted", "<i4"),
+    ("id_offsets", "<u8"),
+    ("id_blob", "|u1"),
+    ("name_offsets", "<u8"),
+    ("name_blob", "|u1"),
+    ("sku_key", "<u8"),  # negotiation.sku_key, precomputed so offers need no per-item hashing
+)
+
+
+class SegmentFormatError(Exception):
+    pass
+
+
+# ---- WRITING ----
+def _string_table(values: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    encoded = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    return offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+
+def build_columns(
+    ids: Sequence[str],
+    names: Sequence[str],
+    prices: Sequence[float],
+    delivery_days: Sequence[int],
+    categories: Sequence[str],
+    vendor_ids: Sequence[str],
+) -> tuple[dict, dict[str, np.ndarray]]:
+    """Header fields and column arrays in segment layout from parallel per-item sequences.
+
+    Sorting and grouping are done with NumPy over the raw columns, so feeds with millions of rows
+    are built without materializing a CatalogItem per row.
+    """
+    id_array = np.array(ids, dtype=str)
+    price = np.asarray(prices, dtype=np.float64)
+    delivery = np.asarray(delivery_days, dtype=np.int32)
+    category_names, category_codes = np.unique(np.array(categories, dtype=str), return_inverse=True)
+    vendors, vendor_codes = np.unique(np.array(vendor_ids, dtype=str), return_inverse=True)
+
+    # lexsort keys run last-to-first: category, then the CategoryIndex sort order.
+    order = np.lexsort((id_array, delivery, price, category_codes))
+    by_delivery = np.lexsort((id_array, price, delivery, category_codes))
+    stops = np.cumsum(np.bincount(category_codes, minlength=len(category_names)))
+    starts = stops - np.bincount(category_codes, minlength=len(category_names))
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+
+    positions = order.tolist()
+    id_offsets, id_blob = _string_table([ids[k] for k in positions])
+    name_offsets, name_blob = _string_table([names[k] for k in positions])
+    columns = {
+        "price": price[order],
+        "delivery_days": delivery[order],
+        "vendor": vendor_codes[order],
+        "delivery_order": rank[by_delivery] - starts[category_codes[by_delivery]],
+        "delivery_sorted": delivery[by_delivery],
+        "id_offsets": id_offsets,
+        "id_blob": id_blob,
+        "name_offsets": name_offsets,
+        "name_blob": name_blob,
+        "sku_key": np.fromiter((sku_key(vendor_ids[k], ids[k]) for k in positions), dtype=np.uint64, count=len(positions)),
+    }
+    header = {
+        "count": len(positions),
+        "vendors": vendors.tolist(),
+        "categories": {name: [int(start), int(stop)] for name, start, stop in zip(category_names.tolist(), starts, stops)},
+    }
+    return header, columns
+
+
+def segment_columns(catalog: Catalog) -> tuple[dict, dict[str, np.ndarray]]:
+    """Header fields and column arrays for `catalog` in segment layout."""
+    items = catalog.items
+    return build_columns(
+        [i.id for i in items],
+        [i.name for i in items],
+        [i.price for i in items],
+        [i.delivery_days for i in items],
+        [i.category for i in items],
+        [i.vendor_id for i in items],
+    )
+
+
+def write_segment(path: str, header: dict, columns: dict[str, np.ndarray]) -> None:
+    """Write a segment atomically: readers see either the old file or the complete new one."""
+    layout, offset = {}, 0
+    for name, dtype in _COLUMNS:
+        array = np.ascontiguousarray(columns[name], dtype=dtype)
+        layout[name] = [offset, dtype, int(array.size)]
+        offset += -(-array.nbytes // _ALIGN) * _ALIGN
+    header = {**header, "format": FORMAT_VERSION, "columns": layout}
+    header_bytes = json.dumps(header, separators=(",", ":")).encode()
+    data_start = -(-(len(MAGIC) + 4 + len(header_bytes)) // _ALIGN) * _ALIGN
+
+    tmp = f"{path}.tmp.{os.getpid()}"
+    with open(tmp, "wb") as fh:
+        fh.write(MAGIC)
+        fh.write(len(header_bytes).to_bytes(4, "little"))
+        fh.write(header_bytes)
+        for name, dtype in _COLUMNS:
+            fh.seek(data_start + layout[name][0])
+            fh.write(np.ascontiguousarray(columns[name], dtype=dtype).tobytes())
+        fh.truncate(data_start + offset)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp, path)
+
+
+# ---- READING ----
+class Segment:
+    """A read-only mapping of a segment file; columns are zero-copy views into the page cache."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as fh:
+            self._mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(MAGIC)] != MAGIC:
+            raise SegmentFormatError(f"{path}: not a catalog segment")
+        header_len = int.from_bytes(self._mm[len(MAGIC):len(MAGIC) + 4], "little")
+        header_end = len(MAGIC) + 4 + header_len
+        self.header = json.loads(self._mm[len(MAGIC) + 4:header_end])
+        if self.header.get("format") != FORMAT_VERSION:
+            raise SegmentFormatError(f"{path}: unsupported format {self.header.get('format')}")
+        data_start = -(-header_end // _ALIGN) * _ALIGN
+        self.columns = {
+            name: np.frombuffer(self._mm, dtype=dtype, count=size, offset=data_start + offset)
+            for name, (offset, dtype, size) in self.header["columns"].items()
+        }
+        self.vendors = tuple(self.header["vendors"])
+        self.ranges = {name: tuple(r) for name, r in self.header["categories"].items()}
+        ordered = sorted((start, name) for name, (start, stop) in self.ranges.items() if stop > start)
+        self._starts = [start for start, _ in ordered]
+        self._start_names = [name for _, name in ordered]
+
+    def __len__(self) -> int:
+        return self.header["count"]
+
+    def _string(self, table: str, pos: int) -> str:
+        offsets = self.columns[f"{table}_offsets"]
+        return self.columns[f"{table}_blob"][int(offsets[pos]):int(offsets[pos + 1])].tobytes().decode("utf-8")
+
+    def category_of(self, pos: int) -> str:
+        return self._start_names[bisect_right(self._starts, pos) - 1]
+
+    def item(self, pos: int, category: Optional[str] = None) -> CatalogItem:
+        return CatalogItem(
+            id=self._string("id", pos),
+            name=self._string("name", pos),
+            price=float(self.columns["price"][pos]),
+            delivery_days=int(self.columns["delivery_days"][pos]),
+            category=category or self.category_of(pos),
+            vendor_id=self.vendors[self.columns["vendor"][pos]],
+        )
+
+    def category_index(self, name: str) -> CategoryIndex:
+        start, stop = self.ranges[name]
+        return CategoryIndex.from_columns(
+            by_price=SegmentItems(self, range(start, stop), name),
+            by_delivery=SegmentItems(self, self.columns["delivery_order"][start:stop], name, base=start),
+            price_column=self.columns["price"][start:stop],
+            delivery_column=self.columns["delivery_days"][start:stop],
+            vendor_column=self.columns["vendor"][start:stop],
+            delivery_sorted=self.columns["delivery_sorted"][start:stop],
+            sku_keys=self.columns["sku_key"][start:stop],
+        )
+
+    def catalog(self) -> Catalog:
+        return Catalog.from_indexes(
+            SegmentItems(self, range(len(self))),
+            self.vendors,
+            {name: self.category_index(name) for name in self.ranges},
+        )
+
+
+class SegmentItems(Sequence):
+    """Lazy CatalogItem sequence over segment positions; items are decoded only when indexed."""
+
+    __slots__ = ("segment", "positions", "category", "base")
+
+    def __init__(
+        self,
+        segment: Segment,
+        positions: Union[range, np.ndarray],
+        category: Optional[str] = None,
+        base: int = 0,
+    ):
+        self.segment = segment
+        self.positions = positions
+        self.category = category
+        self.base = base
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return SegmentItems(self.segment, self.positions[key], self.category, self.base)
+        return self.segment.item(self.base + int(self.positions[key]), self.category)
+
+
+def open_segment(path: str) -> Catalog:
+    """Attach a segment file as a Catalog snapshot without copying its columns."""
+    return Segment(path).catalog()
+
+
+# ---- MULTI-WORKER PUBLICATION ----
+class SharedCatalog:
+    """Publishes catalog snapshots as segment files in a shared directory and keeps each worker
+    attached to the current one.
+
+    A pointer file names the current segment; it is replaced atomically on publish, and workers
+    re-read it at most every `poll_sec` seconds from get_catalog().
+    """
+
+    def __init__(self, directory: str, poll_sec: float = CATALOG_POLL_SEC):
+        self.directory = directory
+        self.poll_sec = poll_sec
+        self.current: Optional[str] = None
+        self._next_poll = 0.0
+        os.makedirs(directory, exist_ok=True)
+
+    def _pointer(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.directory, POINTER_NAME)) as fh:
+                return fh.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _attach(self, name: str) -> Catalog:
+        catalog = open_segment(os.path.join(self.directory, name))
+        self.current = name
+        return catalog
+
+    def poll(self, force: bool = False) -> Optional[Catalog]:
+        """The newly published snapshot if the pointer moved since the last attach, else None."""
+        now = time.monotonic()
+        if not force and now < self._next_poll:
+            return None
+        self._next_poll = now + self.poll_sec
+        name = self._pointer()
+        if name is None or name == self.current:
+            return None
+        try:
+            return self._attach(name)
+        except (FileNotFoundError, SegmentFormatError) as e:
+            logger.warning("Could not attach catalog segment %s: %s", name, e)
+            return None
+
+    def publish(self, catalog: Catalog) -> Catalog:
+        """Write `catalog` as the current segment for every worker and return it attached."""
+        name = f"catalog-{time.time_ns()}-{os.getpid()}.seg"
+        header, columns = segment_columns(catalog)
+        with open(os.path.join(self.directory, LOCK_NAME), "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            write_segment(os.path.join(self.directory, name), header, columns)
+            pointer_tmp = os.path.join(self.directory, f"{POINTER_NAME}.tmp.{os.getpid()}")
+            with open(pointer_tmp, "w") as fh:
+                fh.write(name)
+            os.replace(pointer_tmp, os.path.join(self.directory, POINTER_NAME))
+            self._prune(keep={name, self.current})
+            catalog = self._attach(name)
+        logger.info("Published catalog segment %s (%s items)", name, header["count"])
+        return catalog
+
+    def attach_or_publish(self, records) -> Catalog:
+        """Attach the current segment, or publish `records` if no worker has published yet."""
+        with open(os.path.join(self.directory, LOCK_NAME), "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            name = self._pointer()
+        if name is not None:
+            try:
+                return self._attach(name)
+            except (FileNotFoundError, SegmentFormatError) as e:
+                logger.warning("Republishing catalog; could not attach %s: %s", name, e)
+        return self.publish(Catalog.from_records(records))
+
+    def _prune(self, keep: set) -> None:
+        # Unlinking is safe for workers still mapped to an old segment; the mapping outlives the name.
+        for entry in os.listdir(self.directory):
+            if entry.startswith("catalog-") and entry.endswith(".seg") and entry not in keep:
+                try:
+                    os.unlink(os.path.join(self.directory, entry))
+                except FileNotFoundError:
+                    pass
@@ -0,0 +1,142 @@
+import hashlib
+import os
+import tempfile
+from typing import AsyncIterator, Optional
+
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# ---- CONFIG ----
+UPLOAD_MAX_BYTES = int(os.environ.get("FLUX_UPLOAD_MAX_BYTES", str(5 * 1024 * 1024)))
+# Uploads stay in memory up to this size, then roll over to a temp file on disk.
+UPLOAD_SPOOL_BYTES = int(os.environ.get("FLUX_UPLOAD_SPOOL_BYTES", str(1024 * 1024)))
+# Slack for multipart boundaries and part headers when judging Content-Length up front.
+MULTIPART_OVERHEAD_BYTES = 16 * 1024
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class InvalidUpload(Exception):
+    pass
+
+
+class IngestedUpload:
+    """A spooled upload: the file body plus its sha256, read once while streaming."""
+
+    def __init__(self, file, size: int, sha256: str, content_type: str, filename: Optional[str]):
+        self.file = file
+        self.size = size
+        self.sha256 = sha256
+        self.content_type = content_type
+        self.filename = filename
+
+    def read(self) -> bytes:
+        self.file.seek(0)
+        return self.file.read()
+
+    def close(self) -> None:
+        self.file.close()
+
+
+async def ingest_multipart(
+    content_type: Optional[str],
+    content_length: Optional[str],
+    chunks: AsyncIterator[bytes],
+    field: str = "file",
+    max_bytes: int = UPLOAD_MAX_BYTES,
+) -> IngestedUpload:
+    """Stream a multipart/form-data body and spool the `field` part, hashing as it goes.
+
+    Raises UploadTooLarge as soon as the declared Content-Length or the bytes actually received
+    for the part exceed `max_bytes`, so an oversize upload is never buffered in full.
+    """
+    mime, params = parse_options_header(content_type or "")
+    boundary = params.get(b"boundary")
+    if mime != b"multipart/form-data" or not boundary:
+        raise InvalidUpload("Expected multipart/form-data with a boundary")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes + MULTIPART_OVERHEAD_BYTES:
+        raise UploadTooLarge(f"Upload exceeds {max_bytes} bytes")
+
+    spool = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_BYTES)
+    digest = hashlib.sha256()
+    state = {"size": 0, "in_target": False, "found": False, "content_type": None, "filename": None}
+    headers: dict[bytes, bytes] = {}
+    header_field = bytearray()
+    header_value = bytearray()
+
+    def on_part_begin():
+        headers.clear()
+        state["in_target"] = False
+
+    def on_header_field(data, start, end):
+        header_field.extend(data[start:end])
+
+    def on_header_value(data, start, end):
+        header_value.extend(data[start:end])
+
+    def on_header_end():
+        headers[bytes(header_field).lower()] = bytes(header_value)
+        header_field.clear()
+        header_value.clear()
+
+    def on_headers_finished():
+        _, disposition = parse_options_header(headers.get(b"content-disposition", b""))
+        if disposition.get(b"name", b"").decode("latin-1") == field and not state["found"]:
+            filename = disposition.get(b"filename")
+            state.update(
+                in_target=True,
+                found=True,
+                content_type=headers.get(b"content-type", b"").decode("latin-1") or None,
+                filename=filename.decode("utf-8", "replace") if filename else None,
+            )
+
+    def on_part_data(data, start, end):
+        if not state["in_target"]:
+            return
+        chunk = data[start:end]
+        state["size"] += len(chunk)
+        if state["size"] > max_bytes:
+            raise UploadTooLarge(f"Upload exceeds {max_bytes} bytes")
+        digest.update(chunk)
+        spool.write(chunk)
+
+    def on_part_end():
+        state["in_target"] = False
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+    try:
+        async for chunk in chunks:
+            if chunk:
+                parser.write(chunk)
+        parser.finalize()
+    except UploadTooLarge:
+        spool.close()
+        raise
+    except Exception as e:
+        spool.close()
+        raise InvalidUpload(f"Malformed multipart body: {e}") from e
+
+    if not state["found"]:
+        spool.close()
+        raise InvalidUpload(f"Missing form field '{field}'")
+    spool.seek(0)
+    return IngestedUpload(
+        spool,
+        state["size"],
+        digest.hexdigest(),
+        state["content_type"] or "application/octet-stream",
+        state["filename"],
+    )
@@ -0,0 +1,221 @@
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional
+
+from utils.logger import get_logger
+from utils.shared_state import SHARED_STATE_DIR, shared_path
+
+logger = get_logger(__name__)
+
+# ---- CONFIG ----
+# Multi-worker mode defaults to SQLite in the shared state directory, so a hit in one worker serves all.
+INTENT_CACHE_BACKEND = os.environ.get("FLUX_INTENT_CACHE_BACKEND", "sqlite" if SHARED_STATE_DIR else "memory")  # memory | sqlite
+INTENT_CACHE_PATH = os.environ.get("FLUX_INTENT_CACHE_PATH") or shared_path("intent_cache.sqlite3") or "flux_intent_cache.sqlite3"
+SQLITE_BUSY_TIMEOUT_MS = 5000
+INTENT_CACHE_MAX_ENTRIES = int(os.environ.get("FLUX_INTENT_CACHE_MAX_ENTRIES", "2048"))
+INTENT_CACHE_TTL_SEC = float(os.environ.get("FLUX_INTENT_CACHE_TTL_SEC", "3600"))
+
+_PUNCT_RE = re.compile(r"[^\w\s$]")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse case, punctuation and whitespace so near-identical prompts share a key."""
+    text = _PUNCT_RE.sub(" ", (prompt or "").lower())
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+# ---- BACKENDS ----
+class MemoryCacheBackend:
+    """In-process LRU store with per-entry expiry."""
+
+    def __init__(self, max_entries: int, ttl_sec: float):
+        self.max_entries = max_entries
+        self.ttl_sec = ttl_sec
+        self._entries: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_sec, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def discard_where(self, predicate: Callable[[Any], bool]) -> int:
+        """Drop every entry whose value satisfies `predicate`; returns how many were dropped."""
+        with self._lock:
+            doomed = [key for key, (_, value) in self._entries.items() if predicate(value)]
+            for key in doomed:
+                del self._entries[key]
+        return len(doomed)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteCacheBackend:
+    """On-disk store that survives restarts and can be shared by several worker processes.
+
+    WAL journaling lets readers in every worker proceed while one writes. Values must be
+    JSON-serializable.
+    """
+
+    def __init__(self, path: str, max_entries: int, ttl_sec: float):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_sec = ttl_sec
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_lru ON cache(last_access)")
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE cache SET last_access = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now + self.ttl_sec, now),
+            )
+            self._conn.execute("DELETE FROM cache WHERE expires_at < ?", (now,))
+            self._conn.execute(
+                "DELETE FROM cache WHERE key IN ("
+                " SELECT key FROM cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM cache")
+
+
+def build_backend(
+    kind: str = INTENT_CACHE_BACKEND,
+    path: str = INTENT_CACHE_PATH,
+    max_entries: int = INTENT_CACHE_MAX_ENTRIES,
+    ttl_sec: float = INTENT_CACHE_TTL_SEC,
+):
+    if kind == "sqlite":
+        return SQLiteCacheBackend(path, max_entries, ttl_sec)
+    return MemoryCacheBackend(max_entries, ttl_sec)
+
+
+# ---- CACHE ----
+class IntentCache:
+    """Prompt-keyed cache with single-flight: concurrent misses on one key share a single compute.
+
+    `compute` is a coroutine function returning (value, latency_ms); the latency is stored so hits
+    can report time saved. `key_fn` maps the lookup string to a cache key (prompt normalization
+    by default; callers keying on content hashes pass an identity function).
+    """
+
+    def __init__(self, backend=None, key_fn: Callable[[str], str] = normalize_prompt):
+        self.backend = backend if backend is not None else build_backend()
+        self.key_fn = key_fn
+        self.hits = 0
+        self.misses = 0
+        self.saved_ms = 0.0
+        self._lock = threading.Lock()
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    def cached(self, prompt: str) -> bool:
+        """Whether `prompt` would be answered from the store right now (in-flight computes do not count)."""
+        return self.backend.get(self.key_fn(prompt)) is not None
+
+    async def get_or_compute(self, prompt: str, compute: Callable[[], Awaitable[tuple[Any, float]]]) -> tuple[Any, dict]:
+        key = self.key_fn(prompt)
+        while True:
+            cached = self.backend.get(key)
+            if cached is not None:
+                return cached["value"], self._record_hit(cached["latency_ms"])
+
+            leader = self._inflight.get(key)
+            if leader is None:
+                break
+            # Another request is computing this key: share its result. If it failed or was
+            # cancelled, loop round and compute (or join the next leader) ourselves.
+            try:
+                value, latency_ms = await asyncio.shield(leader)
+                return value, self._record_hit(latency_ms)
+            except Exception:
+                continue
+
+        future = self._inflight[key] = asyncio.get_running_loop().create_future()
+        try:
+            value, latency_ms = await compute()
+            if value is not None:
+                self.backend.set(key, {"value": value, "latency_ms": latency_ms})
+            future.set_result((value, latency_ms))
+            return value, self._record_miss()
+        except BaseException as e:
+            future.set_exception(RuntimeError(f"leader compute failed: {e!r}"))
+            # Mark retrieved so a failure nobody was waiting on is not logged as unhandled.
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def _record_hit(self, latency_ms: float) -> dict:
+        with self._lock:
+            self.hits += 1
+            self.saved_ms += latency_ms
+        return {"cache": "hit", "cache_saved_ms": round(latency_ms, 0), **self.stats()}
+
+    def _record_miss(self) -> dict:
+        with self._lock:
+            self.misses += 1
+        return {"cache": "miss", **self.stats()}
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "cache_hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "cache_total_saved_ms": round(self.saved_ms, 0),
+        }
@@ -0,0 +1,320 @@
+"""
+Local intent classifier: the CPU-only first tier in front of the LLM.
+
+    python -m services.intent_classifier intent_log.jsonl --out intent_model.json
+
+Without a trained model, categories come from keyword matches. With FLUX_INTENT_MODEL_PATH set,
+a per-category logistic model over word unigrams/bigrams is used instead; train it offline from
+the prompt -> category pairs the LLM tier logs to FLUX_INTENT_LOG_PATH (JSON Lines,
+{"prompt": ..., "categories": [...]}).
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+from typing import Iterable, NamedTuple, Optional
+
+import numpy as np
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# ---- CONFIG ----
+# Prompts classified at or above this confidence skip the LLM; 0 < threshold <= 1, anything else disables.
+LOCAL_INTENT_THRESHOLD = float(os.environ.get("FLUX_LOCAL_INTENT_THRESHOLD", "0.9"))
+INTENT_MODEL_PATH = os.environ.get("FLUX_INTENT_MODEL_PATH")
+INTENT_LOG_PATH = os.environ.get("FLUX_INTENT_LOG_PATH")
+# Share of locally answered prompts also sent to the LLM in the background to measure agreement.
+LOCAL_INTENT_AUDIT_RATE = float(os.environ.get("FLUX_LOCAL_INTENT_AUDIT_RATE", "0.05"))
+# Long prompts tend to carry qualifiers keywords miss, so the keyword tier defers them to the LLM.
+KEYWORD_MAX_TOKENS = 24
+
+# ---- VOCABULARY ----
+# The LLM is prompted with this fixed category set, so a keyword pass over the prompt is a cheap
+# first guess at its answer.
+CATEGORIES = ("snacks", "badges", "adapters", "prizes")
+FALLBACK_CATEGORIES = ["snacks", "badges"]
+
+KEYWORDS = {
+    "snacks": (
+        "snack", "food", "drink", "beverage", "coffee", "tea", "chip", "dip", "soda", "energy",
+        "catering", "refreshment", "pizza", "candy", "candies", "water", "lunch", "breakfast",
+    ),
+    "badges": ("badge", "lanyard", "name tag", "nametag", "holder", "credential", "sticker", "id card"),
+    "adapters": (
+        "adapter", "adaptor", "power strip", "charger", "plug", "cable", "usb", "extension cord",
+        "outlet", "power",
+    ),
+    "prizes": ("prize", "award", "gift", "reward", "trophy", "trophies", "winner", "swag", "giveaway", "hub"),
+}
+# Words that name a category only in some prompts ("water bottles", "power bank", "USB hub"): a
+# category matched by these alone is a guess, so the prompt goes to the LLM.
+AMBIGUOUS_KEYWORDS = frozenset(("water", "power", "energy", "hub", "holder", "outlet"))
+NEGATIONS = frozenset(("no", "not", "without", "except", "excluding", "exclude", "instead", "skip", "dont", "don't"))
+
+
+def _pattern(keywords: Iterable[str]) -> re.Pattern:
+    # Whole words, optionally pluralised ("tea" must not match "team").
+    return re.compile(r"\b(?:" + "|".join(re.escape(k) for k in keywords) + r")(?:s|es)?\b", re.IGNORECASE)
+
+
+_PATTERNS = {category: _pattern(keywords) for category, keywords in KEYWORDS.items()}
+_SPECIFIC_PATTERNS = {
+    category: _pattern(k for k in keywords if k not in AMBIGUOUS_KEYWORDS) for category, keywords in KEYWORDS.items()
+}
+_TOKEN = re.compile(r"[a-z0-9']+")
+
+
+class Classification(NamedTuple):
+    categories: list[str]
+    # Probability that the answer is right for every category (min over categories of max(p, 1 - p)).
+    confidence: float
+    source: str
+
+
+def tokenize(prompt: str) -> list[str]:
+    return _TOKEN.findall((prompt or "").lower())
+
+
+def _features(tokens: list[str]) -> set[str]:
+    return set(tokens) | {f"{a} {b}" for a, b in zip(tokens, tokens[1:])}
+
+
+def _decide(probabilities: np.ndarray, source: str) -> Classification:
+    chosen = [c for c, p in zip(CATEGORIES, probabilities.tolist()) if p >= 0.5]
+    if not chosen:
+        # Nothing recognised: the LLM would fall back too, but it may see something we do not.
+        return Classification(list(FALLBACK_CATEGORIES), 0.0, source)
+    return Classification(chosen, round(float(np.maximum(probabilities, 1 - probabilities).min()), 4), source)
+
+
+# ---- MODELS ----
+class KeywordModel:
+    """Keyword hits per category; unsure on negations ("no snacks"), long prompts, and categories
+    matched only by an ambiguous keyword."""
+
+    name = "keywords"
+
+    def predict_proba(self, prompt: str) -> np.ndarray:
+        text = prompt or ""
+        hits = np.array([_PATTERNS[c].search(text) is not None for c in CATEGORIES])
+        tokens = tokenize(text)
+        if NEGATIONS.intersection(tokens) or len(tokens) > KEYWORD_MAX_TOKENS:
+            return np.where(hits, 0.6, 0.4)
+        specific = np.array([_SPECIFIC_PATTERNS[c].search(text) is not None for c in CATEGORIES])
+        return np.where(specific, 0.95, np.where(hits, 0.6, 0.05))
+
+
+class LinearModel:
+    """One logistic regression per category over binary unigram/bigram features."""
+
+    name = "linear"
+
+    def __init__(self, vocabulary: list[str], weights: np.ndarray, bias: np.ndarray):
+        self.vocabulary = {term: i for i, term in enumerate(vocabulary)}
+        self.weights = weights  # (terms, categories)
+        self.bias = bias
+
+    def predict_proba(self, prompt: str) -> np.ndarray:
+        rows = [self.vocabulary[t] for t in _features(tokenize(prompt)) if t in self.vocabulary]
+        return 1 / (1 + np.exp(-(self.bias + self.weights[rows].sum(axis=0))))
+
+    def to_json(self) -> dict:
+        return {
+            "categories": list(CATEGORIES),
+            "vocabulary": sorted(self.vocabulary, key=self.vocabulary.get),
+            "weights": self.weights.round(5).tolist(),
+            "bias": self.bias.round(5).tolist(),
+        }
+
+    @classmethod
+    def from_json(cls, data: dict) -> "LinearModel":
+        if list(data.get("categories", ())) != list(CATEGORIES):
+            raise ValueError(f"model categories {data.get('categories')} do not match {list(CATEGORIES)}")
+        weights = np.asarray(data["weights"], dtype=np.float64).reshape(len(data["vocabulary"]), len(CATEGORIES))
+        return cls(data["vocabulary"], weights, np.asarray(data["bias"], dtype=np.float64))
+
+
+def train(pairs: Iterable[tuple[str, list[str]]], epochs: int = 300, lr: float = 0.5, l2: float = 1e-3, min_count: int = 2) -> LinearModel:
+    """Fit a LinearModel with full-batch gradient descent on (prompt, categories) pairs."""
+    docs, labels = [], []
+    for prompt, categories in pairs:
+        docs.append(_features(tokenize(prompt)))
+        labels.append([c in categories for c in CATEGORIES])
+    if not docs:
+        raise ValueError("no training examples")
+    counts: dict[str, int] = {}
+    for doc in docs:
+        for term in doc:
+            counts[term] = counts.get(term, 0) + 1
+    vocabulary = sorted(t for t, n in counts.items() if n >= min_count)
+    index = {t: i for i, t in enumerate(vocabulary)}
+    x = np.zeros((len(docs), len(vocabulary)))
+    for row, doc in enumerate(docs):
+        x[row, [index[t] for t in doc if t in index]] = 1.0
+    y = np.asarray(labels, dtype=np.float64)
+    weights = np.zeros((len(vocabulary), len(CATEGORIES)))
+    bias = np.zeros(len(CATEGORIES))
+    for _ in range(epochs):
+        error = 1 / (1 + np.exp(-(x @ weights + bias))) - y
+        weights -= lr * (x.T @ error / len(docs) + l2 * weights)
+        bias -= lr * error.mean(axis=0)
+    return LinearModel(vocabulary, weights, bias)
+
+
+def read_pairs(path: str) -> Iterable[tuple[str, list[str]]]:
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            if line.strip():
+                record = json.loads(line)
+                yield record["prompt"], [c for c in record["categories"] if c in CATEGORIES]
+
+
+def _load_model(path: Optional[str]):
+    if path:
+        try:
+            with open(path, encoding="utf-8") as fh:
+                return LinearModel.from_json(json.load(fh))
+        except (OSError, ValueError, KeyError) as e:
+            logger.error("Intent model %s unusable, using keywords: %s", path, e)
+    return KeywordModel()
+
+
+MODEL = _load_model(INTENT_MODEL_PATH)
+
+
+def classify(prompt: str) -> Classification:
+    return _decide(MODEL.predict_proba(prompt), MODEL.name)
+
+
+def is_confident(result: Classification) -> bool:
+    return 0 < LOCAL_INTENT_THRESHOLD <= 1 and result.confidence >= LOCAL_INTENT_THRESHOLD
+
+
+def guess_categories(prompt: str) -> list[str]:
+    """Best local guess at the LLM's answer, in vocabulary order; never empty."""
+    return classify(prompt).categories
+
+
+# ---- TIER STATS ----
+_log_lock = threading.Lock()
+
+
+def agree(local: list[str], llm: list[str]) -> bool:
+    return set(local) == {c for c in llm if isinstance(c, str)}
+
+
+def log_pair(prompt: str, categories: list[str]) -> None:
+    """Append an LLM answer to FLUX_INTENT_LOG_PATH as training data (no-op when unset)."""
+    if not INTENT_LOG_PATH:
+        return
+    line = json.dumps({"prompt": prompt, "categories": [c for c in categories if isinstance(c, str)]}) + "\n"
+    try:
+        with _log_lock, open(INTENT_LOG_PATH, "a", encoding="utf-8") as fh:
+            fh.write(line)
+    except OSError as e:
+        logger.warning("Intent log %s not writable: %s", INTENT_LOG_PATH, e)
+
+
+class TierStats:
+    """How often each tier answered, and how often the local answer agreed with the LLM's.
+
+    Agreement is kept apart for "audit" comparisons (prompts the local tier answered, re-checked by
+    the LLM: its accuracy in service) and "escalated" ones (prompts it deferred: how often a lower
+    threshold would still have been right).
+    """
+
+    KINDS = ("audit", "escalated")
+
+    def __init__(self):
+        self.local = 0
+        self.escalated = 0
+        self.compared = dict.fromkeys(self.KINDS, 0)
+        self.agreed = dict.fromkeys(self.KINDS, 0)
+        self._lock = threading.Lock()
+
+    def record_local(self) -> None:
+        with self._lock:
+            self.local += 1
+
+    def record_escalation(self) -> None:
+        with self._lock:
+            self.escalated += 1
+
+    def record_comparison(self, kind: str, local: list[str], llm: list[str]) -> bool:
+        agrees = agree(local, llm)
+        with self._lock:
+            self.compared[kind] += 1
+            self.agreed[kind] += agrees
+        return agrees
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            answered = self.local + self.escalated
+            return {
+                "model": MODEL.name,
+                "threshold": LOCAL_INTENT_THRESHOLD,
+                "local": self.local,
+                "escalated": self.escalated,
+                "local_share": round(self.local / answered, 4) if answered else None,
+                "agreement": {
+                    kind: {
+                        "compared": self.compared[kind],
+                        "rate": round(self.agreed[kind] / self.compared[kind], 4) if self.compared[kind] else None,
+                    }
+                    for kind in self.KINDS
+                },
+            }
+
+    def render_prometheus(self) -> str:
+        with self._lock:
+            lines = [
+                "# HELP flux_intent_tier_total Prompts answered per intent tier.",
+                "# TYPE flux_intent_tier_total counter",
+                f'flux_intent_tier_total{{tier="local"}} {self.local}',
+                f'flux_intent_tier_total{{tier="llm"}} {self.escalated}',
+                "# HELP flux_intent_local_compared_total Local answers compared with the LLM's.",
+                "# TYPE flux_intent_local_compared_total counter",
+                *(f'flux_intent_local_compared_total{{kind="{k}"}} {self.compared[k]}' for k in self.KINDS),
+                "# HELP flux_intent_local_agreed_total Local answers that matched the LLM's.",
+                "# TYPE flux_intent_local_agreed_total counter",
+                *(f'flux_intent_local_agreed_total{{kind="{k}"}} {self.agreed[k]}' for k in self.KINDS),
+            ]
+        return "\n".join(lines) + "\n"
+
+
+STATS = TierStats()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("logs", nargs="+", help="JSON Lines files of {prompt, categories} pairs")
+    parser.add_argument("--out", required=True, help="Model file to write (serve with FLUX_INTENT_MODEL_PATH)")
+    parser.add_argument("--epochs", type=int, default=300)
+    args = parser.parse_args(argv)
+    try:
+        pairs = [pair for path in args.logs for pair in read_pairs(path)]
+        model = train(pairs, epochs=args.epochs)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    tmp = args.out + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(model.to_json(), fh)
+    os.replace(tmp, args.out)
+    results = [_decide(model.predict_proba(p), model.name) for p, _ in pairs]
+    print(json.dumps({
+        "out": args.out,
+        "examples": len(pairs),
+        "vocabulary": len(model.vocabulary),
+        "train_agreement": round(sum(agree(r.categories, c) for r, (_, c) in zip(results, pairs)) / len(pairs), 4),
+        "confident_share": round(sum(r.confidence >= LOCAL_INTENT_THRESHOLD for r in results) / len(pairs), 4),
+    }))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
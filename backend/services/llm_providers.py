@@ -0,0 +1,229 @@
+import asyncio
+import json
+import os
+import time
+import weakref
+from collections import deque
+from typing import Any, Callable, Optional
+
+import httpx
+
+from utils import sdk_registry
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# SDKs are imported when a provider builds its first client, not when this module loads.
+groq = sdk_registry.module("groq")
+openai = sdk_registry.module("openai")
+
+# ---- CONFIG ----
+LLM_PROVIDER_TIMEOUT_SEC = float(os.environ.get("FLUX_LLM_PROVIDER_TIMEOUT_SEC", "30"))
+LLM_MAX_CONNECTIONS = int(os.environ.get("FLUX_LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE = int(os.environ.get("FLUX_LLM_MAX_KEEPALIVE", "20"))
+# Hedge delay = primary's observed p95, clamped; the default applies until enough samples exist.
+HEDGE_DEFAULT_DELAY_SEC = float(os.environ.get("FLUX_HEDGE_DEFAULT_DELAY_SEC", "1.5"))
+HEDGE_MIN_DELAY_SEC = 0.25
+HEDGE_MAX_DELAY_SEC = 10.0
+HEDGE_MIN_SAMPLES = 20
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get("FLUX_BREAKER_FAILURE_THRESHOLD", "3"))
+BREAKER_RESET_SEC = float(os.environ.get("FLUX_BREAKER_RESET_SEC", "30"))
+
+INTENT_SYSTEM_PROMPT = "Return a JSON list of categories: snacks, badges, adapters, prizes. Format: {'categories': []}"
+
+
+class AllProvidersFailed(Exception):
+    pass
+
+
+# ---- SHARED HTTP POOL ----
+_http_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+
+def shared_http_client() -> httpx.AsyncClient:
+    """One pooled AsyncClient per event loop, shared by every provider SDK client on that loop."""
+    loop = asyncio.get_running_loop()
+    client = _http_clients.get(loop)
+    if client is None or client.is_closed:
+        client = _http_clients[loop] = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_KEEPALIVE),
+            timeout=httpx.Timeout(LLM_PROVIDER_TIMEOUT_SEC, connect=5.0),
+        )
+    return client
+
+
+async def aclose() -> None:
+    """Close the pool for the running loop (called on app shutdown)."""
+    client = _http_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+# ---- HEALTH TRACKING ----
+class LatencyTracker:
+    """Rolling window of successful call latencies."""
+
+    def __init__(self, window: int = 200):
+        self.samples: deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures; after the reset window lets a single probe through (half-open)."""
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD, reset_sec: float = BREAKER_RESET_SEC):
+        self.failure_threshold = failure_threshold
+        self.reset_sec = reset_sec
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_sec:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def release_probe(self) -> None:
+        """Give back a half-open probe slot whose call was cancelled before it finished."""
+        self._probing = False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probing = False
+        if self.failures >= self.failure_threshold or self.opened_at is not None:
+            self.opened_at = time.monotonic()
+
+
+# ---- PROVIDERS ----
+class LLMProvider:
+    """An OpenAI-compatible chat endpoint (Groq or OpenAI) with its own latency and breaker state."""
+
+    def __init__(self, name: str, model: str, display_name: str, client_factory: Callable[[httpx.AsyncClient], Any]):
+        self.name = name
+        self.model = model
+        self.display_name = display_name
+        self._client_factory = client_factory
+        self._client: Optional[tuple[httpx.AsyncClient, Any]] = None
+        self.latency = LatencyTracker()
+        self.breaker = CircuitBreaker()
+
+    def client(self):
+        http_client = shared_http_client()
+        if self._client is None or self._client[0] is not http_client:
+            self._client = (http_client, self._client_factory(http_client))
+        return self._client[1]
+
+    def hedge_delay(self) -> float:
+        if len(self.latency.samples) < HEDGE_MIN_SAMPLES:
+            return HEDGE_DEFAULT_DELAY_SEC
+        return min(max(self.latency.percentile(0.95), HEDGE_MIN_DELAY_SEC), HEDGE_MAX_DELAY_SEC)
+
+    async def complete_intent(self, prompt: str) -> list[str]:
+        t0 = time.perf_counter()
+        try:
+            response = await self.client().chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": INTENT_SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt},
+                ],
+                temperature=0.1,
+                response_format={"type": "json_object"},
+            )
+            parsed_json = json.loads(response.choices[0].message.content)
+            categories = parsed_json.get("categories", ["snacks", "badges"])
+        except asyncio.CancelledError:
+            # Lost a hedge race; not the provider's fault.
+            self.breaker.release_probe()
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        self.latency.record(time.perf_counter() - t0)
+        self.breaker.record_success()
+        return categories
+
+
+def build_providers() -> list[LLMProvider]:
+    """Configured providers in preference order: Groq first, OpenAI as the hedge."""
+    providers = []
+    groq_key = os.environ.get("GROQ_API_KEY")
+    openai_key = os.environ.get("OPENAI_API_KEY")
+    if groq_key:
+        providers.append(LLMProvider(
+            "groq", "llama-3.3-70b-versatile", "Llama-3.3-70b (Groq LPU)",
+            lambda http: groq.AsyncGroq(api_key=groq_key, http_client=http, max_retries=0),
+        ))
+    if openai_key:
+        providers.append(LLMProvider(
+            "openai", "gpt-4o-mini", "gpt-4o-mini (OpenAI)",
+            lambda http: openai.AsyncOpenAI(api_key=openai_key, http_client=http, max_retries=0),
+        ))
+    return providers
+
+
+# ---- HEDGED DISPATCH ----
+async def hedged_complete(providers: list[LLMProvider], prompt: str) -> tuple[list[str], LLMProvider, bool]:
+    """Ask the first healthy provider; if it has not answered within its p95-derived delay (or fails),
+    race the next one as well. Returns (categories, winning provider, hedged)."""
+    pending: dict[asyncio.Task, LLMProvider] = {}
+    errors: list[str] = []
+    queue = list(providers)
+    hedged = False
+
+    def launch() -> bool:
+        # Breakers are consulted only when a provider is actually about to be called,
+        # so an unused half-open probe slot is never consumed.
+        while queue:
+            provider = queue.pop(0)
+            if provider.breaker.allow():
+                pending[asyncio.ensure_future(provider.complete_intent(prompt))] = provider
+                return True
+            errors.append(f"{provider.name}: circuit open")
+        return False
+
+    launch()
+    try:
+        while pending:
+            delay = next(iter(pending.values())).hedge_delay() if queue else None
+            done, _ = await asyncio.wait(pending, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                hedged = launch() or hedged
+                continue
+            for task in done:
+                provider = pending.pop(task)
+                if task.exception() is None:
+                    return task.result(), provider, hedged
+                errors.append(f"{provider.name}: {task.exception()}")
+                logger.warning("LLM provider %s failed: %s", provider.name, task.exception())
+            if not pending and queue:
+                launch()
+        raise AllProvidersFailed("; ".join(errors))
+    finally:
+        for task in pending:
+            task.cancel()
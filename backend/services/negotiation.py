@@ -0,0 +1,124 @@
+import hashlib
+import os
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+from services.catalog import Catalog, CategoryIndex
+from services.intent_cache import normalize_prompt
+
+# ---- CONFIG ----
+OFFER_PROBABILITY = float(os.environ.get("FLUX_NEGOTIATION_OFFER_PROBABILITY", "0.25"))
+DISCOUNT_PCTS = np.array([5, 10, 15], dtype=np.int64)
+MAX_DISCOUNT_PCT = int(DISCOUNT_PCTS.max())
+# Offer tables kept per catalog snapshot, keyed by (category, seed).
+OFFER_CACHE_ENTRIES = int(os.environ.get("FLUX_NEGOTIATION_CACHE_ENTRIES", "256"))
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+_MASK64 = (1 << 64) - 1
+
+
+def _mix64(x: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer over a uint64 array (wrapping arithmetic)."""
+    x = x ^ (x >> np.uint64(30))
+    x = x * np.uint64(0xBF58476D1CE4E5B9)
+    x = x ^ (x >> np.uint64(27))
+    x = x * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def sku_key(vendor_id: str, sku: str) -> int:
+    """Stable 64-bit key for a vendor's SKU; the same across processes and restarts."""
+    return int.from_bytes(hashlib.blake2b(f"{vendor_id}\x1f{sku}".encode(), digest_size=8).digest(), "little")
+
+
+def request_seed(prompt: str, budget: float, deadline_days: int, strategy: str) -> int:
+    """Default seed for a request: identical requests (after prompt normalization) negotiate
+    identically, so a retry never re-rolls discounts."""
+    material = f"{normalize_prompt(prompt)}|{budget!r}|{deadline_days}|{strategy}".encode()
+    return int.from_bytes(hashlib.blake2b(material, digest_size=8).digest(), "little") >> 1
+
+
+def discount_pcts(keys: np.ndarray, seed: int) -> np.ndarray:
+    """Discount percent (0 = no offer) for each SKU key under `seed`.
+
+    A pure function of (seed, vendor, SKU): offers replay exactly for a given seed and do not
+    depend on catalog order or on which other items are present.
+    """
+    with np.errstate(over="ignore"):
+        state = _mix64(keys ^ _mix64(np.array([seed & _MASK64], dtype=np.uint64)))
+        roll = (state >> np.uint64(11)).astype(np.float64) * (1.0 / (1 << 53))
+        pick = _mix64(state + _GOLDEN) % np.uint64(len(DISCOUNT_PCTS))
+    return np.where(roll < OFFER_PROBABILITY, DISCOUNT_PCTS[pick.astype(np.intp)], 0)
+
+
+class OfferBook:
+    """Negotiated offers for one catalog snapshot.
+
+    SKU keys are computed once per category, or read from a segment's precomputed column; discount
+    tables (aligned with `CategoryIndex.by_price` and its column arrays) are cached per seed, so
+    replays and concurrent identical requests reuse them.
+    """
+
+    def __init__(self, catalog: Catalog, max_entries: int = OFFER_CACHE_ENTRIES):
+        self.catalog = catalog
+        self.max_entries = max_entries
+        self._keys: dict[str, np.ndarray] = {}
+        self._tables: "OrderedDict[tuple[str, int], np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _category_keys(self, category: str, index: CategoryIndex) -> np.ndarray:
+        keys = self._keys.get(category)
+        if keys is None:
+            keys = index.sku_keys
+            if keys is None:
+                keys = np.fromiter((sku_key(i.vendor_id, i.id) for i in index.by_price), dtype=np.uint64, count=len(index))
+            self._keys[category] = keys
+        return keys
+
+    def discounts(self, category: str, seed: int) -> np.ndarray:
+        """Discount percent per item of `category`, in `by_price` order."""
+        key = (category, seed)
+        with self._lock:
+            table = self._tables.get(key)
+            if table is not None:
+                self._tables.move_to_end(key)
+                return table
+        index = self.catalog.category(category)
+        table = discount_pcts(self._category_keys(category, index), seed)
+        table.flags.writeable = False
+        with self._lock:
+            self._tables[key] = table
+            while len(self._tables) > self.max_entries:
+                self._tables.popitem(last=False)
+        return table
+
+
+def effective_prices(prices: np.ndarray, pcts: np.ndarray) -> np.ndarray:
+    """Prices after discount, rounded to cents as the coupon path always has."""
+    return np.where(pcts > 0, np.round(prices * (1 - pcts / 100), 2), prices)
+
+
+def widened_budget(budget: float) -> float:
+    """Largest list price that could still fit `budget` after the deepest discount."""
+    return budget / (1 - MAX_DISCOUNT_PCT / 100)
+
+
+_books: "weakref.WeakKeyDictionary[Catalog, OfferBook]" = weakref.WeakKeyDictionary()
+_books_lock = threading.Lock()
+
+
+def offer_book(catalog: Catalog) -> OfferBook:
+    """The OfferBook for a snapshot; dropped together with the snapshot after a reload."""
+    with _books_lock:
+        book = _books.get(catalog)
+        if book is None:
+            book = _books[catalog] = OfferBook(catalog)
+        return book
+
+
+def resolve_seed(seed: Optional[int], prompt: str, budget: float, deadline_days: int, strategy: str) -> int:
+    return seed if seed is not None else request_seed(prompt, budget, deadline_days, strategy)
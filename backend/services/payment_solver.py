@@ -1,7 +1,25 @@
+import json
 import logging
 import os
-from typing import Optional
-from web3 import Web3
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Optional
+
+from utils import sdk_registry, tracing
+from utils.shared_state import pid_alive, shared_path
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX; the shared allocator needs flock
+    fcntl = None
+
+if TYPE_CHECKING:
+    from web3 import Web3
+
+# web3 (and the RPC session stack) load with the first real settlement, not at startup.
+requests = sdk_registry.module("requests")
+eth_utils = sdk_registry.module("eth_utils")
+web3 = sdk_registry.module("web3")
 
 ARC_RPC = "https://rpc.testnet.arc.network"
 ARC_CHAIN_ID = 5042002
@@ -16,6 +34,14 @@ WHITELISTED_MERCHANTS = {
 
 MAX_BUDGET_CAP = 10_000.0
 
+# ---- SETTLEMENT ENGINE CONFIG ----
+TRANSFER_GAS_LIMIT = 120_000
+GAS_PRICE_TTL_SEC = float(os.environ.get("FLUX_GAS_PRICE_TTL_SEC", "10"))
+RPC_POOL_SIZE = int(os.environ.get("FLUX_RPC_POOL_SIZE", "20"))
+# 0 = return as soon as transfers are accepted by the node; > 0 = poll receipts up to this long.
+SETTLEMENT_CONFIRM_TIMEOUT_SEC = float(os.environ.get("FLUX_SETTLEMENT_CONFIRM_TIMEOUT_SEC", "0"))
+RECEIPT_POLL_INTERVAL_SEC = 1.0
+
 ERC20_TRANSFER_ABI = [
     {"inputs": [{"name": "to", "type": "address"}, {"name": "value", "type": "uint256"}], "name": "transfer", "type": "function"}
 ]
@@ -25,44 +51,415 @@ logger = logging.getLogger(__name__)
 class PolicyViolation(Exception):
     pass
 
-def execute_payment(cart: list[dict]) -> dict:
-    private_key = os.environ.get("PAYMENT_PRIVATE_KEY")
-    w3 = Web3(Web3.HTTPProvider(ARC_RPC))
-    
-    # Policy check (Whitelisting + Budget)
+class SettlementError(Exception):
+    pass
+
+
+def _to_int(value: Any) -> int:
+    return int(value, 16) if isinstance(value, str) else int(value)
+
+
+@tracing.span("payment.policy")
+def check_policy(cart: list[dict]) -> None:
+    """ArcFlow policy gate: budget cap and merchant whitelist, checked before anything is signed."""
     total_usd = sum(float(i.get("price", 0)) for i in cart)
     if total_usd > MAX_BUDGET_CAP:
         raise PolicyViolation("Budget exceeded")
+    unknown = sorted({str(i.get("vendor_id")) for i in cart if i.get("vendor_id") not in WHITELISTED_MERCHANTS})
+    if unknown:
+        raise PolicyViolation(f"Merchant not whitelisted: {', '.join(unknown)}")
+
+
+class NonceManager:
+    """Single-writer nonce allocator: one lock and one next-nonce counter per signing account.
+
+    The chain is consulted only the first time an account is seen (or after `resync`), so
+    concurrent carts paid from the same key get disjoint nonce ranges instead of colliding.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._accounts: dict[str, tuple[threading.Lock, list]] = {}
+
+    def _account(self, address: str) -> tuple[threading.Lock, list]:
+        with self._lock:
+            if address not in self._accounts:
+                self._accounts[address] = (threading.Lock(), [None])
+            return self._accounts[address]
+
+    def allocate(self, address: str, count: int, fetch_chain_nonce) -> int:
+        lock, state = self._account(address)
+        with lock:
+            if state[0] is None:
+                state[0] = fetch_chain_nonce()
+            start = state[0]
+            state[0] += count
+            return start
+
+    def resync(self, address: str) -> None:
+        """Forget the local counter; the next allocation re-reads the chain's pending nonce."""
+        lock, state = self._account(address)
+        with lock:
+            state[0] = None
+
+    def peek(self, address: str) -> Optional[int]:
+        return self._account(address)[1][0]
+
+    def release(self, address: str) -> None:
+        """A reservation's transfers are all sent (or abandoned); nothing to track in-process."""
+
+
+class SharedNonceManager:
+    """NonceManager for several worker processes paying from one account (multi-worker mode).
+
+    The next nonce lives in `<directory>/<address>.json` and is read and advanced under flock, so
+    workers get disjoint ranges. A resync only re-reads the chain once no live worker holds an
+    unsent reservation; until then the counter stands, since the chain's pending nonce would
+    not yet count those reservations and the next range would collide with them.
+    """
+
+    def __init__(self, directory: str):
+        if fcntl is None:
+            raise RuntimeError("Multi-worker settlement needs flock (POSIX) to share nonces")
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, address: str) -> str:
+        return os.path.join(self.directory, f"{address.lower()}.json")
+
+    def _update(self, address: str, change):
+        """Apply `change(state)` to the account's state under its lock; returns what it returns."""
+        with open(self._path(address) + ".lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                with open(self._path(address)) as fh:
+                    state = json.load(fh)
+            except FileNotFoundError:
+                state = {"next": None, "resync": False, "holders": {}}
+            state["holders"] = {pid: n for pid, n in state["holders"].items() if n > 0 and pid_alive(int(pid))}
+            result = change(state)
+            tmp = f"{self._path(address)}.tmp.{os.getpid()}"
+            with open(tmp, "w") as fh:
+                json.dump(state, fh)
+            os.replace(tmp, self._path(address))
+            return result
+
+    def allocate(self, address: str, count: int, fetch_chain_nonce) -> int:
+        me = str(os.getpid())
+
+        def reserve(state: dict) -> int:
+            if state["next"] is None or (state["resync"] and not state["holders"]):
+                state["next"], state["resync"] = fetch_chain_nonce(), False
+            start = state["next"]
+            state["next"] += count
+            state["holders"][me] = state["holders"].get(me, 0) + 1
+            return start
+
+        return self._update(address, reserve)
+
+    def release(self, address: str) -> None:
+        me = str(os.getpid())
+
+        def release(state: dict) -> None:
+            if state["holders"].get(me, 0) > 1:
+                state["holders"][me] -= 1
+            else:
+                state["holders"].pop(me, None)
+
+        self._update(address, release)
+
+    def resync(self, address: str) -> None:
+        self._update(address, lambda state: state.update(resync=True))
+
+    def peek(self, address: str) -> Optional[int]:
+        try:
+            with open(self._path(address)) as fh:
+                return json.load(fh)["next"]
+        except FileNotFoundError:
+            return None
+
+
+def build_nonce_manager():
+    """Shared allocator in multi-worker mode (FLUX_SHARED_STATE_DIR), in-process otherwise."""
+    directory = shared_path("nonces")
+    return SharedNonceManager(directory) if directory is not None else NonceManager()
+
+
+class SettlementEngine:
+    """Long-lived settlement session: one pooled RPC connection set, a short-lived gas price cache,
+    local signing of every cart line, and batched JSON-RPC submission and receipt polling.
+
+    With a batching provider (HTTP) a cart settles in two round trips (nonce + gas, then all sends)
+    regardless of its length. Providers without batch support (e.g. eth-tester) get the same
+    calls issued one by one.
+    """
+
+    def __init__(
+        self,
+        w3: Optional["Web3"] = None,
+        rpc_url: str = ARC_RPC,
+        chain_id: int = ARC_CHAIN_ID,
+        token_address: str = USDC_TOKEN_ADDRESS,
+        gas_price_ttl: float = GAS_PRICE_TTL_SEC,
+    ):
+        if w3 is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=RPC_POOL_SIZE, pool_maxsize=RPC_POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            w3 = web3.Web3(web3.Web3.HTTPProvider(rpc_url, session=session))
+        self.w3 = w3
+        self.chain_id = chain_id
+        self.contract = w3.eth.contract(address=web3.Web3.to_checksum_address(token_address), abi=ERC20_TRANSFER_ABI)
+        self.gas_price_ttl = gas_price_ttl
+        self._gas_price: Optional[tuple[int, float]] = None
+        self._lock = threading.Lock()
+        self.nonces = build_nonce_manager()
+        self.rpc_round_trips = 0
+
+    # ---- RPC PLUMBING ----
+    def rpc_batch(self, calls: list[tuple[str, list]]) -> list[dict]:
+        """Issue JSON-RPC calls as one batch when the provider supports it. Returns raw responses
+        in call order, so per-call errors (and null receipts) can be handled individually."""
+        if not calls:
+            return []
+        provider = self.w3.provider
+        methods = {method for method, _ in calls}
+        stage = f"rpc.{methods.pop()}" if len(methods) == 1 else "rpc.batch"
+        if hasattr(provider, "make_batch_request"):
+            self.rpc_round_trips += 1
+            with tracing.span(stage):
+                responses = provider.make_batch_request(calls)
+            if isinstance(responses, list):
+                return list(responses)
+            raise SettlementError(f"Batch RPC rejected: {responses.get('error')}")
+        responses = []
+        for method, params in calls:
+            self.rpc_round_trips += 1
+            with tracing.span(f"rpc.{method}"):
+                responses.append(provider.make_request(method, params))
+        return responses
+
+    @staticmethod
+    def _result(response: dict, what: str) -> Any:
+        if response.get("error"):
+            raise SettlementError(f"{what} failed: {response['error']}")
+        return response.get("result")
+
+    # ---- SESSION STATE ----
+    def _cached_gas_price(self) -> Optional[int]:
+        with self._lock:
+            if self._gas_price and time.monotonic() - self._gas_price[1] < self.gas_price_ttl:
+                return self._gas_price[0]
+        return None
+
+    def _store_gas_price(self, price: int) -> int:
+        with self._lock:
+            self._gas_price = (price, time.monotonic())
+        return price
+
+    def invalidate_gas_price(self) -> None:
+        with self._lock:
+            self._gas_price = None
+
+    def gas_price(self) -> int:
+        cached = self._cached_gas_price()
+        if cached is not None:
+            return cached
+        (response,) = self.rpc_batch([("eth_gasPrice", [])])
+        return self._store_gas_price(_to_int(self._result(response, "eth_gasPrice")))
+
+    def pending_nonce(self, address: str) -> int:
+        (response,) = self.rpc_batch([("eth_getTransactionCount", [address, "pending"])])
+        return _to_int(self._result(response, "eth_getTransactionCount"))
+
+    def prepare(self, address: str) -> tuple[int, int]:
+        """Pending nonce and gas price for `address`, fetched together in one batch."""
+        cached = self._cached_gas_price()
+        calls = [("eth_getTransactionCount", [address, "pending"])]
+        if cached is None:
+            calls.append(("eth_gasPrice", []))
+        responses = self.rpc_batch(calls)
+        nonce = _to_int(self._result(responses[0], "eth_getTransactionCount"))
+        gas_price = cached if cached is not None else self._store_gas_price(_to_int(self._result(responses[1], "eth_gasPrice")))
+        return nonce, gas_price
+
+    def allocate_nonces(self, address: str, count: int) -> tuple[int, int]:
+        """Reserve `count` consecutive nonces for `address`. Returns (start nonce, gas price); when the
+        account is new to the allocator, nonce and gas price come back in a single batch. If the gas
+        price cannot be fetched, the reservation is dropped and the allocator resynced."""
+        gas_price = None
+
+        def fetch_chain_nonce() -> int:
+            nonlocal gas_price
+            nonce, gas_price = self.prepare(address)
+            return nonce
+
+        start = self.nonces.allocate(address, count, fetch_chain_nonce)
+        if gas_price is None:
+            try:
+                gas_price = self.gas_price()
+            except Exception:
+                # Nothing will be signed for this range: give it back rather than leave a gap.
+                self.nonces.resync(address)
+                self.nonces.release(address)
+                raise
+        return start, gas_price
+
+    # ---- PIPELINE ----
+    def _transfer_tx(self, item: dict, nonce: int, gas_price: int) -> dict:
+        to_address = web3.Web3.to_checksum_address(WHITELISTED_MERCHANTS[item["vendor_id"]])
+        amount_raw = int(round(float(item["price"]) * (10**USDC_DECIMALS)))
+        return {
+            "to": self.contract.address,
+            "data": self.contract.encode_abi("transfer", args=[to_address, amount_raw]),
+            "value": 0,
+            "gas": TRANSFER_GAS_LIMIT,
+            "gasPrice": gas_price,
+            "nonce": nonce,
+            "chainId": self.chain_id,
+        }
+
+    def _filler_tx(self, address: str, nonce: int, gas_price: int) -> dict:
+        """Zero-value self-transfer that occupies a nonce whose real transfer was dropped."""
+        return {"to": address, "value": 0, "gas": 21_000, "gasPrice": gas_price, "nonce": nonce, "chainId": self.chain_id}
+
+    @tracing.span("settlement.sign")
+    def sign_transfers(self, acct, cart: list[dict], start_nonce: int, gas_price: int) -> list[bytes]:
+        """Sign every cart line locally with consecutive nonces; no RPC involved."""
+        return [
+            bytes(acct.sign_transaction(self._transfer_tx(item, start_nonce + offset, gas_price)).raw_transaction)
+            for offset, item in enumerate(cart)
+        ]
+
+    @staticmethod
+    def tx_hash(raw_transaction: bytes) -> str:
+        return web3.Web3.to_hex(eth_utils.keccak(raw_transaction))
+
+    def broadcast(self, raw_transactions: list[bytes]) -> tuple[list[str], list[Optional[str]]]:
+        """Send all signed transactions in one batch. Hashes are derived locally; the per-transaction
+        error is None on acceptance (a node that already knows the transaction counts as accepted)."""
+        hashes = [self.tx_hash(raw) for raw in raw_transactions]
+        responses = self.rpc_batch([("eth_sendRawTransaction", [web3.Web3.to_hex(raw)]) for raw in raw_transactions])
+        errors: list[Optional[str]] = []
+        for response in responses:
+            error = response.get("error")
+            errors.append(str(error) if error and "already known" not in str(error).lower() else None)
+        return hashes, errors
+
+    def submit(self, raw_transactions: list[bytes]) -> list[str]:
+        """Broadcast all signed transfers in one batch, raising if any was rejected."""
+        hashes, errors = self.broadcast(raw_transactions)
+        failures = [f"{h}: {e}" for h, e in zip(hashes, errors) if e]
+        if failures:
+            raise SettlementError("; ".join(failures))
+        return hashes
+
+    @tracing.span("settlement.settle_lines")
+    def settle_lines(self, acct, lines: list[dict], recorder=None) -> list[dict]:
+        """Settle many lines (possibly from several carts) under one nonce reservation.
+
+        A rejected transfer is retried once at the same nonce with a fresh gas price. If it still
+        fails, a zero-value filler takes its nonce so later transfers are not stuck behind the gap,
+        and the allocator is resynced from the chain before its next reservation. If signing or
+        a broadcast raises, the allocator is resynced before the error propagates.
+        `recorder` (a settlement_journal.BatchRecorder) is told of every signed transfer before it
+        is broadcast, and of each line's final hash and error.
+        Returns {"tx_hash", "error"} per line, in order.
+        """
+        if not lines:
+            return []
+        start, gas_price = self.allocate_nonces(acct.address, len(lines))
+        try:
+            signed = self.sign_transfers(acct, lines, start, gas_price)
+            if recorder is not None:
+                recorder.signed(list(range(len(lines))), [start + k for k in range(len(lines))], signed, [self.tx_hash(raw) for raw in signed])
+            hashes, errors = self.broadcast(signed)
+
+            failed = [k for k, e in enumerate(errors) if e]
+            if failed:
+                self.invalidate_gas_price()
+                gas_price = self.gas_price()
+                retry = [bytes(acct.sign_transaction(self._transfer_tx(lines[k], start + k, gas_price)).raw_transaction) for k in failed]
+                if recorder is not None:
+                    recorder.signed(failed, [start + k for k in failed], retry, [self.tx_hash(raw) for raw in retry])
+                retry_hashes, retry_errors = self.broadcast(retry)
+                for k, tx_hash, error in zip(failed, retry_hashes, retry_errors):
+                    hashes[k], errors[k] = tx_hash, error
+
+            still_failed = [k for k, e in enumerate(errors) if e]
+            if still_failed:
+                logger.warning("Filling %s dropped nonce(s) for %s", len(still_failed), acct.address)
+                fillers = [bytes(acct.sign_transaction(self._filler_tx(acct.address, start + k, gas_price)).raw_transaction) for k in still_failed]
+                _, filler_errors = self.broadcast(fillers)
+                if any(filler_errors):
+                    self.nonces.resync(acct.address)
+        except Exception:
+            # The reservation may now be a gap (nothing sent) or partly used: either way only the
+            # chain knows the next usable nonce, so re-read it rather than queue behind the gap.
+            self.nonces.resync(acct.address)
+            raise
+        finally:
+            self.nonces.release(acct.address)
+
+        if recorder is not None:
+            recorder.submitted([None if e else h for h, e in zip(hashes, errors)], errors)
+        return [{"tx_hash": None if e else h, "error": e} for h, e in zip(hashes, errors)]
+
+    def poll_receipts(self, tx_hashes: list[str], timeout: float, interval: float = RECEIPT_POLL_INTERVAL_SEC) -> dict[str, Optional[int]]:
+        """Receipt status per hash (1 success, 0 reverted, None still pending), one batch per poll round."""
+        statuses: dict[str, Optional[int]] = {h: None for h in tx_hashes}
+        deadline = time.monotonic() + timeout
+        while True:
+            pending = [h for h, status in statuses.items() if status is None]
+            if not pending:
+                break
+            responses = self.rpc_batch([("eth_getTransactionReceipt", [h]) for h in pending])
+            for tx_hash, response in zip(pending, responses):
+                receipt = response.get("result")
+                if receipt:
+                    statuses[tx_hash] = _to_int(receipt["status"])
+            if time.monotonic() >= deadline or all(s is not None for s in statuses.values()):
+                break
+            time.sleep(interval)
+        return statuses
+
+    def account(self, private_key: str):
+        if private_key.startswith("0x"): private_key = private_key[2:]
+        return self.w3.eth.account.from_key(private_key)
+
+    def settle(self, cart: list[dict], private_key: str, confirm_timeout: float = SETTLEMENT_CONFIRM_TIMEOUT_SEC) -> dict:
+        results = self.settle_lines(self.account(private_key), cart)
+        failures = [f"{line.get('id')}: {r['error']}" for line, r in zip(cart, results) if r["error"]]
+        if failures:
+            raise SettlementError("; ".join(failures))
+        transaction_hashes = [r["tx_hash"] for r in results]
+        result = {"status": "success", "transaction_hashes": transaction_hashes}
+        if confirm_timeout > 0:
+            result["receipts"] = self.poll_receipts(transaction_hashes, confirm_timeout)
+        return result
+
+
+_engine: Optional[SettlementEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> SettlementEngine:
+    """Process-wide settlement engine, created on first real (non-sandbox) payment."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = SettlementEngine()
+        return _engine
+
+
+def execute_payment(cart: list[dict]) -> dict:
+    private_key = os.environ.get("PAYMENT_PRIVATE_KEY")
+
+    # Policy check (Whitelisting + Budget)
+    check_policy(cart)
 
     if not private_key:
         return {"status": "success", "logs": ["Sandbox Mode"], "transaction_hashes": ["0x-mock"]}
 
-    if private_key.startswith("0x"): private_key = private_key[2:]
-    acct = w3.eth.account.from_key(private_key)
-    contract = w3.eth.contract(address=Web3.to_checksum_address(USDC_TOKEN_ADDRESS), abi=ERC20_TRANSFER_ABI)
-
-    # NONCE MANAGEMENT
-    current_nonce = w3.eth.get_transaction_count(acct.address)
-    transaction_hashes = []
-
-    for item in cart:
-        to_address = WHITELISTED_MERCHANTS.get(item["vendor_id"])
-        amount_raw = int(float(item["price"]) * (10**USDC_DECIMALS))
-        
-        tx = contract.functions.transfer(
-            Web3.to_checksum_address(to_address), 
-            amount_raw
-        ).build_transaction({
-            "from": acct.address,
-            "chainId": ARC_CHAIN_ID,
-            "gas": 120_000,
-            "gasPrice": w3.eth.gas_price,
-            "nonce": current_nonce,
-        })
-        
-        signed = acct.sign_transaction(tx)
-        tx_hash = w3.to_hex(w3.eth.send_raw_transaction(signed.raw_transaction))
-        transaction_hashes.append(tx_hash)
-        current_nonce += 1 # Increment for next item in cart
-
-    return {"status": "success", "transaction_hashes": transaction_hashes}
\ No newline at end of file
+    return get_engine().settle(cart, private_key)
@@ -0,0 +1,73 @@
+from typing import Optional
+
+import numpy as np
+
+# ---- STRATEGY WEIGHTS ----
+# Rows follow STRATEGIES; columns weight (normalized price, normalized delivery, trust penalty).
+# Mirrors ai_engine.calculate_score, which stays the scalar reference implementation.
+STRATEGIES = ("cheapest", "fastest", "balanced")
+STRATEGY_WEIGHTS = np.array(
+    [
+        [0.9, 0.1, 0.0],
+        [0.1, 0.9, 0.0],
+        [0.5, 0.5, 0.0],
+    ],
+    dtype=np.float64,
+)
+PRICE_SCALE = 200.0
+DELIVERY_SCALE = 7.0
+
+
+def round_scores(scores: np.ndarray, ndigits: int = 3) -> np.ndarray:
+    """Round like Python's round(): np.round scales first, so exact-looking halves (0.0125) can land
+    on the other side. Values whose scaled form sits on a .5 boundary are re-rounded in Python."""
+    scaled = scores * 10.0 ** ndigits
+    rounded = np.rint(scaled) / 10.0 ** ndigits
+    ties = np.flatnonzero(np.abs(np.abs(scaled - np.trunc(scaled)) - 0.5) < 1e-6)
+    if ties.size:
+        flat_scores, flat_rounded = scores.reshape(-1), rounded.reshape(-1)
+        flat_rounded[ties] = [round(float(v), ndigits) for v in flat_scores[ties]]
+    return rounded
+
+
+def strategy_row(strategy: str) -> int:
+    """Row of `score_all_strategies` output for a strategy; unknown names score as balanced."""
+    return STRATEGIES.index(strategy) if strategy in STRATEGIES else STRATEGIES.index("balanced")
+
+
+def score_all_strategies(price: np.ndarray, delivery_days: np.ndarray, trust: Optional[np.ndarray] = None) -> np.ndarray:
+    """Score a whole column set for every strategy at once. Lower is better.
+
+    Returns a (len(STRATEGIES), n) array; row i holds the scores for STRATEGIES[i].
+    """
+    price = np.asarray(price, dtype=np.float64)
+    delivery_days = np.asarray(delivery_days, dtype=np.float64)
+    trust_penalty = np.zeros_like(price) if trust is None else (100.0 - np.asarray(trust, dtype=np.float64)) / 100.0
+    # Broadcast elementwise rather than matmul: BLAS may fuse multiply-adds, which breaks bit parity
+    # with the scalar reference and flips rounding on ties.
+    w = STRATEGY_WEIGHTS[:, :, None]
+    scores = (price / PRICE_SCALE)[None, :] * w[:, 0] + (delivery_days / DELIVERY_SCALE)[None, :] * w[:, 1]
+    scores += trust_penalty[None, :] * w[:, 2]
+    return round_scores(scores)
+
+
+def score_strategy(price: np.ndarray, delivery_days: np.ndarray, strategy: str, trust: Optional[np.ndarray] = None) -> np.ndarray:
+    """Scores for a single strategy; cheaper than slicing `score_all_strategies` when only one is needed."""
+    w_p, w_d, w_t = STRATEGY_WEIGHTS[strategy_row(strategy)]
+    scores = np.asarray(price, dtype=np.float64) / PRICE_SCALE * w_p + np.asarray(delivery_days, dtype=np.float64) / DELIVERY_SCALE * w_d
+    if trust is not None and w_t:
+        scores += (100.0 - np.asarray(trust, dtype=np.float64)) / 100.0 * w_t
+    return round_scores(scores)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k lowest scores, best first. Ties keep input order, matching min() over a list."""
+    n = len(scores)
+    if k <= 0 or n == 0:
+        return np.empty(0, dtype=np.intp)
+    if k >= n:
+        return np.argsort(scores, kind="stable")
+    if k == 1:
+        return np.array([int(np.argmin(scores))], dtype=np.intp)
+    part = np.argpartition(scores, k - 1)[:k]
+    return part[np.lexsort((part, scores[part]))]
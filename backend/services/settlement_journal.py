@@ -0,0 +1,288 @@
+"""
+Durable settlement journal: what makes /execute_payment safe to retry and to crash.
+
+Every cart is keyed by an idempotency key. Its lines are written as intents before anything is
+signed, each signed transfer (nonce, hash, raw bytes) is written before it is broadcast, then
+the node's verdict, any receipt seen, and finally the cart's result. Events are append-only;
+the `carts` table indexes each key's digest, status, owning process and final result.
+
+The settlement scheduler commits each stage for a whole batch at once (SQLite WAL with
+synchronous=FULL), so a batch costs the same few fsyncs however many carts it carries.
+
+A cart left pending by a process that died is reconciled rather than paid again: signed lines
+are checked for receipts and re-broadcast at their own nonce (a no-op if the node already has
+them), and only lines that were never signed are settled afresh.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, NamedTuple, Optional
+
+from utils.logger import get_logger
+from utils.shared_state import pid_alive, shared_path
+
+logger = get_logger(__name__)
+
+# ---- CONFIG ----
+SETTLEMENT_JOURNAL_PATH = (
+    os.environ.get("FLUX_SETTLEMENT_JOURNAL_PATH") or shared_path("settlement_journal.sqlite3") or "flux_settlement_journal.sqlite3"
+)
+SQLITE_BUSY_TIMEOUT_MS = 5000
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+
+# Cart states reported by lookup/claim.
+NEW = "new"            # unknown key: settle it
+RESUME = "resume"      # pending, left behind by a dead process (or a failed batch): reconcile it
+DONE = "done"          # settled earlier: replay the stored result
+BUSY = "busy"          # pending and owned by a live settlement
+CONFLICT = "conflict"  # key reused with a different cart
+
+
+class IdempotencyConflict(Exception):
+    pass
+
+
+class SettlementInProgress(Exception):
+    pass
+
+
+class SettlementUnresolved(Exception):
+    """Settlement failed part-way and could not be reconciled yet; retry with `key` to finish it."""
+
+    def __init__(self, key: str, cause: Exception):
+        super().__init__(f"Settlement for idempotency key {key!r} is unresolved: {cause}")
+        self.key = key
+
+
+def cart_digest(cart: list[dict]) -> str:
+    """Order-sensitive digest of a cart, so a reused key can be told apart from a retry."""
+    return hashlib.sha256(json.dumps(cart, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+def resolve(key: str, status: str, result: Optional[dict]) -> dict:
+    """The stored result for a DONE key; raises for a key that cannot be settled now."""
+    if status == DONE:
+        return {**result, "replayed": True}
+    if status == CONFLICT:
+        raise IdempotencyConflict(f"Idempotency key {key!r} was already used for a different cart")
+    raise SettlementInProgress(f"Settlement for idempotency key {key!r} is still in progress")
+
+
+def _owner_alive(owner: Optional[str], me: str) -> bool:
+    if owner is None:
+        return False
+    if owner == me:
+        return True
+    pid = int(owner.partition(":")[0])
+    if pid == os.getpid():
+        return False  # an earlier incarnation with our pid (e.g. a restarted container)
+    return pid_alive(pid)
+
+
+class LineState(NamedTuple):
+    """Everything journaled for one cart line, oldest event first."""
+
+    line: int
+    item: dict
+    signed: list[dict]           # {"nonce", "tx_hash", "raw"}; a retry at the same nonce appends
+    submitted: Optional[dict]    # {"tx_hash", "error"} after the batch's broadcasts
+    receipt: Optional[dict]      # {"tx_hash", "status"} once seen on chain
+
+
+class SettlementJournal:
+    def __init__(self, path: str = SETTLEMENT_JOURNAL_PATH, owner: Optional[str] = None):
+        self.path = path
+        self.owner = owner or f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # FULL: every commit is fsynced, so an event is on disk before the transfer it describes is sent.
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS carts ("
+            " key TEXT PRIMARY KEY, digest TEXT NOT NULL, status TEXT NOT NULL, owner TEXT,"
+            " result TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS carts_status ON carts(status)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS events ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL, line INTEGER,"
+            " kind TEXT NOT NULL, data TEXT NOT NULL, at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS events_key ON events(key, seq)")
+
+    def _write(self, statements: list[tuple[str, tuple]]) -> None:
+        """Run `statements` as one transaction: one commit, one fsync."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for sql, params in statements:
+                    self._conn.execute(sql, params)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _status(self, row: Optional[tuple], digest: str) -> tuple[str, Optional[dict]]:
+        if row is None:
+            return NEW, None
+        row_digest, status, owner, result = row
+        if row_digest != digest:
+            return CONFLICT, None
+        if status == "done":
+            return DONE, json.loads(result)
+        return (BUSY if _owner_alive(owner, self.owner) else RESUME), None
+
+    def lookup(self, key: str, digest: str) -> tuple[str, Optional[dict]]:
+        with self._lock:
+            row = self._conn.execute("SELECT digest, status, owner, result FROM carts WHERE key = ?", (key,)).fetchone()
+        return self._status(row, digest)
+
+    def claim(self, carts: list[tuple[str, str, list[dict]]]) -> list[tuple[str, Optional[dict]]]:
+        """Take ownership of each (key, digest, cart), journaling intents for new ones, in one commit.
+
+        Returns (status, result) per cart: NEW or RESUME when this process now owns it, otherwise
+        what `lookup` would report.
+        """
+        now = time.time()
+        outcomes = []
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for key, digest, cart in carts:
+                    row = self._conn.execute("SELECT digest, status, owner, result FROM carts WHERE key = ?", (key,)).fetchone()
+                    status, result = self._status(row, digest)
+                    if status == NEW:
+                        self._conn.execute(
+                            "INSERT INTO carts (key, digest, status, owner, created_at, updated_at) VALUES (?, ?, 'pending', ?, ?, ?)",
+                            (key, digest, self.owner, now, now),
+                        )
+                        self._conn.executemany(
+                            "INSERT INTO events (key, line, kind, data, at) VALUES (?, ?, 'intent', ?, ?)",
+                            [(key, n, json.dumps(item), now) for n, item in enumerate(cart)],
+                        )
+                    elif status == RESUME:
+                        self._conn.execute("UPDATE carts SET owner = ?, updated_at = ? WHERE key = ?", (self.owner, now, key))
+                    outcomes.append((status, result))
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        return outcomes
+
+    def orphans(self) -> list[str]:
+        """Pending keys whose owner is gone, oldest first."""
+        with self._lock:
+            rows = self._conn.execute("SELECT key, owner FROM carts WHERE status = 'pending' ORDER BY created_at").fetchall()
+        return [key for key, owner in rows if not _owner_alive(owner, self.owner)]
+
+    def take_over(self, key: str) -> bool:
+        """Claim one orphaned pending cart for this process; False if it is no longer orphaned."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT status, owner FROM carts WHERE key = ?", (key,)).fetchone()
+                taken = row is not None and row[0] == "pending" and not _owner_alive(row[1], self.owner)
+                if taken:
+                    self._conn.execute("UPDATE carts SET owner = ?, updated_at = ? WHERE key = ?", (self.owner, time.time(), key))
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        return taken
+
+    def release(self, keys: list[str]) -> None:
+        """Give up pending carts (e.g. after a failed batch) so a retry or restart reconciles them."""
+        self._write([("UPDATE carts SET owner = NULL WHERE key = ? AND status = 'pending'", (key,)) for key in keys])
+
+    def append(self, kind: str, events: list[tuple[str, int, dict]]) -> None:
+        """Journal (key, line, data) events of one kind in one commit."""
+        if not events:
+            return
+        now = time.time()
+        self._write([
+            ("INSERT INTO events (key, line, kind, data, at) VALUES (?, ?, ?, ?, ?)", (key, line, kind, json.dumps(data), now))
+            for key, line, data in events
+        ])
+
+    def finish(self, results: list[tuple[str, dict]]) -> None:
+        """Record each cart's final result; later lookups of its key replay it."""
+        if not results:
+            return
+        now = time.time()
+        statements = []
+        for key, result in results:
+            document = json.dumps(result)
+            statements.append(("INSERT INTO events (key, line, kind, data, at) VALUES (?, NULL, 'result', ?, ?)", (key, document, now)))
+            statements.append(("UPDATE carts SET status = 'done', result = ?, updated_at = ? WHERE key = ?", (document, now, key)))
+        self._write(statements)
+
+    def lines(self, key: str) -> list[LineState]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT line, kind, data FROM events WHERE key = ? AND line IS NOT NULL ORDER BY seq", (key,)
+            ).fetchall()
+        states: dict[int, dict[str, Any]] = {}
+        for line, kind, data in rows:
+            data = json.loads(data)
+            if kind == "intent":
+                states[line] = {"line": line, "item": data, "signed": [], "submitted": None, "receipt": None}
+            elif kind == "signed":
+                states[line]["signed"].append(data)
+            else:
+                states[line][kind] = data
+        return [LineState(**states[line]) for line in sorted(states)]
+
+    def recorder(self, refs: list[tuple[str, int]]) -> "BatchRecorder":
+        return BatchRecorder(self, refs)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM carts GROUP BY status").fetchall())
+        return {"journal_pending_carts": counts.get("pending", 0), "journal_settled_carts": counts.get("done", 0)}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class BatchRecorder:
+    """Journals a settlement batch's lines for SettlementEngine.settle_lines.
+
+    `refs[k]` is the (idempotency key, cart line) of batch position k. Each call is one commit.
+    """
+
+    def __init__(self, journal: SettlementJournal, refs: list[tuple[str, int]]):
+        self.journal = journal
+        self.refs = refs
+
+    def signed(self, positions: list[int], nonces: list[int], raw_transactions: list[bytes], hashes: list[str]) -> None:
+        self.journal.append("signed", [
+            (*self.refs[k], {"nonce": nonce, "tx_hash": tx_hash, "raw": raw.hex()})
+            for k, nonce, raw, tx_hash in zip(positions, nonces, raw_transactions, hashes)
+        ])
+
+    def submitted(self, hashes: list[str], errors: list[Optional[str]]) -> None:
+        self.journal.append("submitted", [
+            (*ref, {"tx_hash": tx_hash, "error": error}) for ref, tx_hash, error in zip(self.refs, hashes, errors)
+        ])
+
+
+_journal: Optional[SettlementJournal] = None
+_journal_lock = threading.Lock()
+
+
+def get_journal() -> SettlementJournal:
+    """Process-wide journal, opened with the first on-chain settlement."""
+    global _journal
+    with _journal_lock:
+        if _journal is None:
+            _journal = SettlementJournal()
+        return _journal
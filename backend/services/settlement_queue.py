@@ -0,0 +1,383 @@
+import asyncio
+import os
+import time
+import uuid
+from typing import Any, Optional
+
+from services import admission, settlement_journal
+from services.llm_providers import LatencyTracker
+from services.payment_solver import SettlementEngine, check_policy, get_engine
+from utils import tracing
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# ---- CONFIG ----
+SETTLEMENT_BATCH_MAX_LINES = int(os.environ.get("FLUX_SETTLEMENT_BATCH_MAX_LINES", "200"))
+SETTLEMENT_BATCH_WINDOW_MS = float(os.environ.get("FLUX_SETTLEMENT_BATCH_WINDOW_MS", "20"))
+SETTLEMENT_MAX_TX_PER_SEC = float(os.environ.get("FLUX_SETTLEMENT_MAX_TX_PER_SEC", "50"))
+
+
+class _Job:
+    __slots__ = ("cart", "future", "key", "digest", "enqueued_at")
+
+    def __init__(self, cart: list[dict], future: asyncio.Future, key: Optional[str] = None, digest: Optional[str] = None):
+        self.cart = cart
+        self.future = future
+        self.key = key
+        self.digest = digest
+        self.enqueued_at = time.perf_counter()
+
+
+def _cart_result(line_results: list[dict]) -> dict:
+    errors = [r["error"] for r in line_results if r["error"]]
+    return {
+        "status": "failed" if errors else "success",
+        "transaction_hashes": [r["tx_hash"] for r in line_results if r["tx_hash"]],
+        **({"errors": errors} if errors else {}),
+    }
+
+
+class SettlementScheduler:
+    """Serializes settlement for one treasury account.
+
+    Carts are queued; a single worker drains whatever is waiting (up to a line budget), settles
+    those lines under one nonce reservation and one batched broadcast, and paces submissions to
+    `max_tx_per_sec`. Each caller awaits only its own cart's result.
+
+    With a journal, every cart carries an idempotency key: a key that already settled replays
+    its result without touching the chain, a concurrent duplicate joins the settlement in
+    flight, and carts a dead process left pending are reconciled before new work is taken.
+    """
+
+    def __init__(
+        self,
+        engine: SettlementEngine,
+        private_key: str,
+        max_batch_lines: int = SETTLEMENT_BATCH_MAX_LINES,
+        batch_window_ms: float = SETTLEMENT_BATCH_WINDOW_MS,
+        max_tx_per_sec: float = SETTLEMENT_MAX_TX_PER_SEC,
+        journal: Optional[settlement_journal.SettlementJournal] = None,
+    ):
+        self.engine = engine
+        self.journal = journal
+        self.account = engine.account(private_key)
+        self.max_batch_lines = max_batch_lines
+        self.batch_window = batch_window_ms / 1000.0
+        self.max_tx_per_sec = max_tx_per_sec
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._next_send_at = 0.0
+        self.in_flight = 0
+        self.settled_carts = 0
+        self.failed_carts = 0
+        self.batches = 0
+        self.replayed_carts = 0
+        self.recovered_carts = 0
+        self._by_key: dict[str, tuple[str, asyncio.Future]] = {}
+        self.queue_wait = LatencyTracker()
+        self.latency = LatencyTracker()
+
+    def _ensure_worker(self) -> asyncio.Queue:
+        # A restarted worker keeps the queue, so jobs waiting in it when the last one died still run.
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.ensure_future(self._run())
+        return self._queue
+
+    def start(self) -> None:
+        """Start the worker now (at app startup) so journaled carts are recovered before traffic."""
+        self._ensure_worker()
+
+    async def submit(self, cart: list[dict], key: Optional[str] = None) -> dict:
+        queue = self._ensure_worker()
+        job = _Job(cart, asyncio.get_running_loop().create_future())
+        if self.journal is not None:
+            job.key, job.digest = key or uuid.uuid4().hex, settlement_journal.cart_digest(cart)
+            leader = self._by_key.get(job.key)
+            if leader is not None:
+                if leader[0] != job.digest:
+                    settlement_journal.resolve(job.key, settlement_journal.CONFLICT, None)
+                return await asyncio.shield(leader[1])
+            status, result = self.journal.lookup(job.key, job.digest)
+            if status not in (settlement_journal.NEW, settlement_journal.RESUME):
+                result = settlement_journal.resolve(job.key, status, result)
+                self.replayed_carts += 1
+                return result
+            self._by_key[job.key] = (job.digest, job.future)
+        try:
+            await queue.put(job)
+            return await job.future
+        finally:
+            if job.key is not None:
+                self._by_key.pop(job.key, None)
+
+    async def stop(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        if self._queue is not None:
+            while not self._queue.empty():
+                job = self._queue.get_nowait()
+                if not job.future.done():
+                    job.future.cancel()
+            self._queue = None
+
+    async def _collect(self, first: _Job) -> list[_Job]:
+        """Take `first` plus whatever else arrives within the batch window, up to the line budget."""
+        jobs, lines = [first], len(first.cart)
+        deadline = time.perf_counter() + self.batch_window
+        while lines < self.max_batch_lines:
+            remaining = deadline - time.perf_counter()
+            try:
+                job = self._queue.get_nowait() if remaining <= 0 else await asyncio.wait_for(self._queue.get(), remaining)
+            except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                break
+            jobs.append(job)
+            lines += len(job.cart)
+        return jobs
+
+    async def _pace(self, lines: int) -> None:
+        if self.max_tx_per_sec <= 0:
+            return
+        now = time.monotonic()
+        wait = self._next_send_at - now
+        if wait > 0:
+            await asyncio.sleep(wait)
+        self._next_send_at = max(now, self._next_send_at) + lines / self.max_tx_per_sec
+
+    # ---- JOURNALED SETTLEMENT (runs in the executor) ----
+    def _settle_batch(self, jobs: list[_Job]) -> list[Any]:
+        """Settle a batch; one outcome per job: its cart result, or the exception to raise."""
+        if self.journal is None:
+            results = self.engine.settle_lines(self.account, [line for job in jobs for line in job.cart])
+            outcomes, offset = [], 0
+            for job in jobs:
+                outcomes.append(_cart_result(results[offset:offset + len(job.cart)]))
+                offset += len(job.cart)
+            return outcomes
+
+        journal = self.journal
+        claims = journal.claim([(job.key, job.digest, job.cart) for job in jobs])
+        outcomes: list[Any] = [None] * len(jobs)
+        fresh = []
+        for k, (job, (status, result)) in enumerate(zip(jobs, claims)):
+            if status == settlement_journal.NEW:
+                fresh.append(k)
+            elif status == settlement_journal.RESUME:
+                outcomes[k] = self._try_reconcile(job.key)
+            else:
+                try:
+                    outcomes[k] = settlement_journal.resolve(job.key, status, result)
+                except Exception as e:
+                    outcomes[k] = e
+        if not fresh:
+            return outcomes
+
+        refs = [(jobs[k].key, n) for k in fresh for n in range(len(jobs[k].cart))]
+        try:
+            results = self.engine.settle_lines(
+                self.account, [line for k in fresh for line in jobs[k].cart], journal.recorder(refs)
+            )
+        except Exception as e:
+            # Some transfers may be out. Settle the carts from the journal now, so the caller's
+            # answer is final and a retry (even without the key) cannot sign a second payment.
+            logger.exception("Settlement batch failed: %s; reconciling its carts", e)
+            for k in fresh:
+                outcomes[k] = self._try_reconcile(jobs[k].key)
+            return outcomes
+        offset = 0
+        for k in fresh:
+            outcomes[k] = {**_cart_result(results[offset:offset + len(jobs[k].cart)]), "idempotency_key": jobs[k].key}
+            offset += len(jobs[k].cart)
+        journal.finish([(jobs[k].key, outcomes[k]) for k in fresh])
+        return outcomes
+
+    def _try_reconcile(self, key: str) -> Any:
+        """`_reconcile`, or the SettlementUnresolved to raise (naming the key) if it fails too."""
+        try:
+            return self._reconcile(key)
+        except Exception as e:
+            logger.exception("Reconciling settlement %s failed: %s", key, e)
+            # Left pending for a retry with this key (or the next start) to finish.
+            self.journal.release([key])
+            return settlement_journal.SettlementUnresolved(key, e)
+
+    def _reconcile(self, key: str) -> dict:
+        """Finish a cart a previous settlement left pending, without paying any line twice.
+
+        Signed lines are settled by their receipt if one exists, otherwise their last signed
+        transfer is re-broadcast at its own nonce. Lines the node had rejected stay failed, and
+        only lines that were never signed are settled now.
+        """
+        journal = self.journal
+        lines = journal.lines(key)
+        outcome: dict[int, dict] = {}
+        signed = [line for line in lines if line.signed]
+        hashes = [tx["tx_hash"] for line in signed for tx in line.signed]
+        statuses = self.engine.poll_receipts(hashes, timeout=0) if hashes else {}
+        receipts, rebroadcast = [], []
+        for line in signed:
+            mined = [(tx["tx_hash"], statuses[tx["tx_hash"]]) for tx in line.signed if statuses.get(tx["tx_hash"]) is not None]
+            if mined:
+                tx_hash, status = mined[-1]
+                receipts.append((key, line.line, {"tx_hash": tx_hash, "status": status}))
+                outcome[line.line] = {"tx_hash": tx_hash, "error": None if status == 1 else "transaction reverted"}
+            elif line.submitted is not None and line.submitted["error"]:
+                outcome[line.line] = {"tx_hash": None, "error": line.submitted["error"]}
+            else:
+                rebroadcast.append(line)
+        journal.append("receipt", receipts)
+
+        if rebroadcast:
+            sent_hashes, errors = self.engine.broadcast([bytes.fromhex(line.signed[-1]["raw"]) for line in rebroadcast])
+            journal.recorder([(key, line.line) for line in rebroadcast]).submitted(
+                [None if e else h for h, e in zip(sent_hashes, errors)], errors
+            )
+            for line, tx_hash, error in zip(rebroadcast, sent_hashes, errors):
+                outcome[line.line] = {"tx_hash": None if error else tx_hash, "error": error}
+            if any(errors):
+                self.engine.nonces.resync(self.account.address)
+
+        unsigned = [line for line in lines if not line.signed]
+        if unsigned:
+            results = self.engine.settle_lines(
+                self.account, [line.item for line in unsigned], journal.recorder([(key, line.line) for line in unsigned])
+            )
+            outcome.update((line.line, r) for line, r in zip(unsigned, results))
+
+        result = {**_cart_result([outcome[line.line] for line in lines]), "idempotency_key": key}
+        journal.finish([(key, result)])
+        self.recovered_carts += 1
+        logger.warning("Recovered settlement %s: %s of %s line(s) settled", key, len(result["transaction_hashes"]), len(lines))
+        return result
+
+    async def recover(self) -> list[str]:
+        """Reconcile every cart a dead process left pending. Returns the keys finished."""
+        if self.journal is None:
+            return []
+        loop = asyncio.get_running_loop()
+        recovered = []
+        for key in await loop.run_in_executor(None, self.journal.orphans):
+            if not await loop.run_in_executor(None, self.journal.take_over, key):
+                continue  # another process got there first
+            try:
+                await loop.run_in_executor(None, self._reconcile, key)
+            except Exception as e:
+                logger.exception("Recovering settlement %s failed: %s", key, e)
+                await loop.run_in_executor(None, self.journal.release, [key])
+                continue
+            recovered.append(key)
+        return recovered
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        # Nonces of carts a crashed process signed must be settled before new ones are reserved.
+        try:
+            await self.recover()
+        except Exception as e:
+            # The carts stay pending in the journal; a restart or a retry of their key reconciles them.
+            logger.exception("Settlement recovery failed: %s", e)
+        while True:
+            jobs = await self._collect(await self._queue.get())
+            started = time.perf_counter()
+            for job in jobs:
+                self.queue_wait.record(started - job.enqueued_at)
+                tracing.REGISTRY.observe("settlement.queue_wait", started - job.enqueued_at)
+            self.in_flight = len(jobs)
+            try:
+                await self._pace(sum(len(job.cart) for job in jobs))
+                outcomes = await loop.run_in_executor(None, self._settle_batch, jobs)
+            except Exception as e:
+                logger.exception("Settlement batch failed: %s", e)
+                for job in jobs:
+                    if not job.future.done():
+                        job.future.set_exception(e)
+                self.failed_carts += len(jobs)
+                continue
+            finally:
+                self.in_flight = 0
+                self.batches += 1
+
+            for job, outcome in zip(jobs, outcomes):
+                self.latency.record(time.perf_counter() - job.enqueued_at)
+                if isinstance(outcome, Exception):
+                    if isinstance(outcome, settlement_journal.SettlementUnresolved):
+                        self.failed_carts += 1
+                    if not job.future.done():
+                        job.future.set_exception(outcome)
+                    continue
+                if outcome.get("replayed"):
+                    self.replayed_carts += 1
+                elif outcome["status"] == "failed":
+                    self.failed_carts += 1
+                else:
+                    self.settled_carts += 1
+                if not job.future.done():
+                    job.future.set_result(outcome)
+
+    def stats(self) -> dict:
+        def ms(tracker: LatencyTracker, q: float) -> Optional[float]:
+            value = tracker.percentile(q)
+            return None if value is None else round(value * 1000, 1)
+
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "in_flight_carts": self.in_flight,
+            "settled_carts": self.settled_carts,
+            "failed_carts": self.failed_carts,
+            "batches": self.batches,
+            "replayed_carts": self.replayed_carts,
+            "recovered_carts": self.recovered_carts,
+            **(self.journal.stats() if self.journal is not None else {}),
+            "next_nonce": self.engine.nonces.peek(self.account.address),
+            "queue_wait_ms_p50": ms(self.queue_wait, 0.5),
+            "queue_wait_ms_p95": ms(self.queue_wait, 0.95),
+            "latency_ms_p50": ms(self.latency, 0.5),
+            "latency_ms_p95": ms(self.latency, 0.95),
+        }
+
+
+_scheduler: Optional[SettlementScheduler] = None
+
+
+def get_scheduler() -> Optional[SettlementScheduler]:
+    """The treasury scheduler, or None in sandbox mode (no PAYMENT_PRIVATE_KEY)."""
+    global _scheduler
+    private_key = os.environ.get("PAYMENT_PRIVATE_KEY")
+    if not private_key:
+        return None
+    if _scheduler is None:
+        _scheduler = SettlementScheduler(get_engine(), private_key, journal=settlement_journal.get_journal())
+    return _scheduler
+
+
+async def execute_payment(cart: list[dict], idempotency_key: Optional[str] = None) -> dict:
+    """Policy-check a cart, then settle it through the shared scheduler (sandbox without a key).
+
+    Carts waiting on the chain are bounded by the chain admission gate, so a burst is shed with
+    Overloaded rather than piling up in the settlement queue. A retry with the same idempotency
+    key returns the first attempt's result; without one, the cart gets a fresh key."""
+    check_policy(cart)
+    scheduler = get_scheduler()
+    if scheduler is None:
+        return {"status": "success", "logs": ["Sandbox Mode"], "transaction_hashes": ["0x-mock"]}
+    async with admission.CHAIN.slot():
+        return await scheduler.submit(cart, idempotency_key)
+
+
+def start() -> None:
+    """Start the settlement worker at app startup, recovering journaled carts (no-op in sandbox)."""
+    scheduler = get_scheduler()
+    if scheduler is not None:
+        scheduler.start()
+
+
+async def shutdown() -> None:
+    if _scheduler is not None:
+        await _scheduler.stop()
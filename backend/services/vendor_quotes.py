@@ -0,0 +1,241 @@
+"""
+Live vendor quotes layered over the catalog.
+
+Each retailer is a QuoteSource that returns its current quote sheet ({sku: price, delivery_days}).
+Sheets are fetched concurrently per request and cached with stale-while-revalidate semantics:
+a fresh sheet is used as is, a stale one is used while a single background fetch refreshes it,
+and a missing one is waited for only up to the per-vendor deadline. A vendor that misses the
+deadline is left out of that request (its catalog prices stand) and its fetch completes in the
+background for the next one, so orchestration latency never depends on the slowest retailer.
+"""
+import asyncio
+import os
+import threading
+import time
+import weakref
+from abc import ABC, abstractmethod
+from typing import NamedTuple, Optional
+
+import httpx
+import numpy as np
+
+from services.catalog import Catalog, CategoryIndex
+from utils import tracing
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# ---- CONFIG ----
+# "vendor_id=base_url" pairs, comma-separated; each serves GET <base_url>/quotes. Empty disables live quotes.
+VENDOR_QUOTE_SOURCES = os.environ.get("FLUX_VENDOR_QUOTE_SOURCES", "")
+QUOTE_DEADLINE_MS = float(os.environ.get("FLUX_QUOTE_DEADLINE_MS", "250"))
+QUOTE_FRESH_SEC = float(os.environ.get("FLUX_QUOTE_FRESH_SEC", "30"))
+# Beyond this age a sheet is no longer served while it revalidates; the request waits (up to the deadline) instead.
+QUOTE_MAX_STALE_SEC = float(os.environ.get("FLUX_QUOTE_MAX_STALE_SEC", "600"))
+# Hard cap on a fetch that has outlived its request and is finishing in the background.
+QUOTE_FETCH_TIMEOUT_SEC = float(os.environ.get("FLUX_QUOTE_FETCH_TIMEOUT_SEC", "10"))
+
+
+class Quote(NamedTuple):
+    price: float
+    delivery_days: int
+
+
+class QuoteError(Exception):
+    pass
+
+
+# ---- SOURCES ----
+class QuoteSource(ABC):
+    """One retailer's live quote sheet. Subclasses implement `fetch`."""
+
+    def __init__(self, vendor_id: str):
+        self.vendor_id = vendor_id
+
+    @abstractmethod
+    async def fetch(self) -> dict[str, Quote]:
+        """The vendor's current sheet, {sku: Quote}; raises on failure."""
+
+
+_http_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+
+def _http_client() -> httpx.AsyncClient:
+    """Pooled client per event loop, separate from the LLM pool so slow feeds never starve it."""
+    loop = asyncio.get_running_loop()
+    client = _http_clients.get(loop)
+    if client is None or client.is_closed:
+        client = _http_clients[loop] = httpx.AsyncClient(timeout=httpx.Timeout(QUOTE_FETCH_TIMEOUT_SEC, connect=2.0))
+    return client
+
+
+async def aclose() -> None:
+    """Close the quote pool for the running loop (called on app shutdown)."""
+    client = _http_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+class HttpQuoteSource(QuoteSource):
+    """GET <base_url>/quotes -> {"quotes": [{"id", "price", "delivery_days"}, ...]}."""
+
+    def __init__(self, vendor_id: str, base_url: str):
+        super().__init__(vendor_id)
+        self.url = base_url.rstrip("/") + "/quotes"
+
+    async def fetch(self) -> dict[str, Quote]:
+        response = await _http_client().get(self.url)
+        response.raise_for_status()
+        try:
+            return {
+                str(q["id"]): Quote(float(q["price"]), int(q["delivery_days"]))
+                for q in response.json()["quotes"]
+            }
+        except (ValueError, KeyError, TypeError) as e:
+            raise QuoteError(f"{self.vendor_id}: malformed quote sheet: {e}") from e
+
+
+def build_sources(spec: str = VENDOR_QUOTE_SOURCES) -> list[QuoteSource]:
+    sources = []
+    for pair in filter(None, (p.strip() for p in spec.split(","))):
+        vendor_id, sep, url = pair.partition("=")
+        if not sep or not vendor_id.strip() or not url.strip():
+            raise ValueError(f"FLUX_VENDOR_QUOTE_SOURCES entry {pair!r} is not vendor_id=base_url")
+        sources.append(HttpQuoteSource(vendor_id.strip(), url.strip()))
+    return sources
+
+
+# ---- STALE-WHILE-REVALIDATE CACHE ----
+class Sheet(NamedTuple):
+    quotes: dict[str, Quote]
+    fetched_at: float
+    version: int
+
+
+class QuoteCache:
+    """Latest sheet per vendor, refreshed by at most one fetch per vendor at a time."""
+
+    def __init__(
+        self,
+        fresh_sec: float = QUOTE_FRESH_SEC,
+        max_stale_sec: float = QUOTE_MAX_STALE_SEC,
+        fetch_timeout_sec: float = QUOTE_FETCH_TIMEOUT_SEC,
+    ):
+        self.fresh_sec = fresh_sec
+        self.max_stale_sec = max_stale_sec
+        self.fetch_timeout_sec = fetch_timeout_sec
+        self.failures = 0
+        self._sheets: dict[str, Sheet] = {}
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._versions = 0
+
+    def _revalidate(self, source: QuoteSource) -> asyncio.Task:
+        task = self._inflight.get(source.vendor_id)
+        if task is not None and not task.done() and task.get_loop() is asyncio.get_running_loop():
+            return task
+        task = self._inflight[source.vendor_id] = asyncio.ensure_future(self._fetch(source))
+        task.add_done_callback(_consume_exception)
+        return task
+
+    async def _fetch(self, source: QuoteSource) -> Sheet:
+        try:
+            with tracing.span(f"quotes.fetch.{source.vendor_id}"):
+                quotes = await asyncio.wait_for(source.fetch(), self.fetch_timeout_sec)
+        except Exception as e:
+            self.failures += 1
+            logger.warning("Quote fetch for %s failed: %s", source.vendor_id, e)
+            raise
+        self._versions += 1
+        sheet = self._sheets[source.vendor_id] = Sheet(quotes, time.monotonic(), self._versions)
+        return sheet
+
+    async def get(self, source: QuoteSource, deadline_sec: float) -> tuple[Optional[Sheet], str]:
+        """(sheet or None, status) where status is fresh, stale, fetched, timeout or error."""
+        sheet = self._sheets.get(source.vendor_id)
+        age = time.monotonic() - sheet.fetched_at if sheet is not None else None
+        if age is not None and age < self.fresh_sec:
+            return sheet, "fresh"
+        task = self._revalidate(source)
+        if age is not None and age < self.max_stale_sec:
+            return sheet, "stale"
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), deadline_sec), "fetched"
+        except asyncio.TimeoutError:
+            # The fetch keeps going in the background and fills the cache for later requests.
+            return None, "timeout"
+        except Exception:
+            return None, "error"
+
+
+def _consume_exception(task: asyncio.Task) -> None:
+    # Failures are logged in _fetch; a background refresh nobody awaited must not warn again.
+    if not task.cancelled():
+        task.exception()
+
+
+# ---- OVERLAY ----
+class QuoteOverlay:
+    """Live prices and delivery days for one catalog snapshot and one set of sheet versions.
+
+    Columns are built per category on first use, aligned with `CategoryIndex.by_price`; a
+    category no quoted SKU belongs to has none, and the catalog columns apply unchanged.
+    """
+
+    def __init__(self, catalog: Catalog, sheets: dict[str, Sheet]):
+        # Only the vendor table is kept: the overlay is cached against the catalog weakly.
+        self.vendors = catalog.vendors
+        self.sheets = sheets
+        self.versions = {vendor: sheet.version for vendor, sheet in sheets.items()}
+        self._columns: dict[str, Optional[tuple[np.ndarray, np.ndarray]]] = {}
+        self._lock = threading.Lock()
+
+    def columns(self, category: str, index: CategoryIndex) -> Optional[tuple[np.ndarray, np.ndarray]]:
+        with self._lock:
+            if category not in self._columns:
+                self._columns[category] = self._build(index)
+            return self._columns[category]
+
+    def _build(self, index: CategoryIndex) -> Optional[tuple[np.ndarray, np.ndarray]]:
+        prices = days = None
+        for code, vendor in enumerate(self.vendors):
+            sheet = self.sheets.get(vendor)
+            if sheet is None:
+                continue
+            for position in np.flatnonzero(index.vendor_column == code).tolist():
+                quote = sheet.quotes.get(index.by_price[position].id)
+                if quote is None:
+                    continue
+                if prices is None:
+                    prices, days = index.price_column.copy(), index.delivery_column.copy()
+                prices[position], days[position] = quote.price, quote.delivery_days
+        if prices is None:
+            return None
+        prices.flags.writeable = days.flags.writeable = False
+        return prices, days
+
+
+class QuoteAggregator:
+    def __init__(self, sources: list[QuoteSource], cache: Optional[QuoteCache] = None, deadline_ms: float = QUOTE_DEADLINE_MS):
+        self.sources = sources
+        self.cache = cache or QuoteCache()
+        self.deadline_sec = deadline_ms / 1000.0
+        self._overlays: "weakref.WeakKeyDictionary[Catalog, QuoteOverlay]" = weakref.WeakKeyDictionary()
+
+    async def overlay(self, catalog: Catalog) -> tuple[Optional[QuoteOverlay], dict[str, str]]:
+        """Overlay of every sheet available within the deadline, and each vendor's status."""
+        if not self.sources:
+            return None, {}
+        with tracing.span("quotes.aggregate"):
+            results = await asyncio.gather(*(self.cache.get(s, self.deadline_sec) for s in self.sources))
+        sheets = {s.vendor_id: sheet for s, (sheet, _) in zip(self.sources, results) if sheet is not None}
+        status = {s.vendor_id: state for s, (_, state) in zip(self.sources, results)}
+        if not sheets:
+            return None, status
+        # Requests that see the same sheet versions share one overlay (and its built columns).
+        overlay = self._overlays.get(catalog)
+        if overlay is None or overlay.versions != {v: s.version for v, s in sheets.items()}:
+            overlay = self._overlays[catalog] = QuoteOverlay(catalog, sheets)
+        return overlay, status
+
+
+AGGREGATOR = QuoteAggregator(build_sources())
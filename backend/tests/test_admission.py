@@ -0,0 +1,136 @@
+"""
+Tests for admission control: per-tenant token buckets, downstream concurrency gates with
+queue-wait shedding, and 429 + Retry-After at the API.
+"""
+import asyncio
+import time
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from services import admission
+
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def mock_parse_intent():
+    with patch("routers.procurement.ai_engine.parse_intent_ai") as m:
+        m.return_value = (["snacks"], {"model": "mock"})
+        yield m
+
+
+@pytest.fixture
+def strict_limiter(monkeypatch):
+    limiter = admission.TenantRateLimiter(rate=0.01, burst=2)
+    monkeypatch.setattr(admission, "RATE_LIMITER", limiter)
+    return limiter
+
+
+def _body(prompt="snacks"):
+    return {"prompt": prompt, "budget": 100.0, "deadline_days": 5, "strategy": "cheapest"}
+
+
+def test_token_bucket_allows_burst_then_refills():
+    limiter = admission.TenantRateLimiter(rate=1000.0, burst=2)
+    limiter.acquire("a")
+    limiter.acquire("a")
+    with pytest.raises(admission.RateLimited) as exc:
+        limiter.acquire("a", cost=2)
+    assert exc.value.retry_after >= 1
+    limiter.acquire("b")  # other tenants have their own bucket
+    time.sleep(0.01)
+    limiter.acquire("a")
+    assert limiter.rejected == 1
+
+
+def test_rate_limit_is_per_api_key_with_retry_after(client, strict_limiter):
+    headers = {admission.TENANT_HEADER: "tenant-a"}
+    assert client.post("/api/orchestrate", json=_body(), headers=headers).status_code == 200
+    assert client.post("/api/orchestrate", json=_body(), headers=headers).status_code == 200
+    limited = client.post("/api/orchestrate", json=_body(), headers=headers)
+    assert limited.status_code == 429 and int(limited.headers["Retry-After"]) >= 1
+    assert client.post("/api/orchestrate", json=_body(), headers={admission.TENANT_HEADER: "tenant-b"}).status_code == 200
+
+
+def test_batch_is_charged_per_intent(client, strict_limiter, mock_parse_intent):
+    assert client.post("/api/orchestrate", json=_body()).status_code == 200
+    mock_parse_intent.reset_mock()
+    response = client.post("/api/orchestrate/batch", json=[_body("a"), _body("b")])
+    assert response.status_code == 429
+    mock_parse_intent.assert_not_called()
+
+
+def test_batch_larger_than_the_burst_is_rejected_without_a_retry_hint(client, monkeypatch, mock_parse_intent):
+    monkeypatch.setattr(admission, "RATE_LIMITER", admission.TenantRateLimiter(rate=5.0, burst=10))
+    response = client.post("/api/orchestrate/batch", json=[_body(str(k)) for k in range(11)])
+    assert response.status_code == 413 and "Retry-After" not in response.headers
+    mock_parse_intent.assert_not_called()
+    assert client.post("/api/orchestrate/batch", json=[_body(str(k)) for k in range(10)]).status_code == 200
+
+
+def test_downstream_shedding_surfaces_as_429(client, mock_parse_intent):
+    mock_parse_intent.side_effect = admission.Overloaded("llm is saturated", retry_after=2.5)
+    response = client.post("/api/orchestrate", json=_body())
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "3"
+
+
+def test_gate_sheds_callers_that_wait_past_the_budget():
+    gate = admission.ConcurrencyGate("unit", limit=1, queue_budget_ms=50)
+
+    async def scenario():
+        order = []
+        release = asyncio.Event()
+
+        async def holder():
+            async with gate.slot():
+                order.append("holder")
+                await release.wait()
+
+        async def waiter():
+            async with gate.slot():
+                order.append("waiter")
+
+        first = asyncio.ensure_future(holder())
+        await asyncio.sleep(0)
+        with pytest.raises(admission.Overloaded):
+            await waiter()
+        assert gate.stats()["shed"] == 1 and gate.queued == 0
+
+        second = asyncio.ensure_future(waiter())
+        await asyncio.sleep(0)
+        assert gate.stats()["queue_depth"] == 1 and gate.stats()["in_flight"] == 1
+        release.set()
+        await asyncio.gather(first, second)
+        return order
+
+    assert asyncio.run(scenario()) == ["holder", "waiter"]
+    assert gate.active == 0
+
+
+def test_gate_sheds_up_front_when_projected_wait_is_over_budget():
+    gate = admission.ConcurrencyGate("unit", limit=1, queue_budget_ms=100)
+    gate._hold_sec = 1.0
+
+    async def scenario():
+        async with gate.slot():
+            with pytest.raises(admission.Overloaded) as exc:
+                async with gate.slot():
+                    pass
+        return exc.value
+
+    rejected = asyncio.run(scenario())
+    assert rejected.retry_after >= 1 and gate.queued == 0
+
+
+def test_queue_depth_is_exported(client):
+    assert 'flux_admission_queue_depth{downstream="llm"}' in client.get("/metrics").text
+    stats = client.get("/api/admission/stats").json()
+    assert set(stats["gates"]) == {"llm", "vision", "chain"}
+    assert stats["gates"]["llm"]["queue_depth"] == 0
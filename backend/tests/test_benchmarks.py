@@ -0,0 +1,50 @@
+"""
+Tests for the benchmark harness: regression gating and a smoke run of the micro-benchmarks.
+"""
+from benchmarks import bench_micro, bench_serialize, bench_startup
+from benchmarks.harness import find_regressions
+
+
+def _results(p50, p95, rps):
+    return {"cases": {
+        "micro": {"n=10": {"cart_assembly": {"p50_ms": p50, "p95_ms": p95}}},
+        "load": {"orchestrate": {"p50_ms": p50, "p95_ms": p95, "throughput_rps": rps}},
+    }}
+
+
+def test_regressions_are_flagged_beyond_threshold_only():
+    baseline = _results(1.0, 2.0, 100.0)
+    assert find_regressions(_results(1.1, 2.3, 90.0), baseline, threshold=0.2) == []
+    flagged = {r["metric"] for r in find_regressions(_results(1.5, 3.0, 70.0), baseline, threshold=0.2)}
+    assert flagged == {
+        "micro.n=10.cart_assembly.p50_ms",
+        "load.orchestrate.p95_ms",
+        "load.orchestrate.throughput_rps",
+    }
+
+
+def test_sub_noise_floor_latencies_never_regress():
+    assert find_regressions(_results(0.02, 0.02, 1.0), _results(0.001, 0.001, 1.0), threshold=0.2) == []
+
+
+def test_micro_benchmarks_cover_every_case():
+    results = bench_micro.run(sizes=[10], runs=2)
+    assert set(results["n=10"]) == {"calculate_score_scalar", "calculate_score_batch", "candidate_filter", "cart_assembly"}
+    assert all(case["p50_ms"] >= 0 for case in results["n=10"].values())
+
+
+def test_startup_gates_on_median_import_time():
+    baseline = {"cases": {"startup": {"import_main": {"p50_ms": 800.0, "p95_ms": 900.0}}}}
+    current = {"cases": {"startup": {"import_main": {"p50_ms": 1200.0, "p95_ms": 1000.0}}}}
+    assert [r["metric"] for r in find_regressions(current, baseline, threshold=0.2)] == ["startup.import_main.p50_ms"]
+
+
+def test_importing_main_loads_no_heavy_sdk():
+    sample = bench_startup.measure_import()
+    assert sample["loaded"] == [] and sample["ms"] > 0
+
+
+def test_serialization_benchmark_compares_identical_documents():
+    results = bench_serialize.run(items=[10], runs=2)
+    assert set(results["n=10"]) == {"pydantic", "fast", "speedup"}
+    assert results["n=10"]["fast"]["per_item_us"] > 0
@@ -0,0 +1,86 @@
+"""
+Tests for the multiple-choice knapsack cart optimizer against brute force and the old greedy loop.
+"""
+import itertools
+
+import numpy as np
+import pytest
+
+from services import cart_optimizer
+from services.cart_optimizer import FILL_BONUS, Slot, optimize_cart
+
+
+def _brute_force(slots, budget):
+    budget_cents = int(round(budget * 100))
+    best = (-1.0, None)
+    options = [[-1] + list(range(len(s.prices))) for s in slots]
+    for picks in itertools.product(*options):
+        cost = sum(int(round(slots[k].prices[p] * 100)) for k, p in enumerate(picks) if p >= 0)
+        if cost > budget_cents:
+            continue
+        util = sum(FILL_BONUS - slots[k].scores[p] for k, p in enumerate(picks) if p >= 0)
+        if util > best[0] + 1e-9:
+            best = (util, picks)
+    return best[0]
+
+
+def _utility(slots, plan):
+    return sum(FILL_BONUS - slots[c.slot].scores[c.pick] for c in plan.choices)
+
+
+def _random_slots(rng, n_slots, n_items):
+    slots = []
+    for k in range(n_slots):
+        prices = np.round(rng.uniform(1, 80, n_items), 2)
+        delivery = rng.integers(0, 7, n_items)
+        scores = np.round(prices / 200 * 0.5 + delivery / 7 * 0.5, 3)
+        slots.append(Slot(f"c{k}", prices, scores))
+    return slots
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_dp_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    slots = _random_slots(rng, 3, 5)
+    budget = float(rng.uniform(10, 150))
+    plan = optimize_cart(slots, budget)
+    assert plan.method == "dp" and plan.optimal
+    assert plan.total_cents <= round(budget * 100)
+    assert _utility(slots, plan) == pytest.approx(_brute_force(slots, budget))
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_branch_and_bound_matches_dp(seed, monkeypatch):
+    rng = np.random.default_rng(100 + seed)
+    slots = _random_slots(rng, 4, 6)
+    budget = float(rng.uniform(20, 200))
+    dp_plan = optimize_cart(slots, budget)
+    monkeypatch.setattr(cart_optimizer, "DP_MAX_CELLS", 0)
+    bnb_plan = optimize_cart(slots, budget)
+    assert bnb_plan.method == "branch_and_bound" and bnb_plan.optimal
+    assert _utility(slots, bnb_plan) == pytest.approx(_utility(slots, dp_plan))
+
+
+def test_beats_greedy_when_first_category_would_exhaust_budget():
+    # Greedy takes the cheapest-score snack (which happens to be pricey) and cannot afford a badge.
+    slots = [
+        Slot("snacks", np.array([90.0, 40.0]), np.array([0.1, 0.2])),
+        Slot("badges", np.array([50.0]), np.array([0.3])),
+    ]
+    plan = optimize_cart(slots, 100.0)
+    assert [(c.slot, c.pick) for c in plan.choices] == [(0, 1), (1, 0)]
+    assert plan.total_cents == 9000
+
+
+def test_runner_ups_fit_budget_and_are_ranked():
+    slots = [Slot("snacks", np.array([10.0, 12.0, 11.0, 300.0]), np.array([0.1, 0.3, 0.2, 0.0]))]
+    plan = optimize_cart(slots, 50.0)
+    (choice,) = plan.choices
+    assert choice.pick == 0
+    assert choice.alternatives == (2, 1)
+
+
+def test_empty_budget_returns_empty_cart():
+    slots = [Slot("snacks", np.array([5.0]), np.array([0.1]))]
+    plan = optimize_cart(slots, 0.0)
+    assert plan.choices == [] and plan.total_cents == 0
@@ -0,0 +1,101 @@
+"""
+Tests for cart sessions: /api/cart/{id}/rerank and /api/cart/{id}/swap.
+"""
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from services import cart_sessions
+from services.catalog import DEFAULT_INVENTORY, Catalog
+
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def mock_parse_intent():
+    with patch("routers.procurement.ai_engine.parse_intent_ai") as m:
+        m.return_value = (["snacks", "badges"], {"model": "mock"})
+        yield m
+
+
+def _orchestrate(client, **overrides):
+    body = {"prompt": "snacks and badges", "budget": 100.0, "deadline_days": 5, "strategy": "cheapest", **overrides}
+    response = client.post("/api/orchestrate", json=body)
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_rerank_matches_a_fresh_orchestration_without_parsing_again(client, mock_parse_intent):
+    cart = _orchestrate(client, seed=7)
+    assert mock_parse_intent.call_count == 1
+
+    response = client.post(f"/api/cart/{cart['cart_id']}/rerank", json={"strategy": "fastest", "deadline_days": 2})
+    assert response.status_code == 200
+    reranked = response.json()
+    assert mock_parse_intent.call_count == 1
+    assert reranked["cart_id"] == cart["cart_id"]
+    assert reranked["telemetry"]["rerank"] == {"changed": ["deadline_days", "strategy"]}
+
+    fresh = _orchestrate(client, seed=7, strategy="fastest", deadline_days=2)
+    assert reranked["options"] == fresh["options"]
+    assert reranked["alternatives"] == fresh["alternatives"]
+
+
+def test_rerank_keeps_the_negotiation_seed(client):
+    cart = _orchestrate(client)
+    reranked = client.post(f"/api/cart/{cart['cart_id']}/rerank", json={"budget": 60.0}).json()
+    assert reranked["telemetry"]["negotiation"]["seed"] == cart["telemetry"]["negotiation"]["seed"]
+    assert sum(o["price"] for o in reranked["options"]) <= 60.0
+
+
+def test_swap_uses_the_runner_up_and_can_be_undone(client):
+    cart = _orchestrate(client, budget=200.0)
+    cart_id, original = cart["cart_id"], cart["options"][0]
+    runner_up = cart["alternatives"]["snacks"][0]
+
+    swapped = client.post(f"/api/cart/{cart_id}/swap", json={"category": "snacks"}).json()
+    assert swapped["options"][0] == runner_up
+    assert swapped["alternatives"]["snacks"][0] == original
+    assert swapped["options"][1:] == cart["options"][1:]
+
+    restored = client.post(f"/api/cart/{cart_id}/swap", json={"category": "snacks", "option_id": original["id"]}).json()
+    assert restored["options"] == cart["options"]
+
+
+def test_swap_rejections(client):
+    cart = _orchestrate(client, budget=25.0)
+    cart_id = cart["cart_id"]
+    assert client.post(f"/api/cart/{cart_id}/swap", json={"category": "prizes"}).status_code == 409
+    assert client.post(f"/api/cart/{cart_id}/swap", json={"category": "snacks", "option_id": "t3"}).status_code == 409
+
+    session = cart_sessions.SESSIONS.get(cart_id)
+    session.cart["alternatives"]["snacks"].insert(0, {"id": "pricey", "price": 999.0})
+    response = client.post(f"/api/cart/{cart_id}/swap", json={"category": "snacks"})
+    assert response.status_code == 409 and "budget" in response.json()["detail"]
+
+
+def test_unknown_or_expired_cart_is_404(client):
+    assert client.post("/api/cart/nope/rerank", json={}).status_code == 404
+    store = cart_sessions.CartSessionStore(max_entries=1, ttl_sec=60)
+    first = store.create(None, ["snacks"], {}, None)
+    store.create(None, ["badges"], {}, None)
+    with pytest.raises(cart_sessions.CartNotFound):
+        store.get(first.cart_id)
+
+
+def test_sessions_on_retired_catalog_snapshots_are_dropped():
+    store = cart_sessions.CartSessionStore(max_entries=10, ttl_sec=60, max_generations=2)
+    first, second, third = (Catalog.from_records(DEFAULT_INVENTORY) for _ in range(3))
+    old = store.create(None, ["snacks"], {}, first)
+    kept = store.create(None, ["snacks"], {}, second)
+    assert store.get(old.cart_id) is old
+    newest = store.create(None, ["snacks"], {}, third)
+    with pytest.raises(cart_sessions.CartNotFound):
+        store.get(old.cart_id)
+    assert store.get(kept.cart_id) is kept and store.get(newest.cart_id) is newest
+    assert len(store) == 2
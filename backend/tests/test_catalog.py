@@ -0,0 +1,49 @@
+"""
+Tests for the indexed catalog: range queries, immutability and atomic reload.
+"""
+import pytest
+
+from services import catalog as catalog_module
+from services.catalog import DEFAULT_INVENTORY, Catalog
+
+
+@pytest.fixture
+def catalog():
+    return Catalog.from_records(DEFAULT_INVENTORY)
+
+
+def _linear_scan(category, max_price, max_days=None):
+    return sorted(
+        i["id"] for i in DEFAULT_INVENTORY
+        if i["category"] == category and i["price"] <= max_price and (max_days is None or i["delivery_days"] <= max_days)
+    )
+
+
+@pytest.mark.parametrize("category", ["snacks", "badges", "adapters", "prizes", "unknown"])
+@pytest.mark.parametrize("max_price", [0.0, 5.0, 30.0, 45.0, 1000.0])
+@pytest.mark.parametrize("max_days", [None, 0, 2, 7])
+def test_candidates_match_linear_scan(catalog, category, max_price, max_days):
+    got = sorted(i.id for i in catalog.candidates(category, max_price, max_days))
+    assert got == _linear_scan(category, max_price, max_days)
+
+
+def test_within_budget_is_price_ordered(catalog):
+    prices = [i.price for i in catalog.category("snacks").within_budget(100.0)]
+    assert prices == sorted(prices)
+
+
+def test_items_are_immutable(catalog):
+    item = catalog.by_id["a1"]
+    with pytest.raises(AttributeError):
+        item.price = 1.0
+    assert not hasattr(item, "__dict__")
+
+
+def test_reload_swaps_snapshot_without_touching_held_reference(monkeypatch):
+    monkeypatch.setattr(catalog_module, "_active", catalog_module._active)
+    held = catalog_module.get_catalog()
+    fresh = catalog_module.reload_catalog(DEFAULT_INVENTORY[:2])
+    assert catalog_module.get_catalog() is fresh
+    assert fresh.version > held.version
+    assert len(held) == len(DEFAULT_INVENTORY)
+    assert len(fresh) == 2
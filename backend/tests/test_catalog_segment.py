@@ -0,0 +1,155 @@
+"""
+Tests for multi-worker shared state: mmap'd catalog segments, the feed builder and the WAL-mode
+SQLite cache.
+"""
+import csv
+import json
+import os
+import subprocess
+import sys
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from services import catalog as catalog_module
+from services.catalog import DEFAULT_INVENTORY, Catalog
+from services.catalog_feed import FeedError, build_segment
+from services.catalog_feed import main as build_main
+from services.catalog_segment import SharedCatalog, open_segment, segment_columns, write_segment
+from services.negotiation import sku_key
+from services.intent_cache import SQLiteCacheBackend
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def segment_catalog(tmp_path):
+    path = str(tmp_path / "catalog.seg")
+    write_segment(path, *segment_columns(Catalog.from_records(DEFAULT_INVENTORY)))
+    return open_segment(path)
+
+
+@pytest.mark.parametrize("category", ["snacks", "badges", "adapters", "prizes", "unknown"])
+@pytest.mark.parametrize("max_price", [0.0, 30.0, 1000.0])
+@pytest.mark.parametrize("max_days", [None, 0, 2])
+def test_segment_answers_like_the_in_memory_catalog(segment_catalog, category, max_price, max_days):
+    in_memory = Catalog.from_records(DEFAULT_INVENTORY)
+    assert segment_catalog.candidates(category, max_price, max_days) == in_memory.candidates(category, max_price, max_days)
+    index, expected = segment_catalog.category(category), in_memory.category(category)
+    assert index.candidate_positions(max_price, max_days).tolist() == expected.candidate_positions(max_price, max_days).tolist()
+
+
+def test_segment_columns_are_read_only_views(segment_catalog):
+    column = segment_catalog.category("snacks").price_column
+    assert not column.flags.owndata and not column.flags.writeable
+    assert segment_catalog.by_id["w2"].name == "Peel-and-Stick Name Tags (50ct)"
+    assert sorted(i.id for i in segment_catalog.items) == sorted(r["id"] for r in DEFAULT_INVENTORY)
+
+
+def test_orchestrate_runs_on_a_segment_snapshot(segment_catalog, monkeypatch):
+    from main import app
+
+    monkeypatch.setattr(catalog_module, "_active", segment_catalog)
+    with patch("routers.procurement.ai_engine.parse_intent_ai") as parse:
+        parse.return_value = (["snacks", "badges"], {})
+        body = {"prompt": "snacks and badges", "budget": 100.0, "deadline_days": 5, "strategy": "cheapest", "seed": 1}
+        response = TestClient(app).post("/api/orchestrate", json=body)
+    assert response.status_code == 200
+    assert {o["id"] for o in response.json()["options"]} == {"w1", "w2"}
+
+
+def test_workers_attach_to_one_published_segment(tmp_path):
+    first, second = SharedCatalog(str(tmp_path)), SharedCatalog(str(tmp_path))
+    published = first.attach_or_publish(DEFAULT_INVENTORY)
+    attached = second.attach_or_publish([])
+    assert first.current == second.current
+    assert len(attached) == len(published) == len(DEFAULT_INVENTORY)
+
+    first.publish(Catalog.from_records(DEFAULT_INVENTORY[:3]))
+    refreshed = second.poll(force=True)
+    assert refreshed is not None and len(refreshed) == 3
+    assert second.poll(force=True) is None
+    # A snapshot a request already holds stays valid after the switch.
+    assert len(attached) == len(DEFAULT_INVENTORY) and attached.by_id["t4"].price == 22.0
+
+
+def test_a_separate_worker_process_sees_the_published_catalog(tmp_path):
+    SharedCatalog(str(tmp_path / "catalog")).publish(Catalog.from_records(DEFAULT_INVENTORY[:2]))
+    script = "import json; from services.catalog import get_catalog; print(json.dumps(sorted(i.id for i in get_catalog().items)))"
+    out = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=BACKEND_DIR,
+        env={**os.environ, "FLUX_SHARED_STATE_DIR": str(tmp_path)},
+        capture_output=True, text=True, timeout=60, check=True,
+    )
+    assert json.loads(out.stdout.strip().splitlines()[-1]) == sorted(r["id"] for r in DEFAULT_INVENTORY[:2])
+
+
+def test_feed_builder_merges_csv_and_json_lines(tmp_path):
+    csv_path, jsonl_path = tmp_path / "amazon.csv", tmp_path / "rest.jsonl"
+    with open(csv_path, "w", newline="") as fh:
+        writer = csv.DictWriter(fh, fieldnames=list(DEFAULT_INVENTORY[0]))
+        writer.writeheader()
+        writer.writerows(r for r in DEFAULT_INVENTORY if r["vendor_id"] == "amazon")
+    jsonl_path.write_text("\n".join(json.dumps(r) for r in DEFAULT_INVENTORY if r["vendor_id"] != "amazon"))
+
+    out = str(tmp_path / "catalog.seg")
+    assert build_segment([str(csv_path), str(jsonl_path)], out) == {"items": 11, "vendors": 3, "categories": 4}
+    built, in_memory = open_segment(out), Catalog.from_records(DEFAULT_INVENTORY)
+    for category in in_memory.categories:
+        assert built.candidates(category, 1000.0) == in_memory.candidates(category, 1000.0)
+        index = built.category(category)
+        assert index.sku_keys.tolist() == [sku_key(i.vendor_id, i.id) for i in index.by_price]
+
+
+def test_orchestrate_skips_vendors_outside_the_authorized_set(tmp_path, monkeypatch):
+    from main import app
+
+    feed, out = tmp_path / "feed.json", str(tmp_path / "catalog.seg")
+    bestbuy = {"id": "bb1", "name": "Bulk Pretzels", "price": 0.5, "delivery_days": 1, "category": "snacks", "vendor_id": "bestbuy"}
+    feed.write_text(json.dumps(DEFAULT_INVENTORY + [bestbuy]))
+    assert build_main([str(feed), "--out", out]) == 0
+    monkeypatch.setattr(catalog_module, "_active", open_segment(out))
+    with patch("routers.procurement.ai_engine.parse_intent_ai") as parse:
+        parse.return_value = (["snacks"], {})
+        body = {"prompt": "snacks", "budget": 100.0, "deadline_days": 5, "strategy": "cheapest", "seed": 1}
+        response = TestClient(app).post("/api/orchestrate", json=body)
+    assert response.status_code == 200
+    cart = response.json()
+    offered = [cart["options"][0]] + cart["alternatives"]["snacks"]
+    assert offered and all(o["vendor_id"] != "bestbuy" for o in offered)
+
+
+def test_feed_builder_rejects_bad_records(tmp_path, capsys):
+    feed = tmp_path / "feed.json"
+    feed.write_text(json.dumps({"items": [{**DEFAULT_INVENTORY[0], "price": "n/a"}]}))
+    with pytest.raises(FeedError, match="record 1"):
+        build_segment([str(feed)], str(tmp_path / "catalog.seg"))
+    assert build_main([str(feed), "--out", str(tmp_path / "catalog.seg")]) == 1
+    assert "record 1" in capsys.readouterr().err
+    assert not (tmp_path / "catalog.seg").exists()
+
+
+def test_server_loads_a_prebuilt_segment_file(tmp_path):
+    feed, out = tmp_path / "feed.json", str(tmp_path / "catalog.seg")
+    feed.write_text(json.dumps(DEFAULT_INVENTORY[:4]))
+    assert build_main([str(feed), "--out", out]) == 0
+    script = "import json; from services.catalog import get_catalog; print(json.dumps(sorted(i.id for i in get_catalog().items)))"
+    env = {k: v for k, v in os.environ.items() if k != "FLUX_SHARED_STATE_DIR"}
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=BACKEND_DIR,
+        env={**env, "FLUX_CATALOG_PATH": out},
+        capture_output=True, text=True, timeout=60, check=True,
+    )
+    assert json.loads(result.stdout.strip().splitlines()[-1]) == sorted(r["id"] for r in DEFAULT_INVENTORY[:4])
+
+
+def test_sqlite_cache_is_shared_between_connections_in_wal_mode(tmp_path):
+    path = str(tmp_path / "shared.sqlite3")
+    worker_a = SQLiteCacheBackend(path, max_entries=10, ttl_sec=60)
+    worker_b = SQLiteCacheBackend(path, max_entries=10, ttl_sec=60)
+    worker_a.set("snacks", {"value": ["snacks"], "latency_ms": 100})
+    assert worker_b.get("snacks") == {"value": ["snacks"], "latency_ms": 100}
+    assert worker_b._conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
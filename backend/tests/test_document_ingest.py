@@ -0,0 +1,99 @@
+"""
+Tests for streaming multipart ingestion and the content-hash extraction cache behind /api/upload_intent.
+"""
+import asyncio
+import hashlib
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from services import ai_engine
+from services.document_ingest import InvalidUpload, UploadTooLarge, ingest_multipart
+
+BOUNDARY = "fluxboundary"
+CONTENT_TYPE = f"multipart/form-data; boundary={BOUNDARY}"
+
+
+def _multipart(payload: bytes, field: str = "file") -> bytes:
+    return (
+        f"--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="note"\r\n\r\nignored\r\n'
+        f"--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="{field}"; filename="list.png"\r\n'
+        f"Content-Type: image/png\r\n\r\n"
+    ).encode() + payload + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+def _chunks(body: bytes, size: int = 1000, consumed: list = None):
+    async def gen():
+        for i in range(0, len(body), size):
+            if consumed is not None:
+                consumed.append(size)
+            yield body[i:i + size]
+    return gen()
+
+
+def test_ingest_spools_and_hashes_only_the_file_part():
+    payload = bytes(range(256)) * 40
+    upload = asyncio.run(ingest_multipart(CONTENT_TYPE, None, _chunks(_multipart(payload), size=333)))
+    try:
+        assert upload.size == len(payload)
+        assert upload.sha256 == hashlib.sha256(payload).hexdigest()
+        assert upload.content_type == "image/png"
+        assert upload.filename == "list.png"
+        assert upload.read() == payload
+    finally:
+        upload.close()
+
+
+def test_declared_oversize_upload_is_rejected_before_reading():
+    consumed = []
+    with pytest.raises(UploadTooLarge):
+        asyncio.run(ingest_multipart(CONTENT_TYPE, str(10 ** 9), _chunks(b"x" * 5000, consumed=consumed), max_bytes=1000))
+    assert consumed == []
+
+
+def test_oversize_stream_is_aborted_mid_upload():
+    consumed = []
+    body = _multipart(b"x" * 100_000)
+    with pytest.raises(UploadTooLarge):
+        asyncio.run(ingest_multipart(CONTENT_TYPE, None, _chunks(body, consumed=consumed), max_bytes=10_000))
+    assert sum(consumed) < 20_000
+
+
+def test_missing_file_field_is_invalid():
+    with pytest.raises(InvalidUpload):
+        asyncio.run(ingest_multipart(CONTENT_TYPE, None, _chunks(_multipart(b"abc", field="other"))))
+
+
+@pytest.fixture
+def vision_model():
+    ai_engine._extraction_cache.backend.clear()
+    model = SimpleNamespace(generate_content_async=AsyncMock(return_value=SimpleNamespace(text="snacks and badges")))
+    with patch.object(ai_engine, "gemini_model", return_value=model), \
+         patch("routers.procurement.ai_engine.parse_intent_ai") as parse:
+        parse.return_value = (["snacks", "badges"], {"model": "mock"})
+        yield model
+
+
+def test_repeat_upload_skips_the_vision_call(vision_model):
+    client = TestClient(app)
+    body = _multipart(b"\x89PNG" + b"\x00" * 2048)
+    first = client.post("/api/upload_intent?budget=100", content=body, headers={"Content-Type": CONTENT_TYPE})
+    second = client.post("/api/upload_intent?budget=100", content=body, headers={"Content-Type": CONTENT_TYPE})
+    assert first.status_code == second.status_code == 200
+    assert vision_model.generate_content_async.await_count == 1
+    assert first.json()["telemetry"]["document"]["cache"] == "miss"
+    assert second.json()["telemetry"]["document"]["cache"] == "hit"
+
+
+def test_oversize_upload_returns_413(vision_model):
+    client = TestClient(app)
+    body = _multipart(b"x" * 64)
+    with patch("services.document_ingest.UPLOAD_MAX_BYTES", 16):
+        response = client.post("/api/upload_intent", content=body, headers={"Content-Type": CONTENT_TYPE})
+    assert response.status_code == 413
+    vision_model.generate_content_async.assert_not_called()
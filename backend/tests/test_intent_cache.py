@@ -0,0 +1,100 @@
+"""
+Tests for the intent cache: normalization, LRU/TTL eviction, single-flight and telemetry.
+"""
+import asyncio
+import time
+
+from services.intent_cache import IntentCache, MemoryCacheBackend, SQLiteCacheBackend, normalize_prompt
+
+
+def test_normalize_prompt_collapses_case_and_punctuation():
+    assert normalize_prompt("  Snacks, and BADGES!!  ") == normalize_prompt("snacks and badges")
+
+
+def test_memory_backend_evicts_least_recently_used():
+    backend = MemoryCacheBackend(max_entries=2, ttl_sec=60)
+    backend.set("a", 1)
+    backend.set("b", 2)
+    backend.get("a")
+    backend.set("c", 3)
+    assert backend.get("b") is None
+    assert backend.get("a") == 1
+    assert backend.get("c") == 3
+
+
+def test_memory_backend_expires_entries():
+    backend = MemoryCacheBackend(max_entries=10, ttl_sec=0.01)
+    backend.set("a", 1)
+    time.sleep(0.02)
+    assert backend.get("a") is None
+
+
+def test_sqlite_backend_round_trip_and_bound(tmp_path):
+    backend = SQLiteCacheBackend(str(tmp_path / "cache.sqlite3"), max_entries=2, ttl_sec=60)
+    for key in ("a", "b", "c"):
+        backend.set(key, {"value": [key]})
+    assert len(backend) == 2
+    assert backend.get("c") == {"value": ["c"]}
+
+
+def _result(value, latency_ms):
+    async def compute():
+        return value, latency_ms
+    return compute
+
+
+def test_hit_reports_saved_latency():
+    cache = IntentCache(MemoryCacheBackend(max_entries=10, ttl_sec=60))
+
+    async def scenario():
+        first = await cache.get_or_compute("Snacks for a hackathon", _result(["snacks"], 420.0))
+        second = await cache.get_or_compute("snacks for a HACKATHON.", _result(["wrong"], 1.0))
+        return first, second
+
+    (value, telemetry), (cached, hit) = asyncio.run(scenario())
+    assert value == ["snacks"] and telemetry["cache"] == "miss"
+    assert cached == ["snacks"]
+    assert hit["cache"] == "hit"
+    assert hit["cache_saved_ms"] == 420
+    assert hit["cache_hit_rate"] == 0.5
+
+
+def test_concurrent_identical_prompts_compute_once():
+    cache = IntentCache(MemoryCacheBackend(max_entries=10, ttl_sec=60))
+    calls = []
+
+    async def slow_compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return ["badges"], 50.0
+
+    async def scenario():
+        return await asyncio.gather(*(cache.get_or_compute("badges", slow_compute) for _ in range(8)))
+
+    results = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert [value for value, _ in results] == [["badges"]] * 8
+
+
+def test_failed_compute_is_not_cached_and_followers_retry():
+    cache = IntentCache(MemoryCacheBackend(max_entries=10, ttl_sec=60))
+    calls = []
+
+    async def flaky():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        if len(calls) == 1:
+            raise RuntimeError("provider down")
+        return ["snacks"], 10.0
+
+    async def scenario():
+        return await asyncio.gather(
+            cache.get_or_compute("snacks", flaky),
+            cache.get_or_compute("snacks", flaky),
+            return_exceptions=True,
+        )
+
+    leader, follower = asyncio.run(scenario())
+    assert isinstance(leader, RuntimeError)
+    assert follower[0] == ["snacks"]
+    assert len(calls) == 2
@@ -0,0 +1,116 @@
+"""
+Tests for the local intent tier: keyword and trained classifiers, LLM bypass on confident
+prompts, and tier/agreement telemetry.
+"""
+import asyncio
+import json
+
+import pytest
+
+from services import ai_engine, intent_classifier
+
+
+class FakeProvider:
+    name = "fake"
+    display_name = "Fake LLM"
+
+    def __init__(self, answer):
+        self.answer = answer
+        self.calls = []
+
+    async def complete_intent(self, prompt):
+        self.calls.append(prompt)
+        return self.answer
+
+
+@pytest.fixture
+def stats(monkeypatch):
+    fresh = intent_classifier.TierStats()
+    monkeypatch.setattr(intent_classifier, "STATS", fresh)
+    monkeypatch.setattr(intent_classifier, "LOCAL_INTENT_AUDIT_RATE", 0.0)
+    ai_engine._intent_cache.backend.clear()
+    yield fresh
+    ai_engine._intent_cache.backend.clear()
+
+
+def _use_provider(monkeypatch, answer):
+    provider = FakeProvider(answer)
+
+    async def hedged_complete(providers, prompt):
+        return await provider.complete_intent(prompt), provider, False
+
+    monkeypatch.setattr(ai_engine, "_providers", [provider])
+    monkeypatch.setattr(ai_engine.llm_providers, "hedged_complete", hedged_complete)
+    return provider
+
+
+def test_keyword_tier_is_unsure_on_negation_and_unknown_prompts():
+    assert intent_classifier.classify("Lanyards and USB chargers").confidence >= 0.9
+    for prompt in ("Snacks but no badges", "something nice for the team"):
+        assert not intent_classifier.is_confident(intent_classifier.classify(prompt))
+
+
+@pytest.mark.parametrize("prompt", [
+    "USB hub for the office",
+    "Need water bottles and a power bank as prizes for the hackathon",
+    "Energy-efficient desk lamps",
+])
+def test_keyword_tier_defers_prompts_matched_only_by_ambiguous_words(prompt):
+    assert not intent_classifier.is_confident(intent_classifier.classify(prompt))
+
+
+def test_confident_prompt_skips_the_llm(monkeypatch, stats):
+    provider = _use_provider(monkeypatch, ["prizes"])
+    categories, telemetry = asyncio.run(ai_engine.parse_intent_ai("Trophies and gift cards"))
+    assert categories == ["prizes"]
+    assert telemetry["tier"] == "local" and telemetry["tokens_used"] == 0
+    assert provider.calls == []
+    assert stats.snapshot()["local"] == 1
+
+
+def test_unsure_prompt_escalates_and_records_agreement(monkeypatch, stats, tmp_path):
+    log = tmp_path / "intent.jsonl"
+    monkeypatch.setattr(intent_classifier, "INTENT_LOG_PATH", str(log))
+    provider = _use_provider(monkeypatch, ["snacks"])
+    categories, telemetry = asyncio.run(ai_engine.parse_intent_ai("Snacks but no badges"))
+    assert categories == ["snacks"] and provider.calls == ["Snacks but no badges"]
+    assert telemetry["tier"] == "llm"
+    assert telemetry["local"]["agrees"] is False
+    assert stats.snapshot()["agreement"]["escalated"] == {"compared": 1, "rate": 0.0}
+    assert json.loads(log.read_text()) == {"prompt": "Snacks but no badges", "categories": ["snacks"]}
+
+
+def test_audit_compares_local_answers_in_the_background(monkeypatch, stats):
+    monkeypatch.setattr(intent_classifier, "LOCAL_INTENT_AUDIT_RATE", 1.0)
+    provider = _use_provider(monkeypatch, ["adapters"])
+
+    async def scenario():
+        result = await ai_engine.parse_intent_ai("USB-C chargers")
+        await asyncio.gather(*ai_engine._audits)
+        return result
+
+    categories, telemetry = asyncio.run(scenario())
+    assert categories == ["adapters"] and telemetry["tier"] == "local"
+    assert provider.calls == ["USB-C chargers"]
+    assert stats.snapshot()["agreement"]["audit"] == {"compared": 1, "rate": 1.0}
+
+
+def test_trained_model_round_trips_through_the_cli(tmp_path, monkeypatch):
+    pairs = [
+        ("grab some crisps for the team", ["snacks"]),
+        ("crisps and lanyards please", ["snacks", "badges"]),
+        ("lanyards for everyone", ["badges"]),
+        ("hdmi dongles for the demo room", ["adapters"]),
+        ("hdmi dongles and crisps", ["snacks", "adapters"]),
+        ("medals for the finalists", ["prizes"]),
+        ("medals and lanyards", ["badges", "prizes"]),
+    ] * 4
+    logs = tmp_path / "pairs.jsonl"
+    logs.write_text("".join(json.dumps({"prompt": p, "categories": c}) + "\n" for p, c in pairs))
+    out = tmp_path / "model.json"
+    assert intent_classifier.main([str(logs), "--out", str(out)]) == 0
+
+    monkeypatch.setattr(intent_classifier, "MODEL", intent_classifier._load_model(str(out)))
+    result = intent_classifier.classify("medals for the demo room")
+    assert result.source == "linear"
+    assert result.categories == ["prizes"]
@@ -0,0 +1,82 @@
+"""
+Tests for hedged LLM dispatch and per-provider circuit breakers, using in-process fake SDK clients.
+"""
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from services import llm_providers
+from services.llm_providers import AllProvidersFailed, CircuitBreaker, LLMProvider, hedged_complete
+
+
+def _fake_provider(name, delay=0.0, fail=False, categories=("snacks",)):
+    calls = []
+
+    async def create(**kwargs):
+        calls.append(kwargs)
+        await asyncio.sleep(delay)
+        if fail:
+            raise RuntimeError(f"{name} unavailable")
+        message = SimpleNamespace(content=json.dumps({"categories": list(categories)}))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    provider = LLMProvider(name, f"{name}-model", name.title(), lambda http: client)
+    provider.calls = calls
+    return provider
+
+
+@pytest.fixture(autouse=True)
+def short_hedge(monkeypatch):
+    monkeypatch.setattr(llm_providers, "HEDGE_DEFAULT_DELAY_SEC", 0.05)
+
+
+def test_fast_primary_is_not_hedged():
+    primary, secondary = _fake_provider("groq", categories=["badges"]), _fake_provider("openai")
+    categories, winner, hedged = asyncio.run(hedged_complete([primary, secondary], "badges"))
+    assert categories == ["badges"] and winner is primary and not hedged
+    assert secondary.calls == []
+
+
+def test_slow_primary_is_hedged_and_secondary_wins():
+    primary = _fake_provider("groq", delay=1.0, categories=["snacks"])
+    secondary = _fake_provider("openai", delay=0.01, categories=["prizes"])
+    categories, winner, hedged = asyncio.run(hedged_complete([primary, secondary], "prizes"))
+    assert categories == ["prizes"] and winner is secondary and hedged
+    # The cancelled primary lost a race; that must not count against its breaker.
+    assert primary.breaker.failures == 0
+
+
+def test_failing_primary_falls_through_without_waiting_for_hedge_delay(monkeypatch):
+    monkeypatch.setattr(llm_providers, "HEDGE_DEFAULT_DELAY_SEC", 5.0)
+    primary, secondary = _fake_provider("groq", fail=True), _fake_provider("openai", categories=["adapters"])
+
+    async def scenario():
+        return await asyncio.wait_for(hedged_complete([primary, secondary], "adapters"), timeout=1.0)
+
+    categories, winner, _ = asyncio.run(scenario())
+    assert categories == ["adapters"] and winner is secondary
+    assert primary.breaker.failures == 1
+
+
+def test_open_breaker_skips_provider():
+    primary, secondary = _fake_provider("groq", fail=True), _fake_provider("openai")
+    for _ in range(llm_providers.BREAKER_FAILURE_THRESHOLD):
+        with pytest.raises(AllProvidersFailed):
+            asyncio.run(hedged_complete([primary], "snacks"))
+    assert primary.breaker.state == "open"
+    calls_before = len(primary.calls)
+    asyncio.run(hedged_complete([primary, secondary], "snacks"))
+    assert len(primary.calls) == calls_before
+
+
+def test_breaker_half_open_allows_single_probe(monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=1, reset_sec=0.0)
+    breaker.record_failure()
+    assert breaker.state == "half_open"
+    assert breaker.allow() is True
+    assert breaker.allow() is False
+    breaker.record_success()
+    assert breaker.state == "closed"
@@ -0,0 +1,98 @@
+"""
+Tests for the queued logging pipeline: JSON lines with request ids, sampling, and dropping
+(with a counter) instead of blocking when the sink falls behind.
+"""
+import io
+import json
+import logging
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from utils import logger
+
+
+class SlowStream(io.StringIO):
+    def __init__(self, gate: threading.Event):
+        super().__init__()
+        self.gate = gate
+
+    def write(self, text):
+        self.gate.wait(5)
+        return super().write(text)
+
+
+@pytest.fixture
+def pipeline():
+    def install(stream, **kwargs):
+        logger.setup_logging(stream=stream, log_format="json", **kwargs)
+
+    yield install
+    logger.setup_logging()
+
+
+def _lines(stream) -> list[dict]:
+    logger.shutdown_logging()  # flushes the writer thread
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_records_are_compact_json_with_request_id_and_extras(pipeline):
+    stream = io.StringIO()
+    pipeline(stream)
+    token = logger.request_id.set("req-1")
+    try:
+        logging.getLogger("flux.test").info("scored %s items", 3, extra={"stage_ms": 1.5})
+        try:
+            raise ValueError("bad feed")
+        except ValueError:
+            logging.getLogger("flux.test").exception("failed")
+    finally:
+        logger.request_id.reset(token)
+    info, error = _lines(stream)
+    assert info["msg"] == "scored 3 items" and info["request_id"] == "req-1" and info["stage_ms"] == 1.5
+    assert error["level"] == "ERROR" and "ValueError: bad feed" in error["exc"]
+
+
+def test_slow_sink_drops_with_a_counter_instead_of_blocking(pipeline):
+    gate = threading.Event()
+    pipeline(SlowStream(gate), queue_size=4)
+    t0 = time.perf_counter()
+    for i in range(50):
+        logging.getLogger("flux.test").warning("event %s", i)
+    assert time.perf_counter() - t0 < 1.0
+    assert logger.stats()["dropped"] >= 40
+    assert 'flux_log_records_discarded_total{reason="dropped"}' in logger.render_prometheus()
+    gate.set()
+
+
+def test_info_is_sampled_but_warnings_are_kept(pipeline):
+    stream = io.StringIO()
+    pipeline(stream, sample_rate=0.0)
+    logging.getLogger("flux.test").info("chatty")
+    logging.getLogger("flux.test").warning("important")
+    sampled_out = logger.stats()["sampled_out"]
+    assert [line["msg"] for line in _lines(stream)] == ["important"]
+    assert sampled_out == 1
+
+
+async def _parse(prompt):
+    return ["snacks"], {"model": "mock"}
+
+
+def test_access_log_carries_request_id_and_stage_timings(pipeline):
+    stream = io.StringIO()
+    pipeline(stream)
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr("routers.procurement.ai_engine.parse_intent_ai", _parse)
+        response = TestClient(app).post(
+            "/api/orchestrate",
+            json={"prompt": "snacks", "budget": 100.0, "deadline_days": 5, "strategy": "cheapest"},
+            headers={"X-Request-ID": "abc123"},
+        )
+    assert response.headers["x-request-id"] == "abc123"
+    access = [line for line in _lines(stream) if line["logger"] == "flux.access"]
+    assert access[0]["request_id"] == "abc123" and access[0]["status"] == 200
+    assert "orchestrate.optimize" in access[0]["stages"]
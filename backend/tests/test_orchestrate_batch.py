@@ -0,0 +1,72 @@
+"""
+Tests for /api/orchestrate/batch: prompt dedupe, request ordering and per-item errors.
+"""
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from models.schemas import ProcurementOption
+from services import cart_optimizer
+
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def mock_parse_intent():
+    def categories_for(prompt):
+        return (["badges"] if "badge" in prompt.lower() else ["snacks"]), {"model": "mock"}
+
+    with patch("routers.procurement.ai_engine.parse_intent_ai", side_effect=categories_for) as m:
+        yield m
+
+
+def _request(prompt, budget=100.0):
+    return {"prompt": prompt, "budget": budget, "deadline_days": 5, "strategy": "cheapest"}
+
+
+def test_identical_prompts_are_parsed_once_and_results_keep_request_order(client, mock_parse_intent):
+    body = [_request("Snacks please"), _request("badges"), _request("snacks, please!"), _request("BADGES")]
+    response = client.post("/api/orchestrate/batch", json=body)
+    assert response.status_code == 200
+    data = response.json()
+    assert mock_parse_intent.call_count == 2
+    assert data["telemetry"]["requests"] == 4 and data["telemetry"]["unique_prompts"] == 2
+    assert [r["status"] for r in data["results"]] == ["success"] * 4
+    single = client.post("/api/orchestrate", json=_request("badges")).json()
+    assert data["results"][1]["options"][0]["id"] == single["options"][0]["id"]
+    assert [r["options"][0]["id"] for r in data["results"]] == ["w1", "w2", "w1", "w2"]
+
+
+def test_failing_item_does_not_fail_the_batch(client):
+    real = cart_optimizer.optimize_cart
+
+    def flaky(slots, budget, *args, **kwargs):
+        if budget == 13.0:
+            raise RuntimeError("optimizer exploded")
+        return real(slots, budget, *args, **kwargs)
+
+    with patch("routers.procurement.cart_optimizer.optimize_cart", side_effect=flaky):
+        response = client.post("/api/orchestrate/batch", json=[_request("snacks"), _request("snacks", budget=13.0)])
+    assert response.status_code == 200
+    first, second = response.json()["results"]
+    assert first["status"] == "success" and first["options"]
+    assert second == {"status": "failed", "error": "optimizer exploded"}
+
+
+def test_oversize_batch_is_rejected(client):
+    with patch("routers.procurement.BATCH_MAX_REQUESTS", 2):
+        response = client.post("/api/orchestrate/batch", json=[_request("snacks")] * 3)
+    assert response.status_code == 413
+
+
+def test_options_match_the_procurement_option_schema(client):
+    response = client.post("/api/orchestrate/batch", json=[_request("Snacks please"), _request("badges")])
+    assert response.headers["content-type"] == "application/json"
+    for result in response.json()["results"]:
+        for option in [*result["options"], *(o for alts in result["alternatives"].values() for o in alts)]:
+            assert ProcurementOption(**option).model_dump() == option
@@ -0,0 +1,99 @@
+"""
+Tests for the Server-Sent Events orchestration stream.
+"""
+import json
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def mock_parse_intent():
+    with patch("routers.procurement.ai_engine.parse_intent_ai") as m:
+        m.return_value = (["snacks", "badges", "electronics"], {"model": "mock"})
+        yield m
+
+
+def _read_events(response):
+    events, current = [], {}
+    for line in response.iter_lines():
+        if not line:
+            if current:
+                events.append(current)
+            current = {}
+        elif line.startswith("event: "):
+            current["event"] = line[len("event: "):]
+        elif line.startswith("data: "):
+            current["data"] = json.loads(line[len("data: "):])
+    return events
+
+
+def test_stream_emits_pipeline_events_in_order(client):
+    body = {"prompt": "snacks and badges", "budget": 100.0, "deadline_days": 5, "strategy": "balanced"}
+    with client.stream("POST", "/api/orchestrate/stream", json=body) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = _read_events(response)
+
+    names = [e["event"] for e in events]
+    assert names[0] == "intent_parsed"
+    assert names.count("category_candidates") == 3
+    assert names[-1] == "final_cart"
+    assert events[0]["data"]["categories"] == ["snacks", "badges", "electronics"]
+    empty = next(e["data"] for e in events if e["event"] == "category_candidates" and e["data"]["category"] == "electronics")
+    assert empty["candidates"] == 0
+
+    selected = [e["data"]["option"] for e in events if e["event"] == "item_selected"]
+    final = events[-1]["data"]
+    assert [o["id"] for o in final["options"]] == [o["id"] for o in selected]
+    assert len(selected) == 2
+    assert names.index("item_selected") < names.index("final_cart")
+
+
+def test_stream_final_cart_matches_orchestrate_shape(client):
+    body = {"prompt": "snacks", "budget": 0.0, "deadline_days": 5, "strategy": "cheapest"}
+    with client.stream("POST", "/api/orchestrate/stream", json=body) as response:
+        events = _read_events(response)
+    final = events[-1]
+    assert final["event"] == "final_cart"
+    assert final["data"]["options"] == []
+    assert set(final["data"]) == set(client.post("/api/orchestrate", json=body).json())
+
+
+def test_client_disconnect_stops_orchestration():
+    import asyncio
+
+    from routers.procurement import _sse_stream
+
+    closed = []
+
+    class _Request:
+        def __init__(self):
+            self.polls = 0
+
+        async def is_disconnected(self):
+            self.polls += 1
+            return self.polls > 1
+
+    async def events():
+        try:
+            yield "intent_parsed", {}
+            await asyncio.sleep(10)
+            yield "final_cart", {}
+        finally:
+            closed.append(True)
+
+    async def scenario():
+        return [chunk async for chunk in _sse_stream(_Request(), events())]
+
+    chunks = asyncio.run(scenario())
+    assert len(chunks) == 1 and "intent_parsed" in chunks[0]
+    assert closed == [True]
@@ -176,3 +176,18 @@ def test_orchestrate_invalid_body_validation(client):
         json={"prompt": "test"},  # missing budget, deadline_days
     )
     assert response.status_code == 422
+
+
+def test_orchestrate_honours_deadline_and_budget(client, mock_parse_intent):
+    """Every selected item ships within deadline_days and the cart total fits the budget."""
+    mock_parse_intent.return_value = (["snacks", "badges", "adapters", "prizes"], {})
+    response = client.post(
+        "/api/orchestrate",
+        json={"prompt": "Full hackathon kit", "budget": 100.0, "deadline_days": 2, "strategy": "cheapest"},
+    )
+    assert response.status_code == 200
+    data = response.json()
+    options = data["options"]
+    assert {o["id"] for o in options} <= {"a1", "a2", "w1", "w2", "w3", "a4"}
+    assert sum(o["price"] for o in options) <= 100.0
+    assert data["telemetry"]["optimizer"]["optimal"] is True
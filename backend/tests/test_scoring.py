@@ -0,0 +1,54 @@
+"""
+Parity tests: the NumPy batch scorer must agree with the scalar ai_engine.calculate_score reference.
+"""
+import numpy as np
+import pytest
+
+from services import scoring
+from services.ai_engine import calculate_score
+from services.catalog import DEFAULT_INVENTORY
+
+
+@pytest.fixture
+def columns():
+    rng = np.random.default_rng(7)
+    # Whole-dollar and cent prices both occur in feeds; whole dollars hit exact .0005 rounding ties.
+    price = np.concatenate([np.round(rng.uniform(0, 500, 4000), 2), rng.integers(0, 500, 1000).astype(np.float64)])
+    delivery = rng.integers(0, 14, 5000).astype(np.float64)
+    trust = rng.integers(50, 100, 5000).astype(np.float64)
+    return price, delivery, trust
+
+
+def _reference(price, delivery, strategy):
+    return np.array([calculate_score({"price": p, "delivery_days": d}, strategy) for p, d in zip(price.tolist(), delivery.tolist())])
+
+
+@pytest.mark.parametrize("strategy", ["cheapest", "fastest", "balanced", "unknown"])
+def test_batch_matches_scalar_reference(columns, strategy):
+    price, delivery, trust = columns
+    expected = _reference(price, delivery, strategy)
+    all_rows = scoring.score_all_strategies(price, delivery, trust)[scoring.strategy_row(strategy)]
+    single = scoring.score_strategy(price, delivery, strategy, trust)
+    np.testing.assert_array_equal(all_rows, expected)
+    np.testing.assert_array_equal(single, expected)
+
+
+def test_batch_is_exact_on_seed_inventory():
+    price = np.array([i["price"] for i in DEFAULT_INVENTORY])
+    delivery = np.array([i["delivery_days"] for i in DEFAULT_INVENTORY], dtype=np.float64)
+    for strategy in scoring.STRATEGIES:
+        assert list(scoring.score_strategy(price, delivery, strategy)) == [calculate_score(i, strategy) for i in DEFAULT_INVENTORY]
+
+
+@pytest.mark.parametrize("k", [1, 3, 50, 10_000])
+def test_top_k_matches_full_sort(columns, k):
+    price, delivery, _ = columns
+    scores = scoring.score_strategy(price, delivery, "balanced")
+    expected = np.argsort(scores, kind="stable")[:k]
+    np.testing.assert_array_equal(scoring.top_k(scores, k), expected)
+
+
+def test_top_k_one_matches_min_first_occurrence():
+    scores = np.array([0.3, 0.1, 0.2, 0.1])
+    assert list(scoring.top_k(scores, 1)) == [1]
+    assert list(scoring.top_k(np.array([]), 1)) == []
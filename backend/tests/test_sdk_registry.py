@@ -0,0 +1,47 @@
+"""
+Tests for the lazy SDK registry: deferred imports, lazily built clients and background warm-up.
+"""
+import sys
+
+import pytest
+
+from utils import sdk_registry
+
+
+@pytest.fixture
+def fresh_module(monkeypatch):
+    """A registered proxy for a stdlib module that is not imported yet in this process."""
+    name = "tabnanny"
+    monkeypatch.delitem(sys.modules, name, raising=False)
+    monkeypatch.delitem(sdk_registry._registry, name, raising=False)
+    yield name, sdk_registry.module(name)
+    sdk_registry._registry.pop(name, None)
+
+
+def test_module_is_imported_on_first_attribute_access(fresh_module):
+    name, proxy = fresh_module
+    assert name not in sys.modules and not proxy.loaded
+    assert sdk_registry.status()[name] is None
+    assert proxy.__name__ == name
+    assert proxy.loaded and name in sys.modules
+    assert sdk_registry.status()[name] >= 0
+    assert sdk_registry.module(name) is proxy
+
+
+def test_client_is_built_once_and_warm_skips_failures(monkeypatch):
+    calls = []
+    monkeypatch.setitem(sdk_registry._registry, "ok", sdk_registry.LazyClient("ok", lambda: calls.append(1) or "client"))
+
+    def broken():
+        raise ImportError("no such sdk")
+
+    monkeypatch.setitem(sdk_registry._registry, "broken", sdk_registry.LazyClient("broken", broken))
+    sdk_registry.warm(["ok", "broken", "unknown"])
+    assert sdk_registry._registry["ok"].get() == "client" and calls == [1]
+    assert not sdk_registry._registry["broken"].loaded
+
+
+def test_warm_setting_parsing():
+    assert sdk_registry.warm_names("") == []
+    assert sdk_registry.warm_names(" all ") is None
+    assert sdk_registry.warm_names("groq, web3,") == ["groq", "web3"]
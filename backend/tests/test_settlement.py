@@ -0,0 +1,259 @@
+"""
+Tests for the pipelined settlement engine: against eth-tester as a local chain, and against a stub
+JSON-RPC HTTP node that counts round trips.
+"""
+import asyncio
+import json
+import multiprocessing
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from web3 import Web3
+
+from services.payment_solver import (
+    WHITELISTED_MERCHANTS, NonceManager, PolicyViolation, SettlementEngine, SharedNonceManager, check_policy,
+)
+from services.settlement_queue import SettlementScheduler
+
+# eth-tester's first funded account
+TEST_PRIVATE_KEY = "0x" + "00" * 31 + "01"
+
+
+def _cart(n):
+    vendors = ["amazon", "walmart", "tech_direct"]
+    return [{"id": f"i{k}", "price": 1.25 + k, "vendor_id": vendors[k % 3]} for k in range(n)]
+
+
+@pytest.fixture
+def tester_engine():
+    pytest.importorskip("eth_tester")
+    from web3 import EthereumTesterProvider
+
+    w3 = Web3(EthereumTesterProvider())
+    return SettlementEngine(w3=w3, chain_id=w3.eth.chain_id)
+
+
+def test_settles_cart_on_local_chain_with_consecutive_nonces(tester_engine):
+    w3 = tester_engine.w3
+    sender = w3.eth.account.from_key(TEST_PRIVATE_KEY).address
+    start = w3.eth.get_transaction_count(sender)
+    result = tester_engine.settle(_cart(5), TEST_PRIVATE_KEY, confirm_timeout=5)
+    assert result["status"] == "success"
+    assert len(result["transaction_hashes"]) == 5
+    assert set(result["receipts"].values()) == {1}
+    assert w3.eth.get_transaction_count(sender) == start + 5
+    nonces = [w3.eth.get_transaction(h)["nonce"] for h in result["transaction_hashes"]]
+    assert nonces == list(range(start, start + 5))
+
+
+def test_nonce_and_gas_price_are_reused_between_carts(tester_engine):
+    tester_engine.settle(_cart(1), TEST_PRIVATE_KEY)
+    calls_before = tester_engine.rpc_round_trips
+    tester_engine.settle(_cart(1), TEST_PRIVATE_KEY)
+    # Only the send: the allocator owns the nonce and the gas price is still fresh.
+    assert tester_engine.rpc_round_trips - calls_before == 1
+
+
+def test_gas_price_failure_does_not_leave_a_nonce_gap(tester_engine):
+    w3 = tester_engine.w3
+    acct = tester_engine.account(TEST_PRIVATE_KEY)
+    tester_engine.settle_lines(acct, _cart(1))
+    tester_engine.invalidate_gas_price()
+    rpc_batch = tester_engine.rpc_batch
+
+    def no_gas_price(calls):
+        if calls[0][0] == "eth_gasPrice":
+            raise ConnectionError("node went away")
+        return rpc_batch(calls)
+
+    tester_engine.rpc_batch = no_gas_price
+    with pytest.raises(ConnectionError):
+        tester_engine.settle_lines(acct, _cart(3))
+    tester_engine.rpc_batch = rpc_batch
+    assert tester_engine.nonces.peek(acct.address) in (None, w3.eth.get_transaction_count(acct.address, "pending"))
+    result = tester_engine.settle_lines(acct, _cart(1))
+    assert result[0]["error"] is None
+    assert tester_engine.nonces.peek(acct.address) == w3.eth.get_transaction_count(acct.address, "pending")
+
+
+class _StubNode(BaseHTTPRequestHandler):
+    """Minimal JSON-RPC node that accepts batches and records each HTTP request."""
+
+    requests_seen: list = []
+    reject_if = None  # callable(raw_tx_hex) -> bool, to simulate a node dropping a transaction
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        type(self).requests_seen.append(payload)
+        batch = payload if isinstance(payload, list) else [payload]
+        results = []
+        for call in batch:
+            method = call["method"]
+            if method == "eth_getTransactionCount":
+                result = "0x7"
+            elif method == "eth_gasPrice":
+                result = "0x3b9aca00"
+            elif method == "eth_chainId":
+                result = "0x1"
+            elif method == "eth_getTransactionReceipt":
+                result = {"status": "0x1"}
+            elif type(self).reject_if is not None and type(self).reject_if(call["params"][0]):
+                results.append({"jsonrpc": "2.0", "id": call["id"], "error": {"code": -32000, "message": "transaction underpriced"}})
+                continue
+            else:
+                result = "0x" + "ab" * 32
+            results.append({"jsonrpc": "2.0", "id": call["id"], "result": result})
+        body = json.dumps(results if isinstance(payload, list) else results[0]).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_node():
+    _StubNode.requests_seen = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubNode)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", _StubNode.requests_seen
+    server.shutdown()
+
+
+def test_fifty_line_cart_settles_in_two_http_round_trips(stub_node):
+    url, seen = stub_node
+    engine = SettlementEngine(rpc_url=url, chain_id=1)
+    result = engine.settle(_cart(50), TEST_PRIVATE_KEY)
+    assert len(result["transaction_hashes"]) == 50
+    assert len(set(result["transaction_hashes"])) == 50
+    assert len(seen) == 2
+    assert [c["method"] for c in seen[0]] == ["eth_getTransactionCount", "eth_gasPrice"]
+    assert len(seen[1]) == 50
+
+
+def test_receipts_are_polled_in_one_batch(stub_node):
+    url, seen = stub_node
+    engine = SettlementEngine(rpc_url=url, chain_id=1)
+    statuses = engine.poll_receipts(["0x" + "01" * 32, "0x" + "02" * 32], timeout=1)
+    assert set(statuses.values()) == {1}
+    assert len(seen) == 1
+
+
+def test_policy_rejects_unwhitelisted_merchant_before_signing():
+    with pytest.raises(PolicyViolation):
+        check_policy([{"price": 1.0, "vendor_id": "unknown_merchant"}])
+
+
+def test_rejected_transfer_is_retried_then_its_nonce_filled(stub_node):
+    url, seen = stub_node
+    walmart = WHITELISTED_MERCHANTS["walmart"][2:].lower()
+    _StubNode.reject_if = lambda raw: walmart in raw
+    try:
+        engine = SettlementEngine(rpc_url=url, chain_id=1)
+        results = engine.settle_lines(engine.account(TEST_PRIVATE_KEY), _cart(3))
+    finally:
+        _StubNode.reject_if = None
+    assert [r["error"] is None for r in results] == [True, False, True]
+    # nonce+gas, 3 sends, fresh gas price, 1 retry, 1 filler
+    assert [len(batch) for batch in seen] == [2, 3, 1, 1, 1]
+    assert walmart not in seen[-1][0]["params"][0]
+    assert engine.nonces.peek(engine.account(TEST_PRIVATE_KEY).address) == 7 + 3
+
+
+def test_broadcast_that_raises_does_not_leave_a_nonce_gap(stub_node):
+    url, seen = stub_node
+    engine = SettlementEngine(rpc_url=url, chain_id=1)
+    acct = engine.account(TEST_PRIVATE_KEY)
+    rpc_batch = engine.rpc_batch
+
+    def drop_sends(calls):
+        if calls[0][0] == "eth_sendRawTransaction":
+            raise ConnectionError("node went away")
+        return rpc_batch(calls)
+
+    engine.rpc_batch = drop_sends
+    with pytest.raises(ConnectionError):
+        engine.settle_lines(acct, _cart(2))
+    assert engine.nonces.peek(acct.address) is None  # resynced, not left at 7 + 2
+    engine.rpc_batch = rpc_batch
+    sent = engine.settle_lines(acct, _cart(1))
+    assert sent[0]["error"] is None
+    assert [c["method"] for c in seen[-2]] == ["eth_getTransactionCount"]
+    assert engine.nonces.peek(acct.address) == 7 + 1
+
+
+def test_nonce_manager_hands_out_disjoint_ranges_under_contention():
+    manager = NonceManager()
+    fetches = []
+    starts = []
+
+    def worker():
+        for _ in range(50):
+            starts.append(manager.allocate("0xabc", 2, lambda: fetches.append(1) or 100))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(fetches) == 1
+    assert sorted(starts) == list(range(100, 100 + 2 * 400, 2))
+
+
+def _allocate_in_worker(directory, queue):
+    manager = SharedNonceManager(directory)
+    starts = []
+    for _ in range(25):
+        starts.append(manager.allocate("0xabc", 2, lambda: 100))
+        manager.release("0xabc")
+    queue.put(starts)
+
+
+def test_shared_nonce_manager_hands_out_disjoint_ranges_across_processes(tmp_path):
+    context = multiprocessing.get_context("fork")
+    queue = context.Queue()
+    workers = [context.Process(target=_allocate_in_worker, args=(str(tmp_path), queue)) for _ in range(4)]
+    for w in workers:
+        w.start()
+    starts = sorted(start for _ in workers for start in queue.get(timeout=30))
+    for w in workers:
+        w.join()
+    assert starts == list(range(100, 100 + 2 * 100, 2))
+
+
+def test_shared_resync_waits_for_other_workers_reservations(tmp_path):
+    manager = SharedNonceManager(str(tmp_path))
+    manager.allocate("0xabc", 3, lambda: 100)
+    # Another live worker still holds an unsent reservation: re-reading the chain would collide.
+    manager._update("0xabc", lambda state: state["holders"].update({str(os.getppid()): 1}))
+    manager.release("0xabc")
+    manager.resync("0xabc")
+    assert manager.allocate("0xabc", 1, lambda: 100) == 103
+    manager.release("0xabc")
+    # Once that worker has exited (its pid no longer exists), the next allocation re-reads the chain.
+    manager._update("0xabc", lambda state: state.update(holders={"4194305": 1}))
+    assert manager.allocate("0xabc", 1, lambda: 101) == 101
+
+
+def test_scheduler_batches_concurrent_carts_from_one_account(tester_engine):
+    scheduler = SettlementScheduler(tester_engine, TEST_PRIVATE_KEY, batch_window_ms=100, max_tx_per_sec=0)
+
+    async def scenario():
+        try:
+            return await asyncio.gather(*(scheduler.submit(_cart(2)) for _ in range(5)))
+        finally:
+            await scheduler.stop()
+
+    results = asyncio.run(scenario())
+    assert all(r["status"] == "success" for r in results)
+    hashes = [h for r in results for h in r["transaction_hashes"]]
+    nonces = sorted(tester_engine.w3.eth.get_transaction(h)["nonce"] for h in hashes)
+    assert nonces == list(range(nonces[0], nonces[0] + 10))
+    stats = scheduler.stats()
+    assert stats["batches"] == 1 and stats["settled_carts"] == 5 and stats["queue_depth"] == 0
@@ -0,0 +1,235 @@
+"""
+Tests for the settlement journal: idempotent retries, concurrent duplicates, and recovery of a
+cart a crashed process left half-broadcast, against a stub JSON-RPC node that keeps a ledger.
+"""
+import asyncio
+import json
+import sqlite3
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from eth_utils import keccak
+from fastapi.testclient import TestClient
+
+from main import app
+from services.payment_solver import SettlementEngine
+from services.settlement_journal import IdempotencyConflict, SettlementJournal, SettlementUnresolved, cart_digest
+from services.settlement_queue import SettlementScheduler
+
+TEST_PRIVATE_KEY = "0x" + "00" * 31 + "01"
+START_NONCE = 7
+DEAD_OWNER = "4194305:crashed"  # above Linux's pid_max, so never a live process
+
+
+def _cart(n):
+    vendors = ["amazon", "walmart", "tech_direct"]
+    return [{"id": f"i{k}", "price": 1.25 + k, "vendor_id": vendors[k % 3]} for k in range(n)]
+
+
+class _LedgerNode(BaseHTTPRequestHandler):
+    """JSON-RPC node that mines every accepted transaction at once and remembers it."""
+
+    mined: dict = {}  # tx hash -> raw tx hex
+    sends: list = []
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        batch = payload if isinstance(payload, list) else [payload]
+        responses = []
+        for call in batch:
+            method, params = call["method"], call["params"]
+            response = {"jsonrpc": "2.0", "id": call["id"]}
+            if method == "eth_getTransactionCount":
+                response["result"] = hex(START_NONCE + len(self.mined))
+            elif method == "eth_gasPrice":
+                response["result"] = "0x3b9aca00"
+            elif method == "eth_getTransactionReceipt":
+                response["result"] = {"status": "0x1"} if params[0] in self.mined else None
+            elif method == "eth_sendRawTransaction":
+                type(self).sends.append(params[0])
+                tx_hash = "0x" + keccak(hexstr=params[0]).hex().removeprefix("0x")
+                if tx_hash in self.mined:
+                    response["error"] = {"code": -32000, "message": "already known"}
+                else:
+                    self.mined[tx_hash] = params[0]
+                    response["result"] = tx_hash
+            responses.append(response)
+        body = json.dumps(responses if isinstance(payload, list) else responses[0]).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def node():
+    _LedgerNode.mined, _LedgerNode.sends = {}, []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _LedgerNode)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def _scheduler(url, journal) -> SettlementScheduler:
+    return SettlementScheduler(
+        SettlementEngine(rpc_url=url, chain_id=1), TEST_PRIVATE_KEY, batch_window_ms=50, max_tx_per_sec=0, journal=journal
+    )
+
+
+def _run(scheduler, scenario):
+    async def wrapped():
+        try:
+            return await scenario()
+        finally:
+            await scheduler.stop()
+
+    return asyncio.run(wrapped())
+
+
+def test_retry_with_same_key_replays_result_without_touching_the_chain(node, tmp_path):
+    scheduler = _scheduler(node, SettlementJournal(str(tmp_path / "journal.sqlite3")))
+
+    async def scenario():
+        # Two concurrent submissions of one key share a single settlement.
+        first, duplicate = await asyncio.gather(scheduler.submit(_cart(2), "order-1"), scheduler.submit(_cart(2), "order-1"))
+        round_trips = scheduler.engine.rpc_round_trips
+        retry = await scheduler.submit(_cart(2), "order-1")
+        assert scheduler.engine.rpc_round_trips == round_trips
+        with pytest.raises(IdempotencyConflict):
+            await scheduler.submit(_cart(3), "order-1")
+        return first, duplicate, retry
+
+    first, duplicate, retry = _run(scheduler, scenario)
+    assert first["status"] == "success" and first["idempotency_key"] == "order-1"
+    assert duplicate == first
+    assert retry == {**first, "replayed": True}
+    assert len(_LedgerNode.mined) == 2
+    stats = scheduler.stats()
+    assert stats["settled_carts"] == 1 and stats["replayed_carts"] == 1 and stats["journal_settled_carts"] == 1
+
+
+def test_crashed_cart_is_reconciled_without_paying_any_line_twice(node, tmp_path):
+    path, cart = str(tmp_path / "journal.sqlite3"), _cart(3)
+
+    # A process journals the cart, signs two lines, gets only the first on the wire, and dies.
+    crashed = SettlementJournal(path, owner=DEAD_OWNER)
+    crashed.claim([("order-2", cart_digest(cart), cart)])
+    engine = SettlementEngine(rpc_url=node, chain_id=1)
+    acct = engine.account(TEST_PRIVATE_KEY)
+    start, gas_price = engine.allocate_nonces(acct.address, 2)
+    raws = engine.sign_transfers(acct, cart[:2], start, gas_price)
+    crashed.recorder([("order-2", 0), ("order-2", 1)]).signed([0, 1], [start, start + 1], raws, [engine.tx_hash(r) for r in raws])
+    engine.broadcast(raws[:1])
+    crashed.close()
+
+    # The restarted process reconciles before settling anything new; the client's retry replays.
+    journal = SettlementJournal(path)
+    scheduler = _scheduler(node, journal)
+    result = _run(scheduler, lambda: scheduler.submit(cart, "order-2"))
+
+    assert result["status"] == "success" and result["replayed"] is True
+    assert result["transaction_hashes"][:2] == [engine.tx_hash(r) for r in raws]
+    assert len(_LedgerNode.mined) == 3  # one transfer per line
+    assert scheduler.stats()["recovered_carts"] == 1 and journal.stats()["journal_pending_carts"] == 0
+    receipts = [line.receipt for line in journal.lines("order-2")]
+    assert receipts[0] == {"tx_hash": engine.tx_hash(raws[0]), "status": 1} and receipts[2] is None
+
+
+def _drop_sends(engine, deliver: bool, times: int):
+    """Make the next `times` send batches raise; with `deliver`, the node receives them first."""
+    rpc_batch, drops = engine.rpc_batch, [times]
+
+    def flaky(calls):
+        if calls[0][0] == "eth_sendRawTransaction" and drops[0] > 0:
+            drops[0] -= 1
+            if deliver:
+                rpc_batch(calls)
+            raise ConnectionError("connection reset")
+        return rpc_batch(calls)
+
+    engine.rpc_batch = flaky
+
+
+def test_failed_batch_is_reconciled_before_the_caller_is_answered(node, tmp_path):
+    scheduler = _scheduler(node, SettlementJournal(str(tmp_path / "journal.sqlite3")))
+    # The node takes both transfers but the connection drops before it answers.
+    _drop_sends(scheduler.engine, deliver=True, times=1)
+
+    async def scenario():
+        first = await scheduler.submit(_cart(2))
+        retry = await scheduler.submit(_cart(2), first["idempotency_key"])
+        return first, retry
+
+    first, retry = _run(scheduler, scenario)
+    assert first["status"] == "success" and len(first["transaction_hashes"]) == 2
+    assert retry["replayed"] is True and retry["transaction_hashes"] == first["transaction_hashes"]
+    assert len(_LedgerNode.mined) == 2
+
+
+def test_unresolved_failure_names_its_key_and_a_retry_never_pays_twice(node, tmp_path):
+    path = str(tmp_path / "journal.sqlite3")
+    scheduler = _scheduler(node, SettlementJournal(path))
+    # Sends fail for the batch and for the in-process reconcile: nothing reaches the node.
+    _drop_sends(scheduler.engine, deliver=False, times=2)
+
+    async def scenario():
+        with pytest.raises(SettlementUnresolved) as unresolved:
+            await scheduler.submit(_cart(2))
+        return unresolved.value.key, await scheduler.submit(_cart(2), unresolved.value.key)
+
+    key, retry = _run(scheduler, scenario)
+    assert retry["status"] == "success" and retry["idempotency_key"] == key
+    nonces = sorted(line.signed[-1]["nonce"] for line in scheduler.journal.lines(key))
+    assert nonces == [START_NONCE, START_NONCE + 1]  # re-sent at the nonces first signed
+    assert len(_LedgerNode.mined) == 2
+
+    # A restart finds nothing left to re-send.
+    restarted = _scheduler(node, SettlementJournal(path))
+    assert _run(restarted, restarted.recover) == []
+    assert len(_LedgerNode.mined) == 2
+
+
+def test_worker_keeps_draining_its_queue_when_recovery_fails(node, tmp_path):
+    journal = SettlementJournal(str(tmp_path / "journal.sqlite3"))
+    scheduler = _scheduler(node, journal)
+
+    def unreadable():
+        raise sqlite3.OperationalError("disk I/O error")
+
+    journal.orphans = unreadable
+
+    async def scenario():
+        queue = scheduler._ensure_worker()
+        first = await asyncio.wait_for(scheduler.submit(_cart(1)), 10)
+        # A worker that died anyway is replaced on the same queue.
+        scheduler._worker.cancel()
+        await asyncio.sleep(0)
+        assert scheduler._ensure_worker() is queue
+        return first, await asyncio.wait_for(scheduler.submit(_cart(1)), 10)
+
+    first, second = _run(scheduler, scenario)
+    assert first["status"] == second["status"] == "success"
+    assert len(_LedgerNode.mined) == 2
+
+
+def test_execute_payment_passes_the_idempotency_key_and_maps_conflicts_to_409():
+    client = TestClient(app)
+    with patch("routers.procurement.settlement_queue.execute_payment", new=AsyncMock(side_effect=IdempotencyConflict("reused"))) as pay:
+        response = client.post("/api/execute_payment", json=[{"price": 1.0, "vendor_id": "amazon"}], headers={"Idempotency-Key": "k1"})
+    assert response.status_code == 409
+    assert pay.await_args.args[1] == "k1"
+
+
+def test_unresolved_payment_returns_503_with_the_key_to_retry():
+    unresolved = SettlementUnresolved("generated-key", ConnectionError("connection reset"))
+    with patch("routers.procurement.settlement_queue.execute_payment", new=AsyncMock(side_effect=unresolved)):
+        response = TestClient(app).post("/api/execute_payment", json=[{"price": 1.0, "vendor_id": "amazon"}])
+    assert response.status_code == 503
+    assert response.json()["detail"]["idempotency_key"] == "generated-key"
@@ -0,0 +1,133 @@
+"""
+Tests for speculative prefetch: candidates for the keyword guess are built while intent parsing is
+in flight, and the LLM's answer confirms, trims or replaces the provisional cart.
+"""
+import asyncio
+import threading
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from routers import procurement
+from services import ai_engine, intent_classifier
+
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+
+@pytest.fixture
+def llm_bound(monkeypatch):
+    # parse_intent_ai is mocked in these tests; treat every prompt as one headed for the LLM.
+    monkeypatch.setattr(procurement.ai_engine, "intent_needs_llm", lambda prompt: True)
+
+
+def _orchestrate(client, prompt, categories):
+    body = {"prompt": prompt, "budget": 100.0, "deadline_days": 5, "strategy": "cheapest", "seed": 3}
+    with patch("routers.procurement.ai_engine.parse_intent_ai") as m:
+        m.return_value = (categories, {"model": "mock"})
+        response = client.post("/api/orchestrate", json=body)
+    assert response.status_code == 200
+    return response.json()
+
+
+def _ids(cart):
+    return [o["id"] for o in cart["options"]]
+
+
+def test_keyword_guess_follows_vocabulary_order_with_fallback():
+    assert intent_classifier.guess_categories("USB chargers, name badges and some chips") == ["snacks", "badges", "adapters"]
+    assert intent_classifier.guess_categories("Trophies for the winners") == ["prizes"]
+    assert intent_classifier.guess_categories("something nice") == ["snacks", "badges"]
+
+
+@pytest.mark.parametrize("prompt, categories, outcome", [
+    ("snacks and badges", ["snacks", "badges"], "confirmed"),
+    ("snacks and badges", ["badges"], "trimmed"),
+    ("snacks and badges", ["prizes", "snacks"], "replanned"),
+])
+def test_speculative_cart_matches_the_unspeculated_cart(client, llm_bound, monkeypatch, prompt, categories, outcome):
+    speculated = _orchestrate(client, prompt, categories)
+    assert speculated["telemetry"]["speculation"] == {"guess": ["snacks", "badges"], "outcome": outcome}
+
+    monkeypatch.setattr(procurement, "SPECULATIVE_PREFETCH", False)
+    plain = _orchestrate(client, prompt, categories)
+    assert "speculation" not in plain["telemetry"]
+    assert _ids(speculated) == _ids(plain)
+    assert speculated["alternatives"] == plain["alternatives"]
+
+
+def test_prefetch_runs_while_the_llm_call_is_in_flight(client, llm_bound):
+    prefetched = threading.Event()
+    real_speculate = procurement._speculate
+
+    def speculate(*args):
+        try:
+            return real_speculate(*args)
+        finally:
+            prefetched.set()
+
+    async def slow_parse(prompt):
+        # Returns only once the prefetch has finished in its worker thread.
+        while not prefetched.is_set():
+            await asyncio.sleep(0.001)
+        return ["snacks", "badges"], {"model": "mock"}
+
+    with patch.object(procurement, "_speculate", speculate), \
+            patch("routers.procurement.ai_engine.parse_intent_ai", side_effect=slow_parse):
+        response = client.post(
+            "/api/orchestrate",
+            json={"prompt": "snacks and badges", "budget": 100.0, "deadline_days": 5, "strategy": "cheapest"},
+        )
+    assert response.status_code == 200
+    assert response.json()["telemetry"]["speculation"]["outcome"] == "confirmed"
+
+
+class _FakeProvider:
+    name = "fake"
+    display_name = "Fake LLM"
+
+    def __init__(self):
+        self.calls = []
+
+    async def complete_intent(self, prompt):
+        self.calls.append(prompt)
+        return ["snacks"]
+
+
+@pytest.mark.parametrize("prompt, speculates", [
+    ("Snacks but no badges", True),    # the local tier is unsure: the LLM answers
+    ("Lanyards and USB chargers", False),  # the local tier answers
+])
+def test_speculation_only_when_intent_goes_to_the_llm(client, monkeypatch, prompt, speculates):
+    provider = _FakeProvider()
+
+    async def hedged_complete(providers, prompt):
+        return await provider.complete_intent(prompt), provider, False
+
+    monkeypatch.setattr(ai_engine, "_providers", [provider])
+    monkeypatch.setattr(ai_engine.llm_providers, "hedged_complete", hedged_complete)
+    monkeypatch.setattr(intent_classifier, "LOCAL_INTENT_AUDIT_RATE", 0.0)
+    ai_engine._intent_cache.backend.clear()
+    speculated = []
+    real_speculate = procurement._speculate
+
+    def speculate(*args):
+        speculated.append(args[0].prompt)
+        return real_speculate(*args)
+
+    body = {"prompt": prompt, "budget": 100.0, "deadline_days": 5, "strategy": "cheapest"}
+    try:
+        with patch.object(procurement, "_speculate", speculate):
+            first = client.post("/api/orchestrate", json=body).json()
+            # The same prompt again is an intent-cache hit (or another local answer).
+            second = client.post("/api/orchestrate", json=body).json()
+    finally:
+        ai_engine._intent_cache.backend.clear()
+    assert ("speculation" in first["telemetry"]) is speculates
+    assert "speculation" not in second["telemetry"]
+    assert speculated == ([prompt] if speculates else [])
+    assert provider.calls == ([prompt] if speculates else [])
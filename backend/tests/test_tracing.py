@@ -0,0 +1,89 @@
+"""
+Tests for request tracing: spans, the histogram registry, /metrics and the dev-mode breakdown.
+"""
+import asyncio
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from utils import tracing
+
+
+@pytest.fixture(autouse=True)
+def fresh_registry():
+    tracing.REGISTRY.reset()
+    yield
+    tracing.REGISTRY.reset()
+
+
+@pytest.fixture
+def mock_parse_intent():
+    with patch("routers.procurement.ai_engine.parse_intent_ai") as m:
+        m.return_value = (["snacks", "badges"], {"model": "mock"})
+        yield m
+
+
+def test_span_feeds_registry_as_block_and_decorator():
+    @tracing.span("unit.sync")
+    def work():
+        return 1
+
+    @tracing.span("unit.async")
+    async def async_work():
+        await asyncio.sleep(0)
+        return 2
+
+    with tracing.span("unit.block"):
+        pass
+    assert work() == 1
+    assert asyncio.run(async_work()) == 2
+    snapshot = tracing.REGISTRY.snapshot()
+    assert {"unit.block", "unit.sync", "unit.async"} <= set(snapshot)
+    assert snapshot["unit.sync"]["count"] == 1
+    assert set(snapshot["unit.sync"]) == {"count", "sum", "p50", "p95", "p99"}
+
+
+def test_nested_spans_land_on_the_active_trace_only():
+    trace = tracing.Trace()
+    with tracing.span("outer", trace):
+        with tracing.span("inner"):
+            pass
+        with tracing.span("inner"):
+            pass
+    with tracing.span("untraced"):
+        pass
+    breakdown = trace.breakdown()
+    assert list(breakdown) == ["inner", "outer"]
+    assert breakdown["inner"]["calls"] == 2
+    assert tracing.current_trace() is None
+
+
+def test_prometheus_rendering_escapes_labels():
+    tracing.REGISTRY.observe('odd "stage"', 0.25)
+    text = tracing.REGISTRY.render_prometheus()
+    assert "# TYPE flux_stage_latency_seconds summary" in text
+    assert 'flux_stage_latency_seconds{stage="odd \\"stage\\"",quantile="0.95"} 0.25' in text
+    assert 'flux_stage_latency_seconds_count{stage="odd \\"stage\\""} 1' in text
+
+
+def test_metrics_endpoint_exposes_orchestration_stages(mock_parse_intent):
+    client = TestClient(app)
+    body = {"prompt": "snacks and badges", "budget": 100.0, "deadline_days": 5, "strategy": "balanced"}
+    assert client.post("/api/orchestrate", json=body).status_code == 200
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    for stage in ("orchestrate.parse_intent", "orchestrate.scoring", "orchestrate.serialize", "http POST /api/orchestrate"):
+        assert f'stage="{stage}"' in response.text
+
+
+def test_dev_mode_attaches_per_request_breakdown(mock_parse_intent):
+    client = TestClient(app)
+    body = {"prompt": "snacks and badges", "budget": 100.0, "deadline_days": 5, "strategy": "balanced"}
+    assert "trace" not in client.post("/api/orchestrate", json=body).json()["telemetry"]
+    with patch.object(tracing, "DEV_MODE", True):
+        telemetry = client.post("/api/orchestrate", json=body).json()["telemetry"]
+    assert {"orchestrate.parse_intent", "orchestrate.catalog_filter", "orchestrate.optimize"} <= set(telemetry["trace"])
+    assert telemetry["trace"]["orchestrate.catalog_filter"]["calls"] == 2
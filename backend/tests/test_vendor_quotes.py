@@ -0,0 +1,134 @@
+"""
+Tests for live vendor quotes: concurrent fetch from local HTTP stub retailers, per-vendor
+deadlines, and stale-while-revalidate caching.
+"""
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from services import vendor_quotes
+
+
+@contextmanager
+def stub_retailer(quotes: list[dict], delay_sec: float = 0.0):
+    """A local quote feed serving GET /quotes after `delay_sec`; yields (base_url, hit counter)."""
+    hits = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits.append(self.path)
+            time.sleep(delay_sec)
+            body = json.dumps({"quotes": quotes}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}", hits
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def mock_parse_intent():
+    with patch("routers.procurement.ai_engine.parse_intent_ai") as m:
+        m.return_value = (["snacks"], {"model": "mock"})
+        yield m
+
+
+@pytest.fixture
+def use_sources(monkeypatch):
+    def install(spec: str, deadline_ms: float = 500, **cache_kwargs) -> vendor_quotes.QuoteAggregator:
+        aggregator = vendor_quotes.QuoteAggregator(
+            vendor_quotes.build_sources(spec), vendor_quotes.QuoteCache(**cache_kwargs), deadline_ms
+        )
+        monkeypatch.setattr(vendor_quotes, "AGGREGATOR", aggregator)
+        return aggregator
+
+    return install
+
+
+def _cheapest_snack(client) -> dict:
+    body = {"prompt": "snacks", "budget": 100.0, "deadline_days": 5, "strategy": "cheapest", "seed": 1}
+    response = client.post("/api/orchestrate", json=body)
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_live_quotes_reprice_candidates(use_sources):
+    # Amazon's energy drinks (catalog $45) are quoted at $9, undercutting Walmart's $18 chips.
+    with stub_retailer([{"id": "a1", "price": 9.0, "delivery_days": 1}]) as (url, _):
+        use_sources(f"amazon={url}")
+        cart = _cheapest_snack(TestClient(app))
+    assert cart["telemetry"]["quotes"] == {"amazon": "fetched"}
+    assert cart["options"][0]["id"] == "a1"
+    assert cart["options"][0]["delivery_days"] == 1
+    assert cart["options"][0]["price"] <= 9.0
+
+
+def test_slow_vendor_is_dropped_and_fills_the_cache_in_background(use_sources):
+    # One client (one event loop) for the test, as in a server, so background fetches survive.
+    with TestClient(app) as client, \
+            stub_retailer([{"id": "a1", "price": 9.0, "delivery_days": 1}], delay_sec=0.6) as (slow, _), \
+            stub_retailer([{"id": "w1", "price": 16.0, "delivery_days": 1}]) as (fast, _):
+        use_sources(f"amazon={slow},walmart={fast}", deadline_ms=200)
+        t0 = time.perf_counter()
+        cart = _cheapest_snack(client)
+        assert time.perf_counter() - t0 < 0.6
+        assert cart["telemetry"]["quotes"] == {"amazon": "timeout", "walmart": "fetched"}
+        assert cart["options"][0]["id"] == "w1"
+
+        time.sleep(0.6)
+        cart = _cheapest_snack(client)
+    assert cart["telemetry"]["quotes"] == {"amazon": "fresh", "walmart": "fresh"}
+    assert cart["options"][0]["id"] == "a1"
+
+
+def test_stale_sheet_is_served_while_one_refresh_runs(use_sources):
+    with TestClient(app) as client, \
+            stub_retailer([{"id": "a1", "price": 9.0, "delivery_days": 1}], delay_sec=0.2) as (url, hits):
+        aggregator = use_sources(f"amazon={url}", fresh_sec=0.0)
+        _cheapest_snack(client)
+        assert len(hits) == 1
+        t0 = time.perf_counter()
+        first, second = _cheapest_snack(client), _cheapest_snack(client)
+        assert time.perf_counter() - t0 < 0.2
+        assert first["telemetry"]["quotes"] == second["telemetry"]["quotes"] == {"amazon": "stale"}
+        assert first["options"][0]["id"] == "a1"
+        time.sleep(0.3)
+    assert len(hits) == 2  # one refresh for both stale reads
+    assert aggregator.cache.failures == 0
+
+
+def test_rerank_reuses_the_session_quotes_without_gathering(use_sources, monkeypatch):
+    with stub_retailer([{"id": "a1", "price": 9.0, "delivery_days": 1}]) as (url, hits):
+        aggregator = use_sources(f"amazon={url}")
+        client = TestClient(app)
+        cart = _cheapest_snack(client)
+        monkeypatch.setattr(aggregator, "overlay", lambda catalog: pytest.fail("rerank gathered quotes"))
+        response = client.post(f"/api/cart/{cart['cart_id']}/rerank", json={"budget": 50.0})
+    assert response.status_code == 200
+    reranked = response.json()
+    assert len(hits) == 1
+    assert reranked["options"][0]["id"] == "a1" and reranked["options"][0]["price"] == cart["options"][0]["price"]
+    assert reranked["telemetry"]["quotes"] == {"amazon": "fetched"}
+
+
+def test_malformed_sources_spec_is_rejected():
+    with pytest.raises(ValueError):
+        vendor_quotes.build_sources("amazon")
@@ -0,0 +1,29 @@
+import json
+from typing import Any
+
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:  # optional: the stdlib encoder produces the same documents, more slowly
+    orjson = None
+
+
+def dumps(obj: Any) -> bytes:
+    """Compact UTF-8 JSON for plain dicts/lists/scalars (and NumPy values when orjson is present)."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+
+class FastJSONResponse(Response):
+    """JSON response written straight to bytes.
+
+    Returning one from an endpoint skips FastAPI's jsonable_encoder pass, so the content must
+    already be plain JSON types (as orchestration results are).
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
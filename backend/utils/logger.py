@@ -1,22 +1,169 @@
+import atexit
+import contextvars
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import random
 import sys
+import threading
 from typing import Optional
 
+# ---- CONFIG ----
+# "json" (one compact object per line) or "text" (the classic pipe-separated format).
+LOG_FORMAT = os.environ.get("FLUX_LOG_FORMAT", "json").lower()
+LOG_LEVEL = os.environ.get("FLUX_LOG_LEVEL", "INFO").upper()
+# Records waiting for the writer thread; beyond this they are dropped (and counted), never waited on.
+LOG_QUEUE_SIZE = int(os.environ.get("FLUX_LOG_QUEUE_SIZE", "10000"))
+# Share of INFO/DEBUG records kept; warnings and errors are never sampled.
+LOG_INFO_SAMPLE_RATE = float(os.environ.get("FLUX_LOG_INFO_SAMPLE_RATE", "1.0"))
+
+TEXT_FORMAT = "%(asctime)s | FLUX_BLOCK: %(process)d | %(levelname)s | %(name)s | %(message)s"
+
+request_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("flux_request_id", default=None)
+
+# LogRecord attributes; anything else on a record came from `extra=` and is emitted as a field.
+_STANDARD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One compact JSON object per record: ts, level, logger, msg, request_id, extras, exc."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        out = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "pid": record.process,
+        }
+        rid = getattr(record, "request_id", None)
+        if rid:
+            out["request_id"] = rid
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS and not key.startswith("_"):
+                out[key] = value
+        if record.exc_info:
+            out["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            out["exc"] = record.exc_text
+        return json.dumps(out, separators=(",", ":"), default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps every WARNING+ record and a `rate` share of the rest; tags records with the request id."""
+
+    def __init__(self, rate: float = 1.0):
+        super().__init__()
+        self.rate = rate
+        self.sampled_out = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING and self.rate < 1.0 and random.random() >= self.rate:
+            self.sampled_out += 1
+            return False
+        record.request_id = request_id.get()
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler over a bounded queue that drops (and counts) instead of blocking when full.
+
+    Only the message is rendered on the calling thread; exception tracebacks are formatted by the
+    writer thread.
+    """
+
+    def __init__(self, q: queue.Queue):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _Pipeline:
+    def __init__(self, handler: DroppingQueueHandler, sampler: SamplingFilter, listener: logging.handlers.QueueListener):
+        self.handler = handler
+        self.sampler = sampler
+        self.listener = listener
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.handler.queue.qsize(),
+            "capacity": self.handler.queue.maxsize,
+            "dropped": self.handler.dropped,
+            "sampled_out": self.sampler.sampled_out,
+        }
+
+
+_pipeline: Optional[_Pipeline] = None
+_pipeline_lock = threading.Lock()
+
 
 def setup_logging(
-    level: int = logging.INFO,
+    level: int | str = LOG_LEVEL,
     format_string: Optional[str] = None,
+    stream=None,
+    log_format: str = LOG_FORMAT,
+    queue_size: int = LOG_QUEUE_SIZE,
+    sample_rate: float = LOG_INFO_SAMPLE_RATE,
 ) -> None:
-    """Configure application logging with a standard format."""
-    if format_string is None:
-        format_string = "%(asctime)s | FLUX_BLOCK: %(process)d | %(levelname)s | %(name)s | %(message)s"
-
-    logging.basicConfig(
-        level=level,
-        format=format_string,
-        handlers=[logging.StreamHandler(sys.stdout)],
-        force=True,
-    )
+    """Route all logging through a bounded queue to a writer thread, so a slow sink never blocks
+    the event loop. Safe to call again; the previous pipeline is flushed and replaced."""
+    global _pipeline
+    sink = logging.StreamHandler(stream or sys.stdout)
+    if log_format == "text" or format_string is not None:
+        sink.setFormatter(logging.Formatter(format_string or TEXT_FORMAT))
+    else:
+        sink.setFormatter(JsonFormatter())
+    handler = DroppingQueueHandler(queue.Queue(maxsize=max(1, queue_size)))
+    sampler = SamplingFilter(sample_rate)
+    handler.addFilter(sampler)
+    listener = logging.handlers.QueueListener(handler.queue, sink, respect_handler_level=True)
+    with _pipeline_lock:
+        shutdown_logging()
+        logging.basicConfig(level=level, handlers=[handler], force=True)
+        listener.start()
+        _pipeline = _Pipeline(handler, sampler, listener)
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the writer thread (also run at interpreter exit)."""
+    global _pipeline
+    if _pipeline is not None:
+        _pipeline.listener.stop()
+        _pipeline = None
+
+
+atexit.register(shutdown_logging)
+
+
+def stats() -> Optional[dict]:
+    pipeline = _pipeline
+    return pipeline.stats() if pipeline is not None else None
+
+
+def render_prometheus() -> str:
+    current = stats() or {"queued": 0, "capacity": 0, "dropped": 0, "sampled_out": 0}
+    lines = [
+        "# HELP flux_log_queue_depth Log records waiting for the writer thread.",
+        "# TYPE flux_log_queue_depth gauge",
+        f"flux_log_queue_depth {current['queued']}",
+        "# HELP flux_log_records_discarded_total Log records not written: queue full (dropped) or sampled out.",
+        "# TYPE flux_log_records_discarded_total counter",
+        f'flux_log_records_discarded_total{{reason="dropped"}} {current["dropped"]}',
+        f'flux_log_records_discarded_total{{reason="sampled"}} {current["sampled_out"]}',
+    ]
+    return "\n".join(lines) + "\n"
 
 
 def get_logger(name: str) -> logging.Logger:
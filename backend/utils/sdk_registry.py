@@ -0,0 +1,121 @@
+import importlib
+import os
+import threading
+import time
+from typing import Any, Callable, Iterable, Optional
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# ---- CONFIG ----
+# SDKs to import in the background once the server is up: comma-separated registry names, or "all".
+# Unset, every SDK is imported by the first request that needs it.
+WARM_SDKS = os.environ.get("FLUX_WARM_SDKS", "")
+
+
+class LazyModule:
+    """Stands in for a heavy SDK module and imports it on first attribute access.
+
+    Import-time cost (groq, openai, google.generativeai, web3) is then paid by the first request
+    that uses the SDK, or by warm(), instead of by every worker at startup.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+        self.import_ms: Optional[float] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    t0 = time.perf_counter()
+                    module = importlib.import_module(self._name)
+                    self.import_ms = round((time.perf_counter() - t0) * 1000, 1)
+                    self._module = module
+                    logger.info("Imported %s in %sms", self._name, self.import_ms)
+        return self._module
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self.load(), attr)
+
+
+class LazyClient:
+    """An SDK client built by `factory` on first get(); the factory imports what it needs."""
+
+    def __init__(self, name: str, factory: Callable[[], Any]):
+        self._name = name
+        self._factory = factory
+        self._client = None
+        self._built = False
+        self._lock = threading.Lock()
+        self.import_ms: Optional[float] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._built
+
+    def load(self):
+        return self.get()
+
+    def get(self):
+        if not self._built:
+            with self._lock:
+                if not self._built:
+                    t0 = time.perf_counter()
+                    self._client = self._factory()
+                    self.import_ms = round((time.perf_counter() - t0) * 1000, 1)
+                    self._built = True
+        return self._client
+
+
+_registry: dict[str, Any] = {}
+_registry_lock = threading.Lock()
+
+
+def module(name: str) -> LazyModule:
+    """Registered lazy proxy for module `name` (one per name, shared by every importer)."""
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = LazyModule(name)
+        return _registry[name]
+
+
+def client(name: str, factory: Callable[[], Any]) -> LazyClient:
+    """Register a lazily built client under `name`."""
+    with _registry_lock:
+        _registry[name] = LazyClient(name, factory)
+        return _registry[name]
+
+
+def status() -> dict[str, Optional[float]]:
+    """Import/build time in ms per registered SDK, None while it has not been loaded."""
+    return {name: entry.import_ms if entry.loaded else None for name, entry in sorted(_registry.items())}
+
+
+def warm(names: Optional[Iterable[str]] = None) -> None:
+    """Load the named SDKs (all registered ones by default). Failures are logged, not raised:
+    the request that needs the SDK will hit the same error and report it."""
+    for name in list(names if names is not None else _registry):
+        entry = _registry.get(name)
+        if entry is None:
+            logger.warning("Unknown SDK %r in FLUX_WARM_SDKS", name)
+            continue
+        try:
+            entry.load()
+        except Exception as e:
+            logger.error("Warming %s failed: %s", name, e)
+
+
+def warm_names(setting: str = WARM_SDKS) -> Optional[list[str]]:
+    """Parse a FLUX_WARM_SDKS value: [] for none, None for all."""
+    setting = setting.strip()
+    if setting.lower() == "all":
+        return None
+    return [name.strip() for name in setting.split(",") if name.strip()]
@@ -0,0 +1,26 @@
+import os
+from typing import Optional
+
+# ---- CONFIG ----
+# Multi-worker mode: when set, every uvicorn worker attaches to state kept here (the catalog
+# segment and the SQLite caches) instead of holding a private copy.
+SHARED_STATE_DIR = os.environ.get("FLUX_SHARED_STATE_DIR") or None
+
+
+def shared_path(name: str) -> Optional[str]:
+    """Path of `name` inside the shared state directory, or None outside multi-worker mode."""
+    if SHARED_STATE_DIR is None:
+        return None
+    os.makedirs(SHARED_STATE_DIR, exist_ok=True)
+    return os.path.join(SHARED_STATE_DIR, name)
+
+
+def pid_alive(pid: int) -> bool:
+    """Whether a process with `pid` exists on this host (the shared directory is host-local)."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
@@ -0,0 +1,224 @@
+import contextvars
+import functools
+import inspect
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Optional
+
+from utils.logger import get_logger, request_id
+
+# ---- CONFIG ----
+# Dev mode attaches a per-request stage breakdown to orchestration telemetry.
+DEV_MODE = os.environ.get("FLUX_DEV_MODE", "").lower() in ("1", "true", "yes", "on")
+TRACE_WINDOW = int(os.environ.get("FLUX_TRACE_WINDOW", "1024"))
+QUANTILES = (0.5, 0.95, 0.99)
+
+_access_log = get_logger("flux.access")
+
+
+# ---- HISTOGRAMS ----
+class StageStats:
+    """Lifetime count/sum plus a rolling window of samples for quantiles."""
+
+    __slots__ = ("samples", "count", "total")
+
+    def __init__(self, window: int):
+        self.samples: deque[float] = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def quantile(self, q: float) -> float:
+        ordered = sorted(self.samples)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)] if ordered else 0.0
+
+
+class HistogramRegistry:
+    """Process-wide latency samples per stage name, safe to feed from worker threads."""
+
+    def __init__(self, window: int = TRACE_WINDOW):
+        self.window = window
+        self._stages: dict[str, StageStats] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            stats = self._stages.get(stage)
+            if stats is None:
+                stats = self._stages[stage] = StageStats(self.window)
+            stats.samples.append(seconds)
+            stats.count += 1
+            stats.total += seconds
+
+    def snapshot(self) -> dict[str, dict]:
+        with self._lock:
+            return {
+                stage: {
+                    "count": stats.count,
+                    "sum": stats.total,
+                    **{f"p{round(q * 100)}": stats.quantile(q) for q in QUANTILES},
+                }
+                for stage, stats in sorted(self._stages.items())
+            }
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition (0.0.4): one summary family, labelled by stage."""
+        lines = [
+            "# HELP flux_stage_latency_seconds Latency of instrumented stages (quantiles over a rolling window).",
+            "# TYPE flux_stage_latency_seconds summary",
+        ]
+        with self._lock:
+            for stage, stats in sorted(self._stages.items()):
+                label = _escape_label(stage)
+                for q in QUANTILES:
+                    lines.append(f'flux_stage_latency_seconds{{stage="{label}",quantile="{q}"}} {stats.quantile(q):.6g}')
+                lines.append(f'flux_stage_latency_seconds_sum{{stage="{label}"}} {stats.total:.6g}')
+                lines.append(f'flux_stage_latency_seconds_count{{stage="{label}"}} {stats.count}')
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stages.clear()
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+REGISTRY = HistogramRegistry()
+
+
+# ---- PER-REQUEST TRACES ----
+class Trace:
+    """Stage timings collected for one request (or one part of it, recorded on `parent` as well)."""
+
+    def __init__(self, parent: Optional["Trace"] = None):
+        self._records: list[tuple[str, float]] = []
+        self.parent = parent
+
+    def record(self, stage: str, seconds: float) -> None:
+        self._records.append((stage, seconds))
+        if self.parent is not None:
+            self.parent.record(stage, seconds)
+
+    def breakdown(self) -> dict[str, dict]:
+        """Total milliseconds and call count per stage, in first-seen order."""
+        out: dict[str, dict] = {}
+        for stage, seconds in list(self._records):
+            entry = out.setdefault(stage, {"ms": 0.0, "calls": 0})
+            entry["ms"] += seconds * 1000
+            entry["calls"] += 1
+        for entry in out.values():
+            entry["ms"] = round(entry["ms"], 3)
+        return out
+
+
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("flux_trace", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+class span:
+    """Time a block (`with span("stage"):`) or a function (`@span("stage")`, sync or async).
+
+    Every span feeds REGISTRY. It is also recorded on the active request Trace, if any; passing
+    `trace` makes that trace active for spans nested inside the block.
+    """
+
+    __slots__ = ("stage", "trace", "_t0", "_token")
+
+    def __init__(self, stage: str, trace: Optional[Trace] = None):
+        self.stage = stage
+        self.trace = trace
+        self._token = None
+
+    def __enter__(self) -> "span":
+        if self.trace is not None:
+            self._token = _current_trace.set(self.trace)
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        elapsed = time.perf_counter() - self._t0
+        if self._token is not None:
+            _current_trace.reset(self._token)
+            self._token = None
+        REGISTRY.observe(self.stage, elapsed)
+        trace = self.trace if self.trace is not None else _current_trace.get()
+        if trace is not None:
+            trace.record(self.stage, elapsed)
+
+    def __call__(self, fn):
+        stage = self.stage
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+
+
+# ---- ASGI ----
+class RequestTimingMiddleware:
+    """Records whole-request latency per route template as `http <METHOD> <path>`.
+
+    Each request gets an id (the caller's X-Request-ID, or a new one) that is echoed back and
+    attached to every log record it emits, and a Trace that collects its stage timings for the
+    access log line. Plain ASGI rather than BaseHTTPMiddleware so streaming responses and
+    disconnect detection pass through untouched.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        rid = _request_id_of(scope) or uuid.uuid4().hex[:16]
+        rid_token = request_id.set(rid)
+        trace = Trace()
+        trace_token = _current_trace.set(trace)
+        status = 500
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = [*message.get("headers", ()), (b"x-request-id", rid.encode())]
+            await send(message)
+
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            elapsed = time.perf_counter() - t0
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REGISTRY.observe(f"http {scope['method']} {route}", elapsed)
+            _access_log.log(
+                logging.WARNING if status >= 500 else logging.INFO,
+                "%s %s %s", scope["method"], route, status,
+                extra={"status": status, "duration_ms": round(elapsed * 1000, 3), "stages": trace.breakdown()},
+            )
+            _current_trace.reset(trace_token)
+            request_id.reset(rid_token)
+
+
+def _request_id_of(scope) -> Optional[str]:
+    for name, value in scope.get("headers") or ():
+        if name == b"x-request-id":
+            # Echoed into logs and headers, so keep it short and printable.
+            rid = value.decode("latin-1")[:64]
+            return rid if rid.isprintable() else None
+    return None